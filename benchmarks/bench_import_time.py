@@ -0,0 +1,40 @@
+"""
+Time how long importing each part of the package takes in a fresh interpreter, the cost every process-pool worker
+and every run pays before doing any work.
+
+Run from the repository root with: python -m benchmarks.bench_import_time
+"""
+import statistics
+import subprocess
+import sys
+
+MODULES = [
+    'lde_etl.common',
+    'lde_etl.data_model',
+    'lde_etl.stage_graph',
+    'lde_etl.student_data_etl.transform_handshake_data',
+    'lde_etl.student_data_etl.transform_student_data',
+    'lde_etl.engagement_data_etl.office_hours',
+    'lde_etl.engagement_data_etl.run_etl',
+    'lde_etl.student_data_etl.run_etl',
+    'lde_etl.cli',
+]
+REPEAT = 5
+
+
+def time_import(module: str) -> float:
+    """Import a module in a fresh interpreter and return how many seconds the import took"""
+    script = f'import time\nstarted = time.perf_counter()\nimport {module}\nprint(time.perf_counter() - started)'
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True).stdout
+    return float(output)
+
+
+def main():
+    print(f'{"module":<52}{"import time":>12}')
+    for module in MODULES:
+        seconds = statistics.median(time_import(module) for _ in range(REPEAT))
+        print(f'{module:<52}{seconds * 1000:>10.0f}ms')
+
+
+if __name__ == '__main__':
+    main()
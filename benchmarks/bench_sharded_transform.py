@@ -0,0 +1,58 @@
+"""
+Time transforming, formatting and counting the office hours of a synthetic report, unsharded and sharded across
+increasing numbers of processes. Both include the work the engagement ETL does for each source before writing it.
+
+Run from the repository root with: python -m benchmarks.bench_sharded_transform
+"""
+import os
+import timeit
+
+from lde_etl.engagement_count_view import EngagementCountView
+from lde_etl.engagement_data_etl.office_hours import transform_office_hours_data
+from lde_etl.engagement_data_etl.sharding import transform_in_shards
+from lde_etl.file_writers import format_engagement_rows
+from lde_etl.handshake_fields import AppointmentFields
+
+REPORT_SIZE = 400000
+SHARD_SIZE = 20000
+APPOINTMENT_TYPES = ['Homewood: Brain Sciences', 'Homewood: Pre-Med', 'Homewood: Civil Engineering']
+
+
+def make_office_hours_report(size: int) -> list:
+    return [
+        {
+            AppointmentFields.ID: str(1000000 + i),
+            AppointmentFields.START_DATE_TIME: f'2019-{i % 12 + 1:02}-12 13:00:00',
+            AppointmentFields.MEDIUM: 'In-Person' if i % 2 else 'Virtual',
+            AppointmentFields.TYPE: APPOINTMENT_TYPES[i % len(APPOINTMENT_TYPES)],
+            AppointmentFields.STAFF_MEMBER_EMAIL: f'staff{i % 40}@jhu.edu',
+            AppointmentFields.STUDENT_ID: str(2000000 + i),
+            AppointmentFields.STUDENT_SCHOOL_YEAR: 'Junior',
+            AppointmentFields.IS_DROP_IN: 'No',
+        }
+        for i in range(size)
+    ]
+
+
+def transform_format_and_count(report: list):
+    engagement_data = transform_office_hours_data(report)
+    count_view = EngagementCountView()
+    count_view.add_records(engagement_data)
+    return format_engagement_rows(engagement_data), count_view
+
+
+def main():
+    report = make_office_hours_report(REPORT_SIZE)
+    seconds = min(timeit.repeat(lambda: transform_format_and_count(report), number=1, repeat=3))
+    print(f'{"unsharded":>12}: {seconds:.3f}s')
+    worker_count = 1
+    while worker_count <= os.cpu_count():
+        seconds = min(timeit.repeat(lambda: transform_in_shards(transform_office_hours_data, report, SHARD_SIZE,
+                                                                worker_count),
+                                    number=1, repeat=3))
+        print(f'{worker_count:>4} workers: {seconds:.3f}s')
+        worker_count *= 2
+
+
+if __name__ == '__main__':
+    main()
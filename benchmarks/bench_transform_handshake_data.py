@@ -0,0 +1,40 @@
+"""
+Time transform_handshake_data on synthetic Handshake student reports of increasing size.
+
+Run from the repository root with: python -m benchmarks.bench_transform_handshake_data
+"""
+import timeit
+
+import pandas as pd
+
+from lde_etl.handshake_fields import StudentFields
+from lde_etl.student_data_etl.transform_handshake_data import transform_handshake_data
+
+REPORT_SIZES = [10000, 100000, 1000000]
+LABELS = ['system gen: hwd', 'system gen: hwd, hwd: pre-health', 'system gen: bsph', '']
+EXTRA_REPORT_COLUMN_COUNT = 20
+
+
+def make_handshake_report(size: int) -> pd.DataFrame:
+    report = {
+        StudentFields.ID: [str(1000000 + i) for i in range(size)],
+        StudentFields.AUTH_ID: [f'jhed{i}@johnshopkins.edu' if i % 50 else None for i in range(size)],
+        StudentFields.USERNAME: [f'user{i}' for i in range(size)],
+        StudentFields.HAS_LOGGED_IN: ['Yes' if i % 3 else 'No' for i in range(size)],
+        StudentFields.HAS_COMPLETED_PROFILE: ['No' if i % 4 else 'Yes' for i in range(size)],
+        StudentFields.LABELS: [LABELS[i % len(LABELS)] for i in range(size)],
+    }
+    for column in range(EXTRA_REPORT_COLUMN_COUNT):
+        report[f'extra_field{column}'] = [f'value{i}' for i in range(size)]
+    return pd.DataFrame(report)
+
+
+def main():
+    for size in REPORT_SIZES:
+        report = make_handshake_report(size)
+        seconds = min(timeit.repeat(lambda: transform_handshake_data(report), number=1, repeat=3))
+        print(f'{size:>9} students: {seconds:.3f}s ({seconds / size * 1e6:.2f}us per student)')
+
+
+if __name__ == '__main__':
+    main()
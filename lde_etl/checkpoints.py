@@ -0,0 +1,127 @@
+import json
+import os
+import pickle
+import re
+import shutil
+import threading
+from datetime import datetime
+from typing import Any
+
+from lde_etl.common import atomic_write
+
+MANIFEST_FILENAME = 'manifest.json'
+RUN_ID_FORMAT = '%Y%m%d-%H%M%S'
+# the checkpoints that hold the latest raw data pulled by each ETL, kept next to the runs
+RAW_DATA_RUN_ID = 'latest_raw_data'
+# how many failed runs are kept to be resumed. Runs that succeed are deleted as soon as they finish.
+MAX_KEPT_RUNS = 5
+
+
+class RunCheckpoints:
+    """
+    The checkpointed stage outputs of one run of an ETL, stored in a run directory.
+
+    Each stage's output is pickled to its own file as soon as the stage finishes, and the run's manifest records
+    which stages have finished. Resuming a run that failed partway through can then reload the outputs of the
+    finished stages instead of running them again.
+
+    :param run_dir: the directory the run's checkpoints and manifest are stored in
+    """
+
+    def __init__(self, run_dir: str):
+        self.run_dir = run_dir
+        os.makedirs(run_dir, exist_ok=True)
+        manifest_filepath = os.path.join(run_dir, MANIFEST_FILENAME)
+        if os.path.exists(manifest_filepath):
+            with open(manifest_filepath, 'r') as file:
+                self.manifest = json.load(file)
+        else:
+            self.manifest = {'stages': {}}
+        self._lock = threading.Lock()
+
+    def is_complete(self, stage_name: str) -> bool:
+        """Check whether a stage finished and had its output checkpointed"""
+        return stage_name in self.manifest['stages']
+
+    def load(self, stage_name: str) -> Any:
+        """Load the checkpointed output of a finished stage"""
+        if not self.is_complete(stage_name):
+            raise ValueError(f'There is no checkpoint of stage {stage_name!r} in {self.run_dir}')
+        with open(os.path.join(self.run_dir, self.manifest['stages'][stage_name]['checkpoint']), 'rb') as file:
+            return pickle.load(file)
+
+    def save(self, stage_name: str, output: Any):
+        """
+        Checkpoint the output of a stage that just finished and record the stage as finished in the manifest
+
+        :param stage_name: the name of the stage
+        :param output: the stage's output
+        """
+        checkpoint_filename = f'{re.sub(r"[^A-Za-z0-9_-]+", "_", stage_name)}.pkl'
+        with atomic_write(os.path.join(self.run_dir, checkpoint_filename), 'wb') as file:
+            pickle.dump(output, file, protocol=pickle.HIGHEST_PROTOCOL)
+        # stages that run concurrently may finish at the same time
+        with self._lock:
+            self.manifest['stages'][stage_name] = {'checkpoint': checkpoint_filename,
+                                                   'finished': datetime.now().isoformat(timespec='seconds')}
+            with atomic_write(os.path.join(self.run_dir, MANIFEST_FILENAME)) as file:
+                json.dump(self.manifest, file, indent=2)
+
+
+def new_run_id() -> str:
+    """Make the id of a new run from the time it started"""
+    return datetime.now().strftime(RUN_ID_FORMAT)
+
+
+def get_run_checkpoints(runs_dir: str, run_id: str, etl_name: str) -> RunCheckpoints:
+    """
+    Get the checkpoints of one of the ETLs of a run
+
+    :param runs_dir: the directory every run's checkpoints are stored in
+    :param run_id: the id of the run
+    :param etl_name: the name of the ETL, since each ETL of a run keeps its own checkpoints
+    :return: the checkpoints of the ETL's run
+    """
+    return RunCheckpoints(os.path.join(runs_dir, run_id, etl_name))
+
+
+def delete_run(runs_dir: str, run_id: str):
+    """Delete the checkpoints of every ETL of a run, once the run has succeeded and will not be resumed"""
+    shutil.rmtree(os.path.join(runs_dir, run_id), ignore_errors=True)
+
+
+def prune_runs(runs_dir: str, current_run_id: str, max_kept_runs: int = MAX_KEPT_RUNS):
+    """
+    Delete the checkpoints of all but the latest earlier runs, so that failed runs do not pile up. The raw data
+    cache is never deleted.
+
+    :param runs_dir: the directory every run's checkpoints are stored in
+    :param current_run_id: the id of the run that is starting or being resumed, which is always kept
+    :param max_kept_runs: how many of the latest earlier runs to keep
+    """
+    if not os.path.isdir(runs_dir):
+        return
+    earlier_run_ids = sorted(run_id for run_id in os.listdir(runs_dir)
+                             if run_id != current_run_id and _is_run_id(run_id))
+    for run_id in earlier_run_ids[:max(len(earlier_run_ids) - max_kept_runs, 0)]:
+        delete_run(runs_dir, run_id)
+
+
+def _is_run_id(name: str) -> bool:
+    try:
+        datetime.strptime(name, RUN_ID_FORMAT)
+        return True
+    except ValueError:
+        return False
+
+
+def get_raw_data_cache(runs_dir: str, etl_name: str) -> RunCheckpoints:
+    """
+    Get the checkpoints that hold the latest raw data an ETL pulled from each of its sources, which transform-only
+    runs read instead of pulling the data again
+
+    :param runs_dir: the directory every run's checkpoints are stored in
+    :param etl_name: the name of the ETL
+    :return: the ETL's raw data checkpoints
+    """
+    return get_run_checkpoints(runs_dir, RAW_DATA_RUN_ID, etl_name)
@@ -0,0 +1,164 @@
+import argparse
+import getpass
+import json
+import os
+import sys
+from typing import List
+
+from lde_etl.checkpoints import delete_run, get_run_checkpoints, new_run_id, prune_runs
+from lde_etl.common import load_config
+from lde_etl.engagement_data_etl.run_etl import ENGAGEMENT_SOURCES, run_engagement_etl
+from lde_etl.session_manager import HandshakeSessionManager
+from lde_etl.student_data_etl.run_etl import run_student_etl, select_student_etl_stages
+
+CONFIG_FILEPATH = f'{os.path.dirname(os.path.abspath(__file__))}/../config.json'
+ETL_NAMES = ['engagement', 'student']
+# the environment variables each credential can be read from
+CREDENTIAL_ENVIRONMENT_VARIABLES = {
+    'jhed': 'LDE_ETL_JHED',
+    'handshake_email': 'LDE_ETL_HANDSHAKE_EMAIL',
+    'handshake_pw': 'LDE_ETL_HANDSHAKE_PW',
+}
+CREDENTIAL_PROMPTS = {
+    'jhed': 'Please input your JHED: ',
+    'handshake_email': 'Please input your Handshake email address: ',
+    'handshake_pw': 'Please input your Handshake password: ',
+}
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog='lde_etl', description='Run the engagement and student data ETLs.',
+        epilog='Credentials are read from the secrets file, then from the environment variables '
+               f'{", ".join(CREDENTIAL_ENVIRONMENT_VARIABLES.values())}, and are only prompted for if they are '
+               'missing from both and the ETL is being run from a terminal.')
+    parser.add_argument('--secrets-file', help='a json file with jhed, handshake_email and handshake_pw values')
+    parser.add_argument('--etls', type=comma_separated_list, default=ETL_NAMES,
+                        help=f'the ETLs to run, out of {",".join(ETL_NAMES)} (default: both)')
+    parser.add_argument('--sources', type=comma_separated_list,
+                        help='the engagement sources to download, out of '
+                             f'{",".join(source.name for source in ENGAGEMENT_SOURCES)} (default: all). The other '
+                             'sources are transformed from the raw data cached the last time they were downloaded.')
+    parser.add_argument('--student-stages', type=comma_separated_list,
+                        help='the student ETL stages to run, along with the stages they depend on (default: all)')
+    parser.add_argument('--transform-only', action='store_true',
+                        help='transform the cached raw data of the last run instead of pulling data from Handshake '
+                             'and SIS')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='list the sources and stages that would be run without running them')
+    parser.add_argument('--full-department-recompute', action='store_true',
+                        help="recompute every student's departments instead of only those whose data changed")
+    parser.add_argument('--shard-size', type=int, metavar='ROWS',
+                        help='transform the engagement data in shards of this many rows in parallel processes')
+    parser.add_argument('--memory-budget', type=int, metavar='MB',
+                        help='transform the students in partitions that fit in this many megabytes between them, '
+                             'for data too large to transform at once')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help='resume a failed run, skipping the stages it finished and reloading their checkpoints')
+    return parser
+
+
+def comma_separated_list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def load_credentials(secrets_filepath: str = None, names: List[str] = None) -> dict:
+    """
+    Load credentials from a secrets file or the environment, prompting for any that are missing from both if
+    there is a terminal to prompt in
+
+    :param secrets_filepath: the path to a json file of credentials, if there is one
+    :param names: the names of the credentials to load, out of the keys of CREDENTIAL_ENVIRONMENT_VARIABLES
+    :return: the credentials, by name
+    """
+    names = names if names is not None else list(CREDENTIAL_ENVIRONMENT_VARIABLES)
+    secrets = {}
+    if secrets_filepath:
+        with open(secrets_filepath, 'r') as file:
+            secrets = json.load(file)
+    credentials = {}
+    for name in names:
+        value = secrets.get(name) or os.environ.get(CREDENTIAL_ENVIRONMENT_VARIABLES[name])
+        if not value:
+            if not sys.stdin.isatty():
+                raise ValueError(f'No {name} was found in the secrets file or the '
+                                 f'{CREDENTIAL_ENVIRONMENT_VARIABLES[name]} environment variable')
+            prompt = getpass.getpass if name == 'handshake_pw' else input
+            value = prompt(CREDENTIAL_PROMPTS[name])
+        credentials[name] = value.strip()
+    return credentials
+
+
+def load_config_with_credentials(secrets_filepath: str = None, needs_handshake_login=True) -> dict:
+    """
+    Load the ETL config for the user whose credentials are given
+
+    :param secrets_filepath: the path to a json file of credentials, if there is one
+    :param needs_handshake_login: whether the Handshake credentials are needed as well as the JHED
+    :return: the config, including the Handshake credentials if they are needed
+    """
+    names = list(CREDENTIAL_ENVIRONMENT_VARIABLES) if needs_handshake_login else ['jhed']
+    credentials = load_credentials(secrets_filepath, names)
+    config = load_config(CONFIG_FILEPATH, credentials.pop('jhed'))
+    # the session manager reads these even when it never logs in
+    config['handshake_email'] = credentials.get('handshake_email', '')
+    config['handshake_pw'] = credentials.get('handshake_pw', '')
+    return config
+
+
+def describe_run(config, args) -> str:
+    """Describe which engagement sources would be downloaded and which student stages would be run"""
+    lines = []
+    if 'engagement' in args.etls:
+        lines.append('Engagement sources:')
+        for source in ENGAGEMENT_SOURCES:
+            pulled = not args.transform_only and (args.sources is None or source.name in args.sources)
+            lines.append(f'  {source.name}: {"download" if pulled else "transform cached raw data"}')
+    if 'student' in args.etls:
+        lines.append('Student ETL stages:')
+        for stage in select_student_etl_stages(config, args.full_department_recompute, None, args.student_stages,
+                                               args.transform_only, args.memory_budget):
+            source = ' (cached raw data)' if args.transform_only and stage.pulls_raw_data else ''
+            lines.append(f'  {stage.name}{source}')
+    return '\n'.join(lines)
+
+
+def main(argv: List[str] = None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    unknown_etls = [name for name in args.etls if name not in ETL_NAMES]
+    if unknown_etls:
+        parser.error(f'Unknown ETLs {unknown_etls}, expected some of {ETL_NAMES}')
+    source_names = [source.name for source in ENGAGEMENT_SOURCES]
+    if args.sources is not None and any(name not in source_names for name in args.sources):
+        parser.error(f'Unknown sources {[name for name in args.sources if name not in source_names]}, '
+                     f'expected some of {source_names}')
+    pulled_source_names = [] if args.transform_only else args.sources
+    needs_handshake_login = not args.dry_run and not args.transform_only
+    config = load_config_with_credentials(args.secrets_file, needs_handshake_login)
+    if args.student_stages is not None:
+        try:
+            select_student_etl_stages(config, stage_names=args.student_stages, memory_budget_mb=args.memory_budget)
+        except ValueError as error:
+            parser.error(str(error))
+    if args.shard_size is not None and args.shard_size < 1:
+        parser.error('--shard-size must be at least 1')
+    if args.memory_budget is not None and args.memory_budget < 1:
+        parser.error('--memory-budget must be at least 1')
+    if args.resume and not os.path.isdir(os.path.join(config['run_dir'], args.resume)):
+        parser.error(f'No run with id {args.resume} was found in {config["run_dir"]}')
+    if args.dry_run:
+        print(describe_run(config, args))
+        return
+    run_id = args.resume or new_run_id()
+    prune_runs(config['run_dir'], run_id)
+    print(f'Run id: {run_id} (if the run fails, rerun with --resume {run_id} to pick up where it stopped)')
+    with HandshakeSessionManager(config) as sessions:
+        if 'engagement' in args.etls:
+            run_engagement_etl(config, get_run_checkpoints(config['run_dir'], run_id, 'engagement'), sessions,
+                               pulled_source_names, args.shard_size)
+        if 'student' in args.etls:
+            run_student_etl(config, args.full_department_recompute,
+                            get_run_checkpoints(config['run_dir'], run_id, 'student'), sessions,
+                            args.student_stages, args.transform_only, args.memory_budget)
+    delete_run(config['run_dir'], run_id)
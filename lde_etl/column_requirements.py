@@ -0,0 +1,26 @@
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# the column requirement of a stage that reads every column it is given, like a stage that writes a data file
+ALL_COLUMNS = None
+
+
+def project_columns(df: 'pd.DataFrame', columns: Optional[List[str]]) -> 'pd.DataFrame':
+    """Select the required columns of a dataframe, skipping any that it does not have"""
+    if columns is ALL_COLUMNS:
+        return df
+    return df[[column for column in columns if column in df.columns]]
+
+
+def project_records(records: List[dict], fields: Optional[List[str]]) -> List[dict]:
+    """Trim raw records down to the required fields, raising a KeyError if a record is missing any of them"""
+    if fields is ALL_COLUMNS:
+        return records
+    required_fields = set(fields)
+    for position, record in enumerate(records):
+        if not required_fields.issubset(record):
+            missing_fields = [field for field in fields if field not in record]
+            raise KeyError(f'Record {position} is missing the required fields {missing_fields}')
+    return [{field: record[field] for field in fields} for record in records]
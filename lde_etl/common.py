@@ -1,10 +1,16 @@
 import csv
 import json
+import multiprocessing
 import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Union
+from typing import IO, TYPE_CHECKING, Iterator, List, Optional, Union
 
-from autohandshake import HandshakeSession, HandshakeBrowser, InsightsPage, FileType
+if TYPE_CHECKING:
+    from autohandshake import HandshakeBrowser, InsightsPage
+
+from lde_etl.column_requirements import project_records
 
 
 def load_config(config_filepath: str, jhed: str = ''):
@@ -18,19 +24,42 @@ def load_config(config_filepath: str, jhed: str = ''):
         return {k: v.replace('$jhed', jhed) for (k, v) in config.items()}
 
 
-class BrowsingSession(HandshakeSession):
+def process_pool(max_workers: int = None) -> ProcessPoolExecutor:
+    """
+    Make a pool of worker processes that are started fresh, as they always are on Windows, rather than forked.
+    The ETLs start pools while other threads are running, and a forked process deadlocks as soon as it needs a
+    lock, like an import lock, that another thread held when it was forked.
+
+    :param max_workers: the maximum number of worker processes, defaulting to the number of cores
+    :return: the pool
     """
-    A wrapper class around HandshakeSession that always logs into the same account.
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+@contextmanager
+def atomic_write(filepath: str, mode: str = 'w', permissions: int = 0o666) -> Iterator[IO]:
     """
+    Open a file to write that only replaces the file at filepath once it has been written in full.
 
-    def __init__(self, config, max_wait_time=300):
-        super().__init__(login_url=config['handshake_url'], email=config['handshake_email'], password=config['handshake_pw'],
-                         download_dir=config['download_dir'], chromedriver_path=config['chromedriver_path'], max_wait_time=max_wait_time)
+    :param filepath: the filepath of the file to write
+    :param mode: the mode to open the file in, 'w' or 'wb'
+    :param permissions: the permissions to create the file with, before the umask is applied
+    :return: the open file
+    """
+    # write to a temporary file first so that an interrupted write never leaves a truncated file behind
+    temp_filepath = filepath + '.tmp'
+    try:
+        with os.fdopen(os.open(temp_filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, permissions), mode) as file:
+            yield file
+    except BaseException:
+        os.remove(temp_filepath)
+        raise
+    os.replace(temp_filepath, filepath)
 
 
 class InsightsDateField:
 
-    def set_report_date_range(self, insights_page: InsightsPage):
+    def set_report_date_range(self, insights_page: 'InsightsPage'):
         pass
 
 
@@ -40,7 +69,7 @@ class RangeInsightsDateField(InsightsDateField):
         self.date_field_category = date_field_category
         self.date_field_title = date_field_title
 
-    def set_report_date_range(self, insights_page: InsightsPage):
+    def set_report_date_range(self, insights_page: 'InsightsPage'):
         START_DATE = datetime(2019, 7, 1)
         END_DATE = datetime.today()
         insights_page.set_date_range_filter(field_category=self.date_field_category,
@@ -59,20 +88,23 @@ class RangeInsightsDateField(InsightsDateField):
 
 class NoInsightsDateField(InsightsDateField):
 
-    def set_report_date_range(self, insights_page: InsightsPage):
+    def set_report_date_range(self, insights_page: 'InsightsPage'):
         return insights_page
 
 
 class InsightsReport:
     """
-    A specification of an Inisghts report and its filterable date field.
+    A specification of an Inisghts report, its filterable date field and the report fields the ETL reads.
+    Any other fields are dropped as soon as the report is downloaded.
     """
 
-    def __init__(self, url: str, date_field: InsightsDateField = NoInsightsDateField()):
+    def __init__(self, url: str, date_field: InsightsDateField = NoInsightsDateField(),
+                 fields: Optional[List[str]] = None):
         self.url = url
         self._date_field = date_field
+        self.fields = fields
 
-    def extract_data(self, browser: HandshakeBrowser, download_dir: str) -> List[dict]:
+    def extract_data(self, browser: 'HandshakeBrowser', download_dir: str) -> List[dict]:
         """
         Extract data from a Handshake insights page for the engagement report.
 
@@ -80,10 +112,11 @@ class InsightsReport:
         :param insights_url: a valid Insights report page url from which to get the data
         :return: the raw, extracted data in list-of-dict format
         """
+        from autohandshake import InsightsPage, FileType
         insights_page = InsightsPage(self.url, browser)
         insights_page = self._date_field.set_report_date_range(insights_page)
         downloaded_filepath = insights_page.download_file(download_dir, file_type=FileType.JSON)
-        return read_and_delete_json(downloaded_filepath)
+        return project_records(read_and_delete_json(downloaded_filepath), self.fields)
 
 
 def read_and_delete_json(filepath: str) -> List[dict]:
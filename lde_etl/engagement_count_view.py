@@ -0,0 +1,154 @@
+import os
+import pickle
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lde_etl.common import atomic_write
+from lde_etl.data_model import EngagementRecord
+from lde_etl.student_data_etl.transform_engagement_data import ENGAGEMENT_COUNT_KEYS
+from lde_etl.student_data_etl.transform_engagement_data import accumulate_engagement_counts
+from lde_etl.student_data_etl.transform_engagement_data import pivot_engagement_counts
+
+ENGAGEMENT_COUNT_COLUMN_DTYPES = {
+    'student_handshake_id': str,
+    'engagement_type': str,
+    'academic_year': np.float64,
+    'unique_engagement_id': str,
+}
+ENGAGEMENT_DATA_CHUNKSIZE = 100000
+# the view counts engagements by academic year as well as by student and engagement type
+VIEW_COUNT_KEYS = ['academic_year'] + ENGAGEMENT_COUNT_KEYS
+
+
+class EngagementCountView:
+    """
+    A persistent table of engagement counts by academic year, student and engagement type, kept up to date
+    as engagement data is written so that reading a year's counts never requires recounting the engagement data.
+
+    The view remembers the size and modification time of the engagement data file it was last synced with,
+    so a view that has gone stale because the file was changed some other way can be detected and rebuilt.
+    """
+
+    def __init__(self, counts: pd.Series = None, source_signature: Tuple[int, int] = None):
+        """
+        :param counts: engagement counts indexed by academic_year, student_handshake_id and engagement_type
+        :param source_signature: the signature of the engagement data file the counts are in sync with
+        """
+        self._counts = counts if counts is not None else _empty_counts()
+        self.source_signature = source_signature
+
+    @classmethod
+    def from_engagement_file(cls, filepath: str, chunksize: int = ENGAGEMENT_DATA_CHUNKSIZE):
+        """
+        Build the view by streaming an engagement data file in chunks, holding only the running counts in memory
+
+        :param filepath: the path to the engagement data csv
+        :param chunksize: the number of engagement rows to read at a time
+        :return: a view synced with the engagement data file
+        """
+        view = cls(source_signature=get_file_signature(filepath))
+        chunks = pd.read_csv(filepath, encoding='ISO-8859-1', usecols=list(ENGAGEMENT_COUNT_COLUMN_DTYPES),
+                             dtype=ENGAGEMENT_COUNT_COLUMN_DTYPES, chunksize=chunksize)
+        for chunk in chunks:
+            view._add_engagements(chunk)
+        return view
+
+    @classmethod
+    def combine(cls, views: Iterable['EngagementCountView']):
+        """
+        Combine views of separate engagement data, like the engagements of each source, into one view
+
+        :param views: the views to combine
+        :return: a view of all of their engagements, which isn't synced with any engagement data file
+        """
+        counts = [view._counts for view in views]
+        if not counts:
+            return cls()
+        return cls(pd.concat(counts).groupby(level=VIEW_COUNT_KEYS).sum().astype(np.int64))
+
+    @staticmethod
+    def load(filepath: str):
+        with open(filepath, 'rb') as file:
+            return pickle.load(file)
+
+    def save(self, filepath: str):
+        with atomic_write(filepath, 'wb') as file:
+            pickle.dump(self, file)
+
+    def add_records(self, engagement_data: Iterable[EngagementRecord]):
+        """Add the counts of newly written engagement records to the view"""
+        engagement_data = [record.data for record in engagement_data]
+        student_handshake_ids = pd.Series([data['student_handshake_id'] for data in engagement_data], dtype=object)
+        self._add_engagements(pd.DataFrame({
+            'academic_year': [data['academic_year'] for data in engagement_data],
+            # the ids are read back from the engagement data file as strings
+            'student_handshake_id': student_handshake_ids.where(student_handshake_ids.isna(),
+                                                                student_handshake_ids.astype(str)),
+            'engagement_type': [data['engagement_type'] for data in engagement_data],
+            'unique_engagement_id': [data['unique_engagement_id'] for data in engagement_data],
+        }))
+
+    def academic_years(self) -> List[int]:
+        """Get the academic years that have engagements, in order"""
+        return sorted(self._counts.index.unique(level='academic_year'))
+
+    def engagement_counts(self, academic_year: int) -> pd.DataFrame:
+        """
+        Get the engagement counts of one academic year
+
+        :param academic_year: the academic year to get the counts of
+        :return: the engagement counts, in the same format as count_engagements_by_type
+        """
+        if academic_year in self._counts.index.unique(level='academic_year'):
+            counts = self._counts.xs(academic_year, level='academic_year')
+        else:
+            counts = _empty_counts().droplevel('academic_year')
+        return pivot_engagement_counts(counts)
+
+    def _add_engagements(self, engagements: pd.DataFrame):
+        engagements = engagements.dropna(subset=['academic_year']).astype({'academic_year': np.int64})
+        self._counts = accumulate_engagement_counts(self._counts, engagements, VIEW_COUNT_KEYS)
+
+
+def _empty_counts() -> pd.Series:
+    return pd.Series([], dtype=np.int64, index=pd.MultiIndex.from_arrays(
+        [np.array([], dtype=np.int64), np.array([], dtype=object), np.array([], dtype=object)],
+        names=VIEW_COUNT_KEYS))
+
+
+def get_file_signature(filepath: str) -> Tuple[int, int]:
+    stat = os.stat(filepath)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def save_engagement_count_view(view: EngagementCountView, view_filepath: str, engagement_data_filepath: str):
+    """
+    Save a view that counts the engagement records just written to the engagement data file, marking it as
+    in sync with the file
+
+    :param view: a view of the engagement records that were written to the file
+    :param view_filepath: where the view is stored
+    :param engagement_data_filepath: the engagement data file that was just written
+    """
+    view.source_signature = get_file_signature(engagement_data_filepath)
+    view.save(view_filepath)
+
+
+def load_engagement_count_view(view_filepath: str, engagement_data_filepath: str) -> EngagementCountView:
+    """
+    Load the engagement count view, rebuilding it from the engagement data file if it is missing or the
+    file has been changed since the view was last updated
+
+    :param view_filepath: where the view is stored
+    :param engagement_data_filepath: the engagement data file the view counts
+    :return: a view in sync with the engagement data file
+    """
+    if os.path.exists(view_filepath):
+        view = EngagementCountView.load(view_filepath)
+        if view.source_signature == get_file_signature(engagement_data_filepath):
+            return view
+    view = EngagementCountView.from_engagement_file(engagement_data_filepath)
+    view.save(view_filepath)
+    return view
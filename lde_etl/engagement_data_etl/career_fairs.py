@@ -1,6 +1,7 @@
-from typing import List
+from typing import TYPE_CHECKING, List
 
-from autohandshake import HandshakeBrowser
+if TYPE_CHECKING:
+    from autohandshake import HandshakeBrowser
 
 from lde_etl.common import InsightsReport, parse_date_string, RangeInsightsDateField
 from lde_etl.data_model import EngagementRecord, EngagementTypes, Mediums, Departments
@@ -9,19 +10,30 @@ from lde_etl.handshake_fields import CareerFairFields
 CAREER_FAIRS_INSIGHTS_REPORT = InsightsReport(
     url='https://app.joinhandshake.com/analytics/explore_embed?insights_page=ZXhwbG9yZS9nZW5lcmF0ZWRfaGFuZHNoYWtlX3Byb2R1Y3Rpb24vY2FyZWVyX2ZhaXJfc2Vzc2lvbl9hdHRlbmRlZXM_cWlkPXlKVmZobzk5enFkY2pJMm42aHYxd0UmZW1iZWRfZG9tYWluPWh0dHBzOiUyRiUyRmFwcC5qb2luaGFuZHNoYWtlLmNvbSZ0b2dnbGU9Zmls',
     date_field=RangeInsightsDateField(date_field_category='Career Fair Session',
-                                      date_field_title='Start Date')
+                                      date_field_title='Start Date'),
+    fields=[CareerFairFields.ID, CareerFairFields.START_DATE_TIME, CareerFairFields.NAME, CareerFairFields.STUDENT_ID,
+            CareerFairFields.IS_PRE_REGISTERED]
 )
 
 
-def run_career_fair_etl(browser: HandshakeBrowser, download_dir: str) -> List[EngagementRecord]:
+def run_career_fair_etl(browser: 'HandshakeBrowser', download_dir: str) -> List[EngagementRecord]:
     """
     Run the full ETL process for career fair data
 
     :param browser: a logged-in HandshakeBrowser
     :return: a list consisting of cleaned career fair engagement data
     """
-    raw_fair_data = CAREER_FAIRS_INSIGHTS_REPORT.extract_data(browser, download_dir)
-    return transform_fair_data(raw_fair_data)
+    return transform_fair_data(extract_fair_data(browser, download_dir))
+
+
+def extract_fair_data(browser: 'HandshakeBrowser', download_dir: str) -> List[dict]:
+    """
+    Download the raw career fair data from Handshake
+
+    :param browser: a logged-in HandshakeBrowser
+    :return: the raw career fair data
+    """
+    return CAREER_FAIRS_INSIGHTS_REPORT.extract_data(browser, download_dir)
 
 
 def transform_fair_data(raw_fair_data: List[dict]) -> List[EngagementRecord]:
@@ -1,6 +1,7 @@
-from typing import List
+from typing import TYPE_CHECKING, List, Tuple
 
-from autohandshake import HandshakeBrowser
+if TYPE_CHECKING:
+    from autohandshake import HandshakeBrowser
 
 from lde_etl.common import InsightsReport, parse_date_string, RangeInsightsDateField
 from lde_etl.data_model import EngagementRecord, EngagementTypes, Mediums, Departments, Department
@@ -9,25 +10,44 @@ from lde_etl.handshake_fields import EventFields
 EVENTS_INSIGHTS_REPORT = InsightsReport(
     url='https://app.joinhandshake.com/analytics/explore_embed?insights_page=ZXhwbG9yZS9nZW5lcmF0ZWRfaGFuZHNoYWtlX3Byb2R1Y3Rpb24vZXZlbnRzP3FpZD1XdnpaMTl2N2hJa0d4V0NUTlNQN1U3JmVtYmVkX2RvbWFpbj1odHRwczolMkYlMkZhcHAuam9pbmhhbmRzaGFrZS5jb20mdG9nZ2xlPWZpbA==',
     date_field=RangeInsightsDateField(date_field_category='Events',
-                                      date_field_title='Start Date Date')
+                                      date_field_title='Start Date Date'),
+    fields=[EventFields.ID, EventFields.START_DATE_TIME, EventFields.NAME, EventFields.STUDENT_ID,
+            EventFields.IS_PRE_REGISTERED]
 )
 
 EVENTS_LABELS_INSIGHTS_REPORT = InsightsReport(
     url='https://app.joinhandshake.com/analytics/explore_embed?insights_page=ZXhwbG9yZS9nZW5lcmF0ZWRfaGFuZHNoYWtlX3Byb2R1Y3Rpb24vZXZlbnRzP3FpZD1PbFdmR3pzSjBIdE56RFo1UlR1aE9xJmVtYmVkX2RvbWFpbj1odHRwczolMkYlMkZhcHAuam9pbmhhbmRzaGFrZS5jb20mdG9nZ2xlPWZpbA==',
     date_field=RangeInsightsDateField(date_field_category='Events',
-                                      date_field_title='Start Date Date')
+                                      date_field_title='Start Date Date'),
+    fields=[EventFields.ID, EventFields.LABEL]
 )
 
 
-def run_events_etl(browser: HandshakeBrowser, download_dir) -> List[EngagementRecord]:
+def run_events_etl(browser: 'HandshakeBrowser', download_dir) -> List[EngagementRecord]:
     """
     Run the full ETL process for events data
 
     :param browser: a logged-in HandshakeBrowser
     :return: a list consisting of cleaned event engagement data
     """
+    return transform_extracted_events_data(extract_events_data(browser, download_dir))
+
+
+def extract_events_data(browser: 'HandshakeBrowser', download_dir: str) -> Tuple[List[dict], List[dict]]:
+    """
+    Download the raw events data and event labels data from Handshake
+
+    :param browser: a logged-in HandshakeBrowser
+    :return: the raw events data and the raw event labels data
+    """
     raw_event_data = EVENTS_INSIGHTS_REPORT.extract_data(browser, download_dir)
     raw_event_label_data = EVENTS_LABELS_INSIGHTS_REPORT.extract_data(browser, download_dir)
+    return raw_event_data, raw_event_label_data
+
+
+def transform_extracted_events_data(raw_data: Tuple[List[dict], List[dict]]) -> List[EngagementRecord]:
+    """Transform the raw events data and event labels data returned by extract_events_data"""
+    raw_event_data, raw_event_label_data = raw_data
     return transform_events_data(raw_event_data, raw_event_label_data)
 
 
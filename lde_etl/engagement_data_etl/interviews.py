@@ -1,6 +1,7 @@
-from typing import List
+from typing import TYPE_CHECKING, List
 
-from autohandshake import HandshakeBrowser
+if TYPE_CHECKING:
+    from autohandshake import HandshakeBrowser
 
 from lde_etl.common import InsightsReport, parse_date_string, RangeInsightsDateField
 from lde_etl.data_model import EngagementRecord, EngagementTypes, Mediums, Departments
@@ -9,19 +10,30 @@ from lde_etl.handshake_fields import InterviewFields
 INTERVIEWS_INSIGHTS_REPORT = InsightsReport(
     url='https://app.joinhandshake.com/analytics/explore_embed?insights_page=ZXhwbG9yZS9nZW5lcmF0ZWRfaGFuZHNoYWtlX3Byb2R1Y3Rpb24vaW50ZXJ2aWV3X3NjaGVkdWxlcz9xaWQ9UXQ1OTFORFhJaWZ5MG9FdlMyUURYQiZlbWJlZF9kb21haW49aHR0cHM6JTJGJTJGYXBwLmpvaW5oYW5kc2hha2UuY29tJnRvZ2dsZT1maWw=',
     date_field=RangeInsightsDateField(date_field_category='Interview Schedule Dates',
-                                      date_field_title='Date Date')
+                                      date_field_title='Date Date'),
+    fields=[InterviewFields.ID, InterviewFields.DATE_TIME, InterviewFields.EMPLOYER, InterviewFields.STUDENT_ID,
+            InterviewFields.DATE_LIST]
 )
 
 
-def run_interviews_etl(browser: HandshakeBrowser, download_dir) -> List[EngagementRecord]:
+def run_interviews_etl(browser: 'HandshakeBrowser', download_dir) -> List[EngagementRecord]:
     """
     Run the full ETL process for events data
 
     :param browser: a logged-in HandshakeBrowser
     :return: a list consisting of cleaned event engagement data
     """
-    raw_event_data = INTERVIEWS_INSIGHTS_REPORT.extract_data(browser, download_dir)
-    return transform_interviews_data(raw_event_data)
+    return transform_interviews_data(extract_interviews_data(browser, download_dir))
+
+
+def extract_interviews_data(browser: 'HandshakeBrowser', download_dir: str) -> List[dict]:
+    """
+    Download the raw interview data from Handshake
+
+    :param browser: a logged-in HandshakeBrowser
+    :return: the raw interview data
+    """
+    return INTERVIEWS_INSIGHTS_REPORT.extract_data(browser, download_dir)
 
 
 def transform_interviews_data(raw_interview_data: List[dict]) -> List[EngagementRecord]:
@@ -0,0 +1,133 @@
+import queue
+import threading
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, List
+
+if TYPE_CHECKING:
+    from autohandshake import HandshakeBrowser
+
+from lde_etl.checkpoints import RunCheckpoints
+from lde_etl.data_model import EngagementRecord
+
+# marks the end of the downloaded reports on the queue
+_NO_MORE_REPORTS = object()
+
+
+class EngagementSource:
+    """
+    A source of engagement data, split into the step that downloads its raw data from Handshake and the step
+    that transforms the raw data into engagement records
+
+    :param name: the name of the source, used in progress messages
+    :param extract: a function that takes a logged-in HandshakeBrowser and a download directory and returns
+        the raw data of the source
+    :param transform: a function that takes the raw data returned by extract and returns engagement records
+    """
+
+    def __init__(self, name: str, extract: Callable[['HandshakeBrowser', str], Any],
+                 transform: Callable[[Any], List[EngagementRecord]]):
+        self.name = name
+        self.extract = extract
+        self.transform = transform
+
+
+def run_engagement_pipeline(browser: 'HandshakeBrowser', download_dir: str, sources: List[EngagementSource],
+                            write_batch: Callable[[List[EngagementRecord]], None], max_queued_reports: int = 1,
+                            checkpoints: RunCheckpoints = None):
+    """
+    Download the raw data of each source and hand it to a worker thread that transforms and writes it while
+    the next source is being downloaded, so the run takes about as long as the slower of the two steps rather
+    than the sum of both.
+
+    The downloads run on the calling thread, since the browser can only be driven from one thread at a time,
+    and the sources are transformed and written in the order they are listed. The queue between the two steps
+    holds at most max_queued_reports downloaded reports, so downloads wait for the worker to catch up rather
+    than piling raw data up in memory. If either step fails, no further sources are downloaded and the error
+    is re-raised once the worker has stopped.
+
+    :param browser: a logged-in HandshakeBrowser
+    :param download_dir: the directory reports are downloaded to
+    :param sources: the sources to download, transform and write
+    :param write_batch: a function that writes the engagement records of one source
+    :param max_queued_reports: the most downloaded reports that can wait to be transformed at once
+    :param checkpoints: the checkpoints of the run, if the engagement records of each source should be
+        checkpointed once they are transformed. Sources that were already transformed in an earlier attempt at
+        the run are not downloaded again, and their checkpointed records are written instead.
+    """
+    downloaded_reports = queue.Queue(maxsize=max_queued_reports)
+    worker_errors = []
+    worker = threading.Thread(target=_transform_and_write_reports,
+                              args=(downloaded_reports, write_batch, checkpoints, worker_errors), daemon=True)
+    worker.start()
+    try:
+        for source in sources:
+            if worker_errors:
+                break
+            if checkpoints is not None and checkpoints.is_complete(source.name):
+                print(f'Loading checkpointed {source.name} data...')
+                downloaded_reports.put((source, checkpoints.load(source.name), True))
+            else:
+                print(f'Pulling {source.name} data...')
+                downloaded_reports.put((source, source.extract(browser, download_dir), False))
+    finally:
+        downloaded_reports.put(_NO_MORE_REPORTS)
+        worker.join()
+    if worker_errors:
+        raise worker_errors[0]
+
+
+def cache_source_extracts(sources: List[EngagementSource], cache: RunCheckpoints,
+                          pulled_source_names: List[str] = None) -> List[EngagementSource]:
+    """
+    Keep the latest raw data downloaded for each source, so that sources can later be transformed again without
+    downloading them
+
+    :param sources: the engagement sources
+    :param cache: the checkpoints the raw data of each source is kept in
+    :param pulled_source_names: the names of the sources to download, or None to download every source. The
+        other sources are transformed from their cached raw data.
+    :return: the sources, with extract steps that cache or load their raw data
+    """
+    cached_sources = []
+    for source in sources:
+        if pulled_source_names is None or source.name in pulled_source_names:
+            extract = partial(_extract_and_cache, cache, source)
+        else:
+            extract = partial(_load_cached_extract, cache, source.name)
+        cached_sources.append(EngagementSource(source.name, extract, source.transform))
+    return cached_sources
+
+
+def _extract_and_cache(cache: RunCheckpoints, source: EngagementSource, browser: 'HandshakeBrowser',
+                       download_dir: str) -> Any:
+    raw_data = source.extract(browser, download_dir)
+    cache.save(source.name, raw_data)
+    return raw_data
+
+
+def _load_cached_extract(cache: RunCheckpoints, source_name: str, browser: 'HandshakeBrowser',
+                         download_dir: str) -> Any:
+    return cache.load(source_name)
+
+
+def _transform_and_write_reports(downloaded_reports: queue.Queue,
+                                 write_batch: Callable[[List[EngagementRecord]], None], checkpoints: RunCheckpoints,
+                                 errors: List[BaseException]):
+    while True:
+        report = downloaded_reports.get()
+        if report is _NO_MORE_REPORTS:
+            return
+        # after a failure, keep taking reports off the queue so the downloading thread is never left waiting
+        if errors:
+            continue
+        source, data, is_checkpointed = report
+        try:
+            if is_checkpointed:
+                engagement_data = data
+            else:
+                engagement_data = source.transform(data)
+                if checkpoints is not None:
+                    checkpoints.save(source.name, engagement_data)
+            write_batch(engagement_data)
+        except BaseException as error:
+            errors.append(error)
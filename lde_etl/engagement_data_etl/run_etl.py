@@ -1,21 +1,74 @@
-from lde_etl.common import BrowsingSession
-from lde_etl.engagement_data_etl.career_fairs import run_career_fair_etl
-from lde_etl.engagement_data_etl.events import run_events_etl
-from lde_etl.engagement_data_etl.interviews import run_interviews_etl
-from lde_etl.engagement_data_etl.office_hours import run_office_hours_etl
-from lde_etl.file_writers import write_engagement_data
+from typing import List
 
+from lde_etl.checkpoints import RunCheckpoints, get_raw_data_cache
+from lde_etl.engagement_count_view import EngagementCountView
+from lde_etl.engagement_count_view import save_engagement_count_view
+from lde_etl.engagement_data_etl.career_fairs import extract_fair_data
+from lde_etl.engagement_data_etl.career_fairs import transform_fair_data
+from lde_etl.engagement_data_etl.events import extract_events_data
+from lde_etl.engagement_data_etl.events import transform_extracted_events_data
+from lde_etl.engagement_data_etl.interviews import extract_interviews_data
+from lde_etl.engagement_data_etl.interviews import transform_interviews_data
+from lde_etl.engagement_data_etl.office_hours import extract_office_hours_data
+from lde_etl.engagement_data_etl.office_hours import transform_office_hours_data
+from lde_etl.engagement_data_etl.pipeline import EngagementSource
+from lde_etl.engagement_data_etl.pipeline import cache_source_extracts
+from lde_etl.engagement_data_etl.pipeline import run_engagement_pipeline
+from lde_etl.engagement_data_etl.sharding import TransformedShards
+from lde_etl.engagement_data_etl.sharding import shard_source_transforms
+from lde_etl.file_writers import EngagementDataWriter
+from lde_etl.session_manager import HandshakeSessionManager
 
-def run_engagement_etl(config):
-    with BrowsingSession(config) as browser:
-        print('Pulling office hour data...')
-        clean_appt_data = run_office_hours_etl(browser, config['download_dir'])
-        print('Pulling event data...')
-        clean_event_data = run_events_etl(browser, config['download_dir'])
-        print('Pulling career fair data...')
-        clean_fair_data = run_career_fair_etl(browser, config['download_dir'])
-        print('Pulling interview data...')
-        clean_interview_data = run_interviews_etl(browser, config['download_dir'])
-        print('Writing engagement data...')
-        engagement_data = clean_appt_data + clean_event_data + clean_fair_data + clean_interview_data
-        write_engagement_data(config['engagement_data_filepath'], engagement_data)
+ENGAGEMENT_SOURCES = [
+    EngagementSource('office_hours', extract_office_hours_data, transform_office_hours_data),
+    EngagementSource('events', extract_events_data, transform_extracted_events_data),
+    EngagementSource('career_fairs', extract_fair_data, transform_fair_data),
+    EngagementSource('interviews', extract_interviews_data, transform_interviews_data),
+]
+
+
+def run_engagement_etl(config, checkpoints: RunCheckpoints = None, sessions: HandshakeSessionManager = None,
+                       pulled_source_names: List[str] = None, shard_size: int = None):
+    """
+    Pull, transform and write the engagement data of every source
+
+    :param config: the ETL config
+    :param checkpoints: the checkpoints of the run, if it can be resumed
+    :param sessions: the run's Handshake session manager
+    :param pulled_source_names: the names of the sources to download from Handshake, or None to download every
+        source. The other sources are transformed from the raw data cached the last time they were downloaded,
+        so the engagement data file always has every source's engagements.
+    :param shard_size: if given, each source's raw data is transformed in shards of this many rows in parallel
+        processes rather than all at once, and the processes send back the rows of the engagement data file and
+        their counts rather than the engagement records
+    """
+    if sessions is None:
+        with HandshakeSessionManager(config) as sessions:
+            return run_engagement_etl(config, checkpoints, sessions, pulled_source_names, shard_size)
+    count_views = []
+
+    def write_batch(engagement_data):
+        # sources transformed in shards come back already formatted and counted
+        if isinstance(engagement_data, TransformedShards):
+            for rows in engagement_data.rows:
+                engagement_data_writer.write_rows(engagement_data.fields, rows)
+            count_views.append(engagement_data.count_view)
+        else:
+            engagement_data_writer.write(engagement_data)
+            count_view = EngagementCountView()
+            count_view.add_records(engagement_data)
+            count_views.append(count_view)
+
+    # there is no need to log into Handshake when every source is loaded from a checkpoint or cached raw data
+    needs_browser = any((pulled_source_names is None or source.name in pulled_source_names)
+                        and not (checkpoints is not None and checkpoints.is_complete(source.name))
+                        for source in ENGAGEMENT_SOURCES)
+    browser = sessions.get_browser() if needs_browser else None
+    sources = cache_source_extracts(ENGAGEMENT_SOURCES, get_raw_data_cache(config['run_dir'], 'engagement'),
+                                    pulled_source_names)
+    if shard_size is not None:
+        sources = shard_source_transforms(sources, shard_size)
+    with EngagementDataWriter(config['engagement_data_filepath']) as engagement_data_writer:
+        run_engagement_pipeline(browser, config['download_dir'], sources, write_batch, checkpoints=checkpoints)
+    save_engagement_count_view(EngagementCountView.combine(count_views), config['engagement_counts_filepath'],
+                               config['engagement_data_filepath'])
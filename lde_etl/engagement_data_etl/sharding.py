@@ -0,0 +1,88 @@
+from functools import partial
+from typing import Any, Callable, List, Tuple, Union
+
+from lde_etl.common import process_pool
+from lde_etl.data_model import EngagementRecord
+from lde_etl.engagement_count_view import EngagementCountView
+from lde_etl.engagement_data_etl.pipeline import EngagementSource
+from lde_etl.file_writers import format_engagement_rows
+
+DEFAULT_SHARD_SIZE = 20000
+
+
+class TransformedShards:
+    """
+    The engagement records of a source that was transformed in shards, as each shard process already formatted
+    them for the engagement data file, along with their counts.
+
+    The shard processes send back csv text and counts rather than the records themselves, so that this process
+    never has to unpickle every record. The engagement data writer writes the rows as they are.
+
+    :param fields: the fields of the records, which are the columns of the engagement data file
+    :param rows: the csv rows of each shard's records, without a header, in the order of the shards
+    :param count_view: the engagement counts of the records
+    """
+
+    def __init__(self, fields: List[str], rows: List[str], count_view: EngagementCountView):
+        self.fields = fields
+        self.rows = rows
+        self.count_view = count_view
+
+
+def transform_in_shards(transform: Callable[[Any], List[EngagementRecord]],
+                        raw_data: Union[List[dict], Tuple[List[dict], ...]], shard_size: int = DEFAULT_SHARD_SIZE,
+                        max_workers: int = None) -> TransformedShards:
+    """
+    Run an engagement source's transform on shards of its raw data in parallel processes.
+
+    The raw rows are split into shards of consecutive rows and each shard is transformed in a process pool. Each
+    process formats its shard's engagement records as engagement data csv rows and counts them, so only text and
+    counts are sent back. The shards' rows are kept in the order of the shards, so the file written from them
+    is the same as if all of the raw data had been transformed at once. Raw data that fits in one shard is
+    transformed in this process.
+
+    :param transform: the source's transform. It must be picklable, so a module-level function, and transform
+        each raw row independently of the other rows.
+    :param raw_data: the raw rows, or a tuple of the raw rows followed by other raw data that every shard's
+        transform needs in full, like the labels of the events
+    :param shard_size: the number of raw rows in each shard
+    :param max_workers: the maximum number of processes to transform shards in
+    :return: the formatted rows and counts of the engagement records of every shard
+    """
+    sharded_rows, shared_data = (raw_data[0], raw_data[1:]) if isinstance(raw_data, tuple) else (raw_data, None)
+    if len(sharded_rows) <= shard_size:
+        shards = [_transform_shard(transform, sharded_rows, shared_data)]
+    else:
+        with process_pool(max_workers=max_workers) as executor:
+            futures = [executor.submit(_transform_shard, transform, sharded_rows[start:start + shard_size],
+                                       shared_data)
+                       for start in range(0, len(sharded_rows), shard_size)]
+            shards = [future.result() for future in futures]
+    fields = next((shard_fields for shard_fields, _, _ in shards if shard_fields), [])
+    return TransformedShards(fields, [rows for _, rows, _ in shards],
+                             EngagementCountView.combine(count_view for _, _, count_view in shards))
+
+
+def shard_source_transforms(sources: List[EngagementSource], shard_size: int = DEFAULT_SHARD_SIZE,
+                            max_workers: int = None) -> List[EngagementSource]:
+    """
+    Run the transform of each engagement source on shards of its raw data in parallel processes
+
+    :param sources: the engagement sources
+    :param shard_size: the number of raw rows in each shard
+    :param max_workers: the maximum number of processes to transform each source's shards in
+    :return: the sources, with transforms that are run by transform_in_shards
+    """
+    return [EngagementSource(source.name, source.extract,
+                             partial(transform_in_shards, source.transform, shard_size=shard_size,
+                                     max_workers=max_workers))
+            for source in sources]
+
+
+def _transform_shard(transform: Callable[[Any], List[EngagementRecord]], shard: List[dict],
+                     shared_data: Tuple[List[dict], ...] = None) -> Tuple[List[str], str, EngagementCountView]:
+    engagement_data = transform(shard if shared_data is None else (shard, *shared_data))
+    count_view = EngagementCountView()
+    count_view.add_records(engagement_data)
+    fields = list(engagement_data[0].data) if engagement_data else []
+    return fields, format_engagement_rows(engagement_data), count_view
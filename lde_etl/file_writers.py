@@ -1,10 +1,18 @@
 import csv
-from typing import List
+import io
+from typing import List, Tuple
 
+import numpy as np
 import pandas as pd
-from pandas import ExcelWriter
+import xlsxwriter
 
+from lde_etl.common import atomic_write, process_pool
 from lde_etl.data_model import EngagementRecord
+from lde_etl.transform_utils import partition_by_column
+
+# the same header style that DataFrame.to_excel uses
+HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+CONSTANT_MEMORY_ROW_THRESHOLD = 10000
 
 
 def write_engagement_data(filepath: str, engagement_data: List[EngagementRecord]):
@@ -13,6 +21,65 @@ def write_engagement_data(filepath: str, engagement_data: List[EngagementRecord]
     write_to_csv(filepath, writeable_data)
 
 
+class EngagementDataWriter:
+    """
+    Write engagement data to a csv file one batch of records at a time.
+
+    The rows are written to a temporary file that replaces the csv only once every batch has been written,
+    so a run that fails partway through leaves the previous engagement data in place.
+
+    :param filepath: the path to the engagement data csv
+    """
+
+    def __init__(self, filepath: str):
+        self.filepath = filepath
+        self._atomic_write = None
+        self._file = None
+        self._dict_writer = None
+
+    def __enter__(self):
+        self._atomic_write = atomic_write(self.filepath)
+        self._file = self._atomic_write.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self._atomic_write.__exit__(exc_type, exc_val, exc_tb)
+
+    def write(self, engagement_data: List[EngagementRecord]):
+        """Append a batch of engagement records to the csv"""
+        writeable_data = [record.data for record in engagement_data]
+        if not writeable_data:
+            return
+        if self._dict_writer is None:
+            self._dict_writer = csv.DictWriter(self._file, writeable_data[0].keys(), lineterminator='\n')
+            self._dict_writer.writeheader()
+        self._dict_writer.writerows(writeable_data)
+
+    def write_rows(self, fields: List[str], rows: str):
+        """
+        Append a batch of engagement records that were already formatted by format_engagement_rows to the csv
+
+        :param fields: the fields of the records
+        :param rows: the records' csv rows
+        """
+        if not rows:
+            return
+        if self._dict_writer is None:
+            self._dict_writer = csv.DictWriter(self._file, fields, lineterminator='\n')
+            self._dict_writer.writeheader()
+        self._file.write(rows)
+
+
+def format_engagement_rows(engagement_data: List[EngagementRecord]) -> str:
+    """Format engagement records as rows of the engagement data csv, without the header"""
+    writeable_data = [record.data for record in engagement_data]
+    if not writeable_data:
+        return ''
+    rows = io.StringIO()
+    csv.DictWriter(rows, writeable_data[0].keys(), lineterminator='\n').writerows(writeable_data)
+    return rows.getvalue()
+
+
 def write_to_csv(filepath: str, data: List[dict]):
     """Write data to a csv"""
     header = data[0].keys()
@@ -23,6 +90,11 @@ def write_to_csv(filepath: str, data: List[dict]):
     return filepath
 
 
+def write_excel_file(filepath: str, df: pd.DataFrame):
+    """Write a dataframe to an excel file"""
+    df.to_excel(filepath, index=False)
+
+
 def write_roster_excel_file(filepath: str, data: List[dict]):
     """Write student roster data to a multi-sheet excel file"""
 
@@ -31,61 +103,61 @@ def write_roster_excel_file(filepath: str, data: List[dict]):
                    'department', 'colleges', 'majors', 'school_year', 'is_pre_med',
                    'has_activated_handshake', 'has_completed_profile', 'is_athlete', 'sports']]
 
-    def _adjust_column_widths(df: pd.DataFrame, worksheet):
-        """Thanks to https://stackoverflow.com/a/40535454"""
-        for idx, col in enumerate(df):  # loop through all columns
-            series = df[col]
-            max_len = max((
-                series.astype(str).map(len).max(),  # len of largest item
-                len(str(series.name))  # len of column name/header
-            ))
-            worksheet.set_column(idx, idx, max_len)  # set column width
-
     def _determine_sheet_name(department: str) -> str:
         if department == '':
             return 'no_department'
         else:
             return f'{department}_dept'
 
-    def _write_department_roster_sheet(dept_roster: pd.DataFrame, sheet_name: str, writer: ExcelWriter):
-        dept_roster.to_excel(writer, sheet_name=sheet_name, index=False)
-        worksheet = writer.sheets[sheet_name]
-        _adjust_column_widths(dept_roster, worksheet)
-
     df = pd.DataFrame(data)
     df = _set_column_order(df)
 
-    departments = sorted(df['department'].unique())
-    with ExcelWriter(filepath) as writer:
-        for department in departments:
-            dept_roster = df.loc[df['department'] == department]
-            sheet_name = _determine_sheet_name(department)
-            _write_department_roster_sheet(dept_roster, sheet_name, writer)
-        writer.save()
+    sheets = [(_determine_sheet_name(department), dept_roster)
+              for department, dept_roster in partition_by_column(df, 'department', sort=True)]
+    write_excel_workbook(filepath, sheets)
 
 
-def write_roster_excel_files(dir_path: str, rosters: List[pd.DataFrame]):
+def write_roster_excel_files(dir_path: str, rosters: List[pd.DataFrame], max_workers: int = None):
+    """Write each department roster to its own excel file, writing the files in parallel across processes"""
 
     def roster_file_name(roster: pd.DataFrame) -> str:
         return roster['department'][0] + '_roster'
 
-    def _write_department_roster_sheet(roster: pd.DataFrame, writer: ExcelWriter):
-        roster.to_excel(writer, index=False)
-        worksheet = writer.sheets['Sheet1']
-        _adjust_column_widths(roster, worksheet)
-
-    def _adjust_column_widths(df: pd.DataFrame, worksheet):
-        """Thanks to https://stackoverflow.com/a/40535454"""
-        for idx, col in enumerate(df):  # loop through all columns
-            series = df[col]
-            max_len = max((
-                series.astype(str).map(len).max(),  # len of largest item
-                len(str(series.name))  # len of column name/header
-            ))
-            worksheet.set_column(idx, idx, max_len)  # set column width
-
-    for roster in rosters:
-        roster_filepath = dir_path + roster_file_name(roster) + '.xlsx'
-        with ExcelWriter(roster_filepath) as writer:
-            _write_department_roster_sheet(roster, writer)
-            writer.save()
+    roster_filepaths = [dir_path + roster_file_name(roster) + '.xlsx' for roster in rosters]
+    with process_pool(max_workers=max_workers) as executor:
+        # consume the results so that any exception raised by a worker is re-raised here
+        list(executor.map(write_excel_workbook, roster_filepaths, [[('Sheet1', roster)] for roster in rosters]))
+
+
+def write_excel_workbook(filepath: str, sheets: List[Tuple[str, pd.DataFrame]]):
+    """
+    Write dataframes to the sheets of an excel file, formatted the way DataFrame.to_excel formats them and with
+    each column sized to fit its longest value. Rows are written in order, which lets large workbooks use
+    xlsxwriter's constant memory mode.
+
+    :param filepath: the filepath of the excel file to write
+    :param sheets: a list of (sheet name, dataframe) pairs to write, in sheet order
+    """
+    row_count = sum(len(df) for _, df in sheets)
+    workbook = xlsxwriter.Workbook(filepath, {
+        'constant_memory': row_count > CONSTANT_MEMORY_ROW_THRESHOLD,
+        'default_date_format': 'YYYY-MM-DD HH:MM:SS'
+    })
+    header_format = workbook.add_format(HEADER_FORMAT)
+    for sheet_name, df in sheets:
+        worksheet = workbook.add_worksheet(sheet_name)
+        for idx, width in enumerate(column_widths(df)):
+            worksheet.set_column(idx, idx, width)
+        worksheet.write_row(0, 0, [str(column) for column in df.columns], header_format)
+        cells = df.astype(object).where(df.notna(), None)
+        for row_idx, row in enumerate(cells.itertuples(index=False), start=1):
+            worksheet.write_row(row_idx, 0, row)
+    workbook.close()
+
+
+def column_widths(df: pd.DataFrame) -> List[int]:
+    """Find the length of the longest value or header in each column, in a single pass over the dataframe"""
+    # DataFrame.astype(str) can overwrite unpickled object columns in place, so convert through numpy instead
+    value_lengths = np.char.str_len(df.to_numpy(dtype=str)).max(axis=0, initial=0)
+    header_lengths = [len(str(column)) for column in df.columns]
+    return [int(length) for length in np.maximum(value_lengths, header_lengths)]
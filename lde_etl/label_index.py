@@ -0,0 +1,52 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+class LabelIndex:
+    """
+    A multi-hot index of the labels in a column of label lists, like the institution labels of each student.
+
+    Each distinct label list is split into labels only once, and the labels are stored as a sparse row-by-label
+    matrix (in compressed sparse row form) over a vocabulary of every label that appears. Checking which rows
+    have a label is then a lookup in the vocabulary plus a vectorized pass over the matrix, so each new
+    label-driven rule costs an array operation rather than another text scan of every label list.
+    """
+
+    def __init__(self, label_lists: pd.Series, separator: str = ', '):
+        """
+        :param label_lists: a column of label lists, each a string of labels joined by the separator
+        :param separator: the string the labels of each list are joined with
+        """
+        self.index = label_lists.index
+        # rows with the same label list share a row of the matrix, and null label lists get an empty row
+        self._list_codes, unique_label_lists = pd.factorize(label_lists)
+        self._list_codes = np.where(self._list_codes < 0, len(unique_label_lists), self._list_codes)
+        tokenized_lists = [_split_label_list(label_list, separator) for label_list in unique_label_lists] + [[]]
+        self._indptr = np.cumsum([0] + [len(labels) for labels in tokenized_lists])
+        label_ids, self.vocabulary = pd.factorize(pd.Series([label for labels in tokenized_lists for label in labels],
+                                                            dtype=object))
+        self._label_ids = label_ids.astype(np.int64)
+        self._label_list_rows = np.repeat(np.arange(len(tokenized_lists)), np.diff(self._indptr))
+
+    def has_label(self, label: str) -> pd.Series:
+        """Find the rows whose label list includes a label"""
+        return self._has_any_label_id(np.flatnonzero(self.vocabulary == label))
+
+    def has_any_label(self, labels: List[str]) -> pd.Series:
+        """Find the rows whose label list includes at least one of several labels"""
+        return self._has_any_label_id(np.flatnonzero(self.vocabulary.isin(labels)))
+
+    def has_label_containing(self, text: str) -> pd.Series:
+        """Find the rows whose label list includes a label that contains some text"""
+        return self._has_any_label_id(np.flatnonzero([text in label for label in self.vocabulary]))
+
+    def _has_any_label_id(self, label_ids: np.ndarray) -> pd.Series:
+        lists_with_label = np.zeros(len(self._indptr) - 1, dtype=bool)
+        lists_with_label[self._label_list_rows[np.isin(self._label_ids, label_ids)]] = True
+        return pd.Series(lists_with_label[self._list_codes], index=self.index)
+
+
+def _split_label_list(label_list: str, separator: str) -> List[str]:
+    return [label.strip() for label in str(label_list).split(separator) if label.strip()]
@@ -0,0 +1,385 @@
+import argparse
+import json
+import threading
+import time
+import traceback
+from datetime import date, datetime
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from lde_etl.checkpoints import get_raw_data_cache
+from lde_etl.cli import load_config_with_credentials
+from lde_etl.data_model import EngagementRecord
+from lde_etl.engagement_count_view import EngagementCountView, save_engagement_count_view
+from lde_etl.engagement_data_etl.pipeline import EngagementSource
+from lde_etl.engagement_data_etl.run_etl import ENGAGEMENT_SOURCES
+from lde_etl.file_writers import EngagementDataWriter
+from lde_etl.session_manager import HandshakeSessionManager
+from lde_etl.stage_graph import Stage
+from lde_etl.student_data_etl import sis_connection
+from lde_etl.student_data_etl.run_etl import make_student_etl_stages, run_student_etl
+from lde_etl.transform_utils import clear_unique_value_cache
+
+STUDENT_JOB_NAME = 'students'
+DEFAULT_REFRESH_MINUTES = {
+    'office_hours': 60,
+    'events': 60,
+    'career_fairs': 60,
+    'interviews': 60,
+    # the student ETL stages that pull raw data from SIS or Handshake each refresh the raw data cache on their own
+    'sis_students': 24 * 60,
+    'wgs_students': 24 * 60,
+    'wse_masters_students': 24 * 60,
+    'handshake_data': 24 * 60,
+    STUDENT_JOB_NAME: 24 * 60,
+}
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+WARM_SIS_CONNECTIONS = 3
+
+
+class RefreshJob:
+    """
+    A refresh of some of the service's data that runs on its own schedule
+
+    :param name: the name of the job
+    :param interval_seconds: how long to wait after the job runs before running it again
+    :param refresh: the function that refreshes the data
+    """
+
+    def __init__(self, name: str, interval_seconds: float, refresh: Callable[[], None]):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.refresh = refresh
+        # every job is due as soon as the service starts
+        self.next_run = 0
+        self.last_refreshed = None
+        self.last_error = None
+
+
+class RefreshScheduler:
+    """
+    Runs each refresh job whenever it is due. The jobs run one at a time, in the order they are listed when
+    several are due at once, since the Handshake jobs share one browser and the student job reads the
+    engagement data the engagement jobs write and the raw student data the student source jobs cache.
+
+    :param jobs: the refresh jobs
+    :param on_failure: a function called with a job and its error whenever a job fails
+    :param clock: the function that gets the current time, in seconds since the epoch
+    """
+
+    def __init__(self, jobs: List[RefreshJob], on_failure: Callable[[RefreshJob, Exception], None] = None,
+                 clock: Callable[[], float] = time.time):
+        self.jobs = jobs
+        self._on_failure = on_failure
+        self._clock = clock
+
+    def run_due_jobs(self) -> float:
+        """
+        Run every job that is due
+
+        :return: the number of seconds until the next job is due
+        """
+        for job in self.jobs:
+            if job.next_run <= self._clock():
+                self._run_job(job)
+        return max(0, min(job.next_run for job in self.jobs) - self._clock())
+
+    def run_forever(self, stop: threading.Event):
+        """Run jobs as they become due until the stop event is set"""
+        while not stop.is_set():
+            stop.wait(self.run_due_jobs())
+
+    def status(self) -> Dict[str, dict]:
+        """Describe when each job last refreshed its data, when it will next run and its last error, if any"""
+        return {job.name: {'last_refreshed': _format_timestamp(job.last_refreshed),
+                           'next_run': _format_timestamp(job.next_run),
+                           'last_error': job.last_error}
+                for job in self.jobs}
+
+    def _run_job(self, job: RefreshJob):
+        print(f'Refreshing {job.name}...')
+        try:
+            job.refresh()
+            job.last_refreshed = self._clock()
+            job.last_error = None
+        except Exception as error:
+            traceback.print_exc()
+            job.last_error = repr(error)
+            if self._on_failure is not None:
+                self._on_failure(job, error)
+        finally:
+            job.next_run = self._clock() + job.interval_seconds
+
+
+class ServiceData:
+    """
+    The latest engagement data and department rosters, kept in memory for the query endpoint.
+
+    Every response is serialized to json when its data is refreshed rather than when it is requested, so
+    serving a request only has to look up the response's bytes. Each engagement source's records are serialized
+    and counted once, when that source is refreshed, and combined with the other sources' without redoing them.
+    """
+
+    def __init__(self, source_names: List[str]):
+        """
+        :param source_names: the names of the engagement sources, in the order their records are listed
+        """
+        self.source_names = source_names
+        self._engagement_data: Dict[str, List[EngagementRecord]] = {}
+        self._engagement_json: Dict[str, bytes] = {}
+        self._engagement_count_views: Dict[str, EngagementCountView] = {}
+        self._engagement_count_view = EngagementCountView()
+        self._responses: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def update_engagement_source(self, source_name: str,
+                                 engagement_data: List[EngagementRecord]) -> Dict[str, List[EngagementRecord]]:
+        """
+        Replace the engagement records of one source
+
+        :param source_name: the name of the source
+        :param engagement_data: the source's latest engagement records
+        :return: the latest engagement records of every source that has been refreshed, by source name
+        """
+        # the source's own records are serialized and counted before taking the lock
+        source_json = _to_json([record.data for record in engagement_data])
+        source_count_view = EngagementCountView()
+        source_count_view.add_records(engagement_data)
+        with self._lock:
+            # only the years the source had or has engagements in can have different counts
+            changed_years = set(source_count_view.academic_years())
+            if source_name in self._engagement_count_views:
+                changed_years.update(self._engagement_count_views[source_name].academic_years())
+            self._engagement_data = dict(self._engagement_data, **{source_name: engagement_data})
+            self._engagement_json[source_name] = source_json
+            self._engagement_count_views[source_name] = source_count_view
+            refreshed_names = [name for name in self.source_names if name in self._engagement_count_views]
+            self._engagement_count_view = EngagementCountView.combine(
+                self._engagement_count_views[name] for name in refreshed_names)
+            responses = {
+                '/engagements': _join_json_lists(self._engagement_json[name] for name in refreshed_names),
+                f'/engagements/{source_name}': source_json,
+            }
+            academic_years = self._engagement_count_view.academic_years()
+            for academic_year in changed_years.intersection(academic_years):
+                responses[f'/engagement_counts/{academic_year}'] = _dataframe_to_json(
+                    self._engagement_count_view.engagement_counts(academic_year))
+            self._update_responses(responses, [f'/engagement_counts/{academic_year}'
+                                               for academic_year in changed_years.difference(academic_years)])
+            return self._engagement_data
+
+    def engagement_count_view(self) -> EngagementCountView:
+        """Get the engagement count view of every source that has been refreshed"""
+        return self._engagement_count_view
+
+    def update_rosters(self, rosters: List[pd.DataFrame]):
+        """Replace the department rosters"""
+        responses = {f'/rosters/{roster["department"][0]}': _dataframe_to_json(roster) for roster in rosters}
+        responses['/rosters'] = _to_json(sorted(roster['department'][0] for roster in rosters))
+        with self._lock:
+            self._update_responses(responses, [path for path in self._responses if path.startswith('/rosters/')])
+
+    def response(self, path: str) -> Optional[bytes]:
+        """
+        Get the json response for a path
+
+        :param path: the requested path
+        :return: the response, or None if there is no data at the path
+        """
+        return self._responses.get(path)
+
+    def _update_responses(self, responses: Dict[str, bytes], removed_paths: Iterable[str] = ()):
+        # swap in a new dict rather than changing the one that request threads may be reading
+        removed_paths = set(removed_paths)
+        kept_responses = {path: response for path, response in self._responses.items() if path not in removed_paths}
+        self._responses = dict(kept_responses, **responses)
+
+
+class EtlService:
+    """
+    A long-running ETL that refreshes each engagement source and the student data on its own schedule, keeping
+    the Handshake browser session and SIS connections open between refreshes, and serves the latest engagement
+    data and department rosters from memory over a local HTTP endpoint.
+
+    Each student ETL stage that pulls raw data from SIS or Handshake is a job of its own that refreshes the raw
+    data cache, so a failed or slow extract only reruns itself. The student job transforms the cached raw data.
+
+    :param config: the ETL config
+    :param refresh_minutes: the minutes between refreshes of each engagement source and of the student data,
+        by job name. Jobs that are left out use DEFAULT_REFRESH_MINUTES.
+    """
+
+    def __init__(self, config, refresh_minutes: Dict[str, float] = None):
+        self.config = config
+        refresh_minutes = dict(DEFAULT_REFRESH_MINUTES, **(refresh_minutes or {}))
+        self.data = ServiceData([source.name for source in ENGAGEMENT_SOURCES])
+        self.sessions = HandshakeSessionManager(config)
+        self.student_raw_data_cache = get_raw_data_cache(config['run_dir'], 'student')
+        jobs = [RefreshJob(source.name, refresh_minutes[source.name] * 60,
+                           partial(self.refresh_engagement_source, source))
+                for source in ENGAGEMENT_SOURCES]
+        jobs.extend(RefreshJob(stage.name, refresh_minutes[stage.name] * 60,
+                               partial(self.refresh_student_source, stage))
+                    for stage in make_student_etl_stages(config, sessions=self.sessions) if stage.pulls_raw_data)
+        jobs.append(RefreshJob(STUDENT_JOB_NAME, refresh_minutes[STUDENT_JOB_NAME] * 60, self.refresh_students))
+        self.scheduler = RefreshScheduler(jobs, on_failure=self._on_refresh_failure)
+
+    def refresh_engagement_source(self, source: EngagementSource):
+        """
+        Pull one engagement source, then rewrite the engagement data file and count view once every source has
+        been pulled at least once
+        """
+        try:
+            engagement_data = source.transform(source.extract(self.sessions.get_browser(),
+                                                              self.config['download_dir']))
+        finally:
+            # each refresh is a run of its own, so the per-run transform caches shouldn't outlive it
+            clear_unique_value_cache()
+        engagement_data_by_source = self.data.update_engagement_source(source.name, engagement_data)
+        if all(name in engagement_data_by_source for name in self.data.source_names):
+            write_engagement_sources(self.config, [engagement_data_by_source[name]
+                                                   for name in self.data.source_names],
+                                     self.data.engagement_count_view())
+
+    def refresh_student_source(self, stage: Stage):
+        """Pull the raw data of one student ETL source stage into the raw data cache the student job reads"""
+        self.student_raw_data_cache.save(stage.name, stage.func())
+
+    def refresh_students(self):
+        """Run the student ETL on the cached raw data and keep its department rosters"""
+        try:
+            run = run_student_etl(self.config, sessions=self.sessions, transform_only=True)
+        finally:
+            clear_unique_value_cache()
+        self.data.update_rosters(run.outputs['department_rosters'])
+
+    def serve_forever(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        """Serve queries and refresh the data on schedule until interrupted"""
+        sis_connection.SIS_CONNECTION_POOL.max_idle_connections = WARM_SIS_CONNECTIONS
+        server = make_query_server(self.data, self.scheduler.status, host, port)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f'Serving engagement and roster data at http://{host}:{server.server_port}')
+        try:
+            self.scheduler.run_forever(threading.Event())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.shutdown()
+            server.server_close()
+            self.sessions.close()
+            sis_connection.SIS_CONNECTION_POOL.close_all()
+
+    def _on_refresh_failure(self, job: RefreshJob, error: Exception):
+        # the failure may be an expired Handshake session, so the next refresh starts from the saved session or,
+        # if that has expired too, a new login
+        self.sessions.close()
+
+
+def write_engagement_sources(config, engagement_data_by_source: List[List[EngagementRecord]],
+                             engagement_count_view: EngagementCountView):
+    """
+    Write the engagement records of every source to the engagement data file and save the view that counts them
+
+    :param config: the ETL config
+    :param engagement_data_by_source: the engagement records of each source
+    :param engagement_count_view: the engagement count view of all of the records
+    """
+    with EngagementDataWriter(config['engagement_data_filepath']) as engagement_data_writer:
+        for engagement_data in engagement_data_by_source:
+            engagement_data_writer.write(engagement_data)
+    save_engagement_count_view(engagement_count_view, config['engagement_counts_filepath'],
+                               config['engagement_data_filepath'])
+
+
+def make_query_server(data: ServiceData, get_status: Callable[[], dict], host: str = DEFAULT_HOST,
+                      port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """
+    Make an HTTP server for the service's data. It answers GET requests for:
+
+        * /status - when each refresh job last ran and its last error
+        * /engagements and /engagements/<source> - the engagement records of every source or of one source
+        * /engagement_counts/<academic year> - the engagement counts of each student in an academic year
+        * /rosters and /rosters/<department> - the departments that have rosters, or one department's roster
+
+    :param data: the service's data
+    :param get_status: a function that describes the status of the service's refresh jobs
+    :param host: the address to listen on, which should stay local since the data identifies students
+    :param port: the port to listen on, or 0 for any free port
+    :return: the server, which has not started serving yet
+    """
+
+    class QueryHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+            if path == '/status':
+                self._send_json(200, _to_json(get_status()))
+                return
+            response = data.response(path)
+            if response is None:
+                self._send_json(404, _to_json({'error': f'No data at {path}'}))
+            else:
+                self._send_json(200, response)
+
+        def _send_json(self, status: int, body: bytes):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # keep the service's output to its refresh messages
+            pass
+
+    return ThreadingHTTPServer((host, port), QueryHandler)
+
+
+def _to_json(data) -> bytes:
+    return json.dumps(data, default=_json_default).encode('utf-8')
+
+
+def _join_json_lists(json_lists: Iterable[bytes]) -> bytes:
+    """Join json lists, as serialized by _to_json, into one list without deserializing them"""
+    items = [json_list[1:-1] for json_list in json_lists if json_list != b'[]']
+    return b'[' + b', '.join(items) + b']'
+
+
+def _dataframe_to_json(df: pd.DataFrame) -> bytes:
+    return df.to_json(orient='records', date_format='iso').encode('utf-8')
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def _format_timestamp(timestamp: Optional[float]) -> Optional[str]:
+    if not timestamp:
+        return None
+    return datetime.fromtimestamp(timestamp).isoformat(timespec='seconds')
+
+
+def _parse_refresh_minutes(value: str):
+    job_name, _, minutes = value.partition('=')
+    if job_name not in DEFAULT_REFRESH_MINUTES or not minutes:
+        raise argparse.ArgumentTypeError(f'Expected JOB=MINUTES with JOB one of {list(DEFAULT_REFRESH_MINUTES)}')
+    return job_name, float(minutes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='lde_etl.service',
+                                     description='Refresh the ETL data on a schedule and serve it over HTTP')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='the address to serve on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='the port to serve on')
+    parser.add_argument('--refresh-minutes', metavar='JOB=MINUTES', type=_parse_refresh_minutes, action='append',
+                        default=[], help=f'how often to refresh a job, one of {list(DEFAULT_REFRESH_MINUTES)}')
+    parser.add_argument('--secrets-file', help='a json file with jhed, handshake_email and handshake_pw values')
+    args = parser.parse_args()
+    config = load_config_with_credentials(args.secrets_file)
+    EtlService(config, dict(args.refresh_minutes)).serve_forever(args.host, args.port)
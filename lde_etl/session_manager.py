@@ -0,0 +1,141 @@
+import json
+import os
+from typing import TYPE_CHECKING, List, Optional
+
+from lde_etl.common import atomic_write
+
+if TYPE_CHECKING:
+    from autohandshake import HandshakeBrowser
+
+# the cookie fields that can be passed back to the browser when a session is restored
+RESTORABLE_COOKIE_FIELDS = ['name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'expiry']
+
+
+class HandshakeSessionManager:
+    """
+    Shares one logged-in Handshake browser between every ETL of a run, and keeps the login between runs.
+
+    The browser is only started when an ETL first asks for it, so a run that has nothing to download never opens
+    one. When it is started, the session cookies saved by the last run are restored, and a full login only happens
+    if there are no saved cookies or the session they belong to has expired. The cookies are saved again once
+    the login succeeds and when the manager is closed. Should be used as a context manager. Example:
+    ::
+
+        with HandshakeSessionManager(config) as sessions:
+            run_engagement_etl(config, sessions=sessions)
+            run_student_etl(config, sessions=sessions)
+    """
+
+    def __init__(self, config, max_wait_time=300):
+        self._login_url = config['handshake_url']
+        self._email = config['handshake_email']
+        self._password = config['handshake_pw']
+        self._download_dir = config['download_dir']
+        self._chromedriver_path = config['chromedriver_path']
+        self._cookies_filepath = config['handshake_session_filepath']
+        self._max_wait_time = max_wait_time
+        self._browser = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_browser(self) -> 'HandshakeBrowser':
+        """
+        Get the run's logged-in browser, starting it and logging in the first time it is asked for
+
+        :return: a logged-in HandshakeBrowser
+        """
+        if self._browser is None:
+            browser = self._start_browser()
+            try:
+                if not self._restore_session(browser):
+                    print('Logging into Handshake...')
+                    self._log_in(browser)
+                    self._save_session(browser)
+            except BaseException:
+                browser.quit()
+                raise
+            self._browser = browser
+        return self._browser
+
+    def close(self):
+        """Save the session cookies and close the browser, if it was started"""
+        if self._browser is not None:
+            try:
+                self._save_session(self._browser)
+            finally:
+                self._browser.quit()
+                self._browser = None
+
+    def _start_browser(self) -> 'HandshakeBrowser':
+        # imported here so that importing the ETLs never loads selenium
+        from autohandshake import HandshakeBrowser
+        return HandshakeBrowser(max_wait_time=self._max_wait_time, chromedriver_path=self._chromedriver_path,
+                                download_dir=self._download_dir)
+
+    def _restore_session(self, browser: 'HandshakeBrowser') -> bool:
+        cookies = load_session_cookies(self._cookies_filepath, self._login_url, self._email)
+        if not cookies:
+            return False
+        # HandshakeBrowser has no methods for cookies, so they are handled through its selenium driver. Cookies
+        # can only be added for the site the browser is on.
+        browser.get(self._login_url)
+        for cookie in cookies:
+            browser._browser.add_cookie(cookie)
+        browser.get(self._login_url)
+        if self._is_logged_in(browser):
+            browser.update_constants()
+            return True
+        browser._browser.delete_all_cookies()
+        return False
+
+    @staticmethod
+    def _is_logged_in(browser: 'HandshakeBrowser') -> bool:
+        return browser.element_exists_by_xpath('//meta[@name="logged_in_user_id"]')
+
+    def _log_in(self, browser: 'HandshakeBrowser'):
+        from autohandshake.src.Pages.LoginPage import LoginPage
+        browser.get(self._login_url)
+        LoginPage(self._login_url, browser).login(self._email, self._password)
+        browser.update_constants()
+
+    def _save_session(self, browser: 'HandshakeBrowser'):
+        save_session_cookies(self._cookies_filepath, self._login_url, self._email, browser._browser.get_cookies())
+
+
+def load_session_cookies(filepath: str, login_url: str, email: str) -> Optional[List[dict]]:
+    """
+    Load the session cookies saved for a Handshake account
+
+    :param filepath: the file the cookies are saved in
+    :param login_url: the Handshake login url the cookies were saved for
+    :param email: the email of the account the cookies were saved for
+    :return: the saved cookies, or None if there are no cookies saved for the account
+    """
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath, 'r') as file:
+        session = json.load(file)
+    if session.get('login_url') != login_url or session.get('email') != email:
+        return None
+    return session['cookies']
+
+
+def save_session_cookies(filepath: str, login_url: str, email: str, cookies: List[dict]):
+    """
+    Save the session cookies of a Handshake account, readable only by the current user since they grant access
+    to the account
+
+    :param filepath: the file to save the cookies in
+    :param login_url: the Handshake login url of the session
+    :param email: the email of the account the session is logged into
+    :param cookies: the browser's cookies
+    """
+    session = {'login_url': login_url, 'email': email,
+               'cookies': [{field: cookie[field] for field in RESTORABLE_COOKIE_FIELDS if field in cookie}
+                           for cookie in cookies]}
+    with atomic_write(filepath, permissions=0o600) as file:
+        json.dump(session, file)
@@ -0,0 +1,216 @@
+import time
+from functools import partial
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from lde_etl.checkpoints import RunCheckpoints
+from lde_etl.common import process_pool
+
+STAGE_KINDS = ['io', 'cpu']
+
+
+class Stage:
+    """
+    A step of an ETL, declared along with the stages whose outputs it takes
+
+    :param name: the name of the stage, unique within its graph
+    :param func: the function that runs the stage, called with the outputs of its dependencies in order. The
+        functions of cpu stages and their arguments must be picklable.
+    :param dependencies: the names of the stages whose outputs the stage takes
+    :param kind: 'io' for stages run on a thread pool, or 'cpu' for stages run on a process pool
+    :param pulls_raw_data: whether the stage pulls raw data from Handshake or SIS, for cache_source_stages
+    """
+
+    def __init__(self, name: str, func: Callable, dependencies: Sequence[str] = (), kind: str = 'io',
+                 pulls_raw_data: bool = False):
+        if kind not in STAGE_KINDS:
+            raise ValueError(f'Unknown stage kind {kind!r}, expected one of {STAGE_KINDS}')
+        if pulls_raw_data and dependencies:
+            raise ValueError(f'Stage {name!r} pulls raw data, so it cannot depend on other stages')
+        self.name = name
+        self.func = func
+        self.dependencies = list(dependencies)
+        self.kind = kind
+        self.pulls_raw_data = pulls_raw_data
+
+
+class StageTiming:
+    """When a stage started and finished running, in seconds since the epoch"""
+
+    def __init__(self, stage: Stage, started: float, finished: float):
+        self.stage = stage
+        self.started = started
+        self.finished = finished
+
+    @property
+    def duration(self) -> float:
+        return self.finished - self.started
+
+
+class StageGraphRun:
+    """The outputs and timings of a run of a stage graph"""
+
+    def __init__(self, outputs: Dict[str, Any], timings: Dict[str, StageTiming]):
+        self.outputs = outputs
+        self.timings = timings
+
+    def critical_path(self) -> List[str]:
+        """Find the chain of dependent stages with the longest total duration"""
+        path_durations = {}
+        path_predecessors = {}
+        for name in sorted(self.timings, key=lambda stage_name: self.timings[stage_name].finished):
+            timing = self.timings[name]
+            # stages resumed from checkpoints were not run, so they are left out of the path
+            run_dependencies = [name for name in timing.stage.dependencies if name in path_durations]
+            predecessor = max(run_dependencies, key=lambda dependency: path_durations[dependency], default=None)
+            path_predecessors[name] = predecessor
+            path_durations[name] = timing.duration + (path_durations[predecessor] if predecessor else 0)
+        name = max(path_durations, key=lambda stage_name: path_durations[stage_name], default=None)
+        path = []
+        while name is not None:
+            path.append(name)
+            name = path_predecessors[name]
+        return path[::-1]
+
+    def report(self) -> str:
+        """Describe when each stage ran and how long it took, followed by the critical path"""
+        if not self.timings:
+            return 'No stages were run'
+        run_start = min(timing.started for timing in self.timings.values())
+        lines = [f'{"stage":<32}{"kind":<6}{"start":>9}{"duration":>10}']
+        for timing in sorted(self.timings.values(), key=lambda stage_timing: stage_timing.started):
+            lines.append(f'{timing.stage.name:<32}{timing.stage.kind:<6}'
+                         f'{timing.started - run_start:>8.1f}s{timing.duration:>9.1f}s')
+        critical_path = self.critical_path()
+        critical_path_duration = sum(self.timings[name].duration for name in critical_path)
+        lines.append(f'Critical path ({critical_path_duration:.1f}s): {" -> ".join(critical_path)}')
+        return '\n'.join(lines)
+
+
+def run_stage_graph(stages: List[Stage], max_io_workers: int = None, max_cpu_workers: int = None,
+                    checkpoints: RunCheckpoints = None) -> StageGraphRun:
+    """
+    Run a graph of stages, starting each stage as soon as its dependencies have finished. If a stage fails, no
+    further stages are started and the error is re-raised once the running stages finish.
+
+    :param stages: the stages of the graph
+    :param max_io_workers: the maximum number of io stages to run at once
+    :param max_cpu_workers: the maximum number of cpu stages to run at once
+    :param checkpoints: the checkpoints of the run, if each stage's output should be checkpointed. Stages that
+        finished in an earlier attempt at the run are not run again.
+    :return: the output of every stage that was run or loaded, and the timing of every stage that was run
+    """
+    stages_by_name = _validate_stage_graph(stages)
+    outputs = {}
+    timings = {}
+    waiting = list(stages)
+    if checkpoints is not None:
+        waiting = [stage for stage in stages if not checkpoints.is_complete(stage.name)]
+        needed_outputs = {name for stage in waiting for name in stage.dependencies}
+        for stage in stages:
+            if checkpoints.is_complete(stage.name) and stage.name in needed_outputs:
+                outputs[stage.name] = checkpoints.load(stage.name)
+    running: Dict[Future, Stage] = {}
+    saving: List[Future] = []
+    # a single thread writes the checkpoints, so they are written in the order their stages finished
+    with ThreadPoolExecutor(max_workers=1) as checkpoint_executor, \
+            ThreadPoolExecutor(max_workers=max_io_workers) as io_executor, \
+            process_pool(max_workers=max_cpu_workers) as cpu_executor:
+        executors = {'io': io_executor, 'cpu': cpu_executor}
+        try:
+            while waiting or running:
+                for stage in [stage for stage in waiting if all(name in outputs for name in stage.dependencies)]:
+                    waiting.remove(stage)
+                    args = [outputs[name] for name in stage.dependencies]
+                    running[executors[stage.kind].submit(_timed_call, stage.func, args)] = stage
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    outputs[stage.name], started, finished = future.result()
+                    timings[stage.name] = StageTiming(stages_by_name[stage.name], started, finished)
+                    if checkpoints is not None:
+                        saving.append(checkpoint_executor.submit(checkpoints.save, stage.name, outputs[stage.name]))
+            for future in saving:
+                future.result()
+        except BaseException:
+            for future in running:
+                future.cancel()
+            raise
+    return StageGraphRun(outputs, timings)
+
+
+def select_stages(stages: List[Stage], stage_names: List[str]) -> List[Stage]:
+    """
+    Select some stages of a graph along with every stage they depend on, directly or indirectly
+
+    :param stages: the stages of the graph
+    :param stage_names: the names of the stages to select
+    :return: the selected stages and their dependencies, in the order they are listed in the graph
+    """
+    stages_by_name = _validate_stage_graph(stages)
+    unknown_stage_names = [name for name in stage_names if name not in stages_by_name]
+    if unknown_stage_names:
+        raise ValueError(f'Unknown stages {unknown_stage_names}, expected some of {list(stages_by_name)}')
+    selected = set()
+    unvisited = list(stage_names)
+    while unvisited:
+        name = unvisited.pop()
+        if name not in selected:
+            selected.add(name)
+            unvisited.extend(stages_by_name[name].dependencies)
+    return [stage for stage in stages if stage.name in selected]
+
+
+def cache_source_stages(stages: List[Stage], cache: RunCheckpoints, load_from_cache: bool = False) -> List[Stage]:
+    """
+    Keep the latest output of each stage that pulls raw data, so that the transforms can be rerun without it
+
+    :param stages: the stages of the graph
+    :param cache: the checkpoints the outputs of the source stages are kept in
+    :param load_from_cache: whether to load the cached outputs of the source stages instead of running them
+    :return: the stages, with each source stage replaced by one that caches or loads its output
+    """
+    cached_stages = []
+    for stage in stages:
+        if not stage.pulls_raw_data:
+            cached_stages.append(stage)
+        elif load_from_cache:
+            cached_stages.append(Stage(stage.name, partial(cache.load, stage.name), pulls_raw_data=True))
+        else:
+            # source stages are run on threads so that the cache is only ever written from this process
+            cached_stages.append(Stage(stage.name, partial(_run_and_cache, cache, stage.name, stage.func),
+                                       pulls_raw_data=True))
+    return cached_stages
+
+
+def _run_and_cache(cache: RunCheckpoints, stage_name: str, func: Callable) -> Any:
+    output = func()
+    cache.save(stage_name, output)
+    return output
+
+
+def _validate_stage_graph(stages: List[Stage]) -> Dict[str, Stage]:
+    stages_by_name = {}
+    for stage in stages:
+        if stage.name in stages_by_name:
+            raise ValueError(f'More than one stage is named {stage.name!r}')
+        stages_by_name[stage.name] = stage
+    for stage in stages:
+        unknown_dependencies = [name for name in stage.dependencies if name not in stages_by_name]
+        if unknown_dependencies:
+            raise ValueError(f'Stage {stage.name!r} depends on unknown stages {unknown_dependencies}')
+    resolved = set()
+    unresolved = list(stages)
+    while unresolved:
+        ready = [stage for stage in unresolved if all(name in resolved for name in stage.dependencies)]
+        if not ready:
+            raise ValueError(f'Stages {[stage.name for stage in unresolved]} have circular dependencies')
+        resolved.update(stage.name for stage in ready)
+        unresolved = [stage for stage in unresolved if stage.name not in resolved]
+    return stages_by_name
+
+
+def _timed_call(func: Callable, args: List[Any]) -> Tuple[Any, float, float]:
+    started = time.time()
+    output = func(*args)
+    return output, started, time.time()
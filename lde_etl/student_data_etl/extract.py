@@ -3,16 +3,22 @@ from datetime import datetime
 
 import pandas as pd
 
-from lde_etl.common import BrowsingSession
 from lde_etl.common import InsightsReport
 from lde_etl.common import read_csv
 from lde_etl.data_model import EngagementRecord
+from lde_etl.engagement_count_view import load_engagement_count_view
+from lde_etl.session_manager import HandshakeSessionManager
 from lde_etl.student_data_etl.sis_connection import SISConnection
+from lde_etl.student_data_etl.spreadsheet_cache import read_spreadsheet
+from lde_etl.student_data_etl.transform_handshake_data import HANDSHAKE_REPORT_FIELDS
 from lde_etl.student_data_etl.transform_handshake_data import transform_handshake_data
 
 STUDENTS_INSIGHTS_REPORT = InsightsReport(
     url='https://app.joinhandshake.com/analytics/reports/9241',
+    fields=HANDSHAKE_REPORT_FIELDS
 )
+ATHLETE_COLUMNS = ['University ID', 'Sport']
+SLI_COLUMNS = ['hopkins_id', 'is_top_4_officer']
 
 
 def read_file_to_string(file_path) -> str:
@@ -38,7 +44,7 @@ def get_sis_data(sis_query_filepath) -> pd.DataFrame:
 
 
 def get_pell_data(filepath) -> pd.DataFrame:
-    return pd.read_excel(filepath)
+    return read_spreadsheet(filepath)
 
 
 def get_major_metadata(filepath) -> pd.DataFrame:
@@ -46,22 +52,48 @@ def get_major_metadata(filepath) -> pd.DataFrame:
 
 
 def get_athlete_data(filepath) -> pd.DataFrame:
-    athlete_data = pd.read_csv(filepath)
-    athlete_data = athlete_data[['University ID', 'Sport']]
+    athlete_data = read_spreadsheet(filepath)
+    athlete_data = athlete_data[ATHLETE_COLUMNS]
     return athlete_data
 
 
 def get_sli_data(filepath) -> pd.DataFrame:
-    sli_data = pd.read_excel(filepath)
-    sli_data = sli_data[['hopkins_id', 'is_top_4_officer']]
+    sli_data = read_spreadsheet(filepath)
+    sli_data = sli_data[SLI_COLUMNS]
     return sli_data
 
 
-def get_handshake_data(config) -> pd.DataFrame:
-    with BrowsingSession(config) as browser:
-        return transform_handshake_data(pd.DataFrame(STUDENTS_INSIGHTS_REPORT.extract_data(browser, config['download_dir'])))
-
-
-def get_this_years_engagement_data(filepath) -> pd.DataFrame:
-    engagement_data = pd.read_csv(filepath, encoding='ISO-8859-1')
-    return engagement_data.loc[engagement_data['academic_year'] == EngagementRecord.academic_year(datetime.now())]
+def get_previous_run_table(filepath, columns) -> pd.DataFrame:
+    if os.path.exists(filepath):
+        return pd.read_csv(filepath, dtype=str)[columns]
+    else:
+        return pd.DataFrame({column: [] for column in columns}, dtype=str)
+
+
+def get_handshake_data(config, sessions: HandshakeSessionManager = None) -> pd.DataFrame:
+    """
+    Download the Handshake student report and clean it
+
+    :param config: the ETL config
+    :param sessions: the run's Handshake session manager, to reuse a browser that is already logged in. If not
+        given, a session is opened just for this download.
+    :return: the cleaned Handshake student data
+    """
+    if sessions is None:
+        with HandshakeSessionManager(config) as sessions:
+            return get_handshake_data(config, sessions)
+    raw_data = STUDENTS_INSIGHTS_REPORT.extract_data(sessions.get_browser(), config['download_dir'])
+    return transform_handshake_data(pd.DataFrame(raw_data))
+
+
+def get_this_years_engagement_counts(engagement_data_filepath, engagement_counts_filepath) -> pd.DataFrame:
+    """
+    Get this academic year's engagement counts from the engagement count view, which is only rebuilt from the
+    engagement data file if it is missing or out of date
+
+    :param engagement_data_filepath: the path to the engagement data csv
+    :param engagement_counts_filepath: the path to the engagement count view
+    :return: the engagement counts, in the same format as count_engagements_by_type
+    """
+    view = load_engagement_count_view(engagement_counts_filepath, engagement_data_filepath)
+    return view.engagement_counts(EngagementRecord.academic_year(datetime.now()))
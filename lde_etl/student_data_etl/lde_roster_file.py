@@ -1,67 +1,103 @@
-from typing import List
+from typing import Dict, List
 
-import numpy
+import numpy as np
 import pandas as pd
 
+from lde_etl.column_requirements import project_columns
+from lde_etl.transform_utils import partition_by_column
+
+ROSTER_FILE_COLUMNS = [
+    'hopkins_id',
+    'jhed',
+    'email_address',
+    'handshake_id',
+    'first_name',
+    'legal_first_name',
+    'preferred_name',
+    'last_name',
+    'department',
+    'departments',
+    'colleges',
+    'majors',
+    'education_start_date',
+    'school_year',
+    'is_pre_med',
+    'has_activated_handshake',
+    'has_completed_profile',
+    'is_athlete',
+    'is_in_org',
+    'is_top_4_officer',
+    'gender',
+    'is_first_generation',
+    'is_pell_eligible',
+    'is_urm',
+    'citizenship',
+]
+# the melted student columns the roster file is made from. The majors, colleges and departments columns are made
+# by unmelting the major, college and department columns.
+ROSTER_INPUT_COLUMNS = [column for column in ROSTER_FILE_COLUMNS
+                        if column not in ['departments', 'colleges', 'majors']] + ['major', 'college']
+
 
 def split_into_separate_department_rosters(roster: pd.DataFrame) -> List[pd.DataFrame]:
-    roster['department'] = roster['department'].fillna('no_department')
-    return [roster.loc[roster['department'] == department]
-                .drop_duplicates()
-                .reset_index(drop=True)
-            for department in roster['department'].unique()]
+    roster = roster.assign(department=roster['department'].astype(object).fillna('no_department')).drop_duplicates()
+    return [department_roster.reset_index(drop=True)
+            for _, department_roster in partition_by_column(roster, 'department')]
 
 
 def format_for_roster_file(students: pd.DataFrame) -> pd.DataFrame:
-    students = unmelt_students_for_roster_file(students)
+    # leave behind the columns that only the semester files use before copying the student data
+    students = unmelt_students_for_roster_file(project_columns(students, ROSTER_INPUT_COLUMNS))
     students = filter_columns_for_roster_file(students)
     return students
 
 
 def unmelt_students_for_roster_file(students: pd.DataFrame) -> pd.DataFrame:
-    students = unmelt_and_join(students, 'major', 'majors')
-    students = unmelt_and_join(students, 'college', 'colleges')
-    students = unmelt_and_join(students, 'department', 'departments')
-    students = students.drop(columns=['major', 'college'])
+    students = students.reset_index(drop=True)
+    joined_values = join_unique_values_by_student(students, {
+        'major': 'majors',
+        'college': 'colleges',
+        'department': 'departments'
+    })
+    students = pd.concat([students.drop(columns=['major', 'college']), joined_values], axis=1)
     students = students.drop_duplicates(['hopkins_id', 'department'])
     return students
 
 
-def unmelt_and_join(students: pd.DataFrame, column_to_unmelt: str, unmelted_column_name: str) -> pd.DataFrame:
-    def join_values(values: pd.Series) -> str:
-        return ';'.join(numpy.sort(values.replace('', numpy.nan).dropna().unique()))
+def join_unique_values_by_student(students: pd.DataFrame, columns: Dict[str, str]) -> pd.DataFrame:
+    """
+    Join the sorted, distinct, non-empty values of each of the given columns into a semicolon-delimited string
+    per student. All of the columns are aggregated together in a single grouped pass over factorized codes.
+    Rows without a hopkins_id aren't a student, so their joined values are left empty.
 
-    unmelted_df = students.groupby('hopkins_id')[column_to_unmelt].apply(join_values).reset_index()
-    unmelted_df = unmelted_df.rename(columns={column_to_unmelt: unmelted_column_name})
-    students = students.merge(unmelted_df, on='hopkins_id', how='left')
-    return students
+    :param students: melted student data with one or more rows per hopkins_id
+    :param columns: a mapping from each column to aggregate to the name of its joined column
+    :return: the joined columns, aligned with the rows of the given student data
+    """
+    student_codes, hopkins_ids = pd.factorize(students['hopkins_id'])
+    values = pd.concat([students[column] for column in columns], ignore_index=True)
+    melted = pd.DataFrame({
+        'column': np.repeat(np.arange(len(columns)), len(students)),
+        'student': np.tile(student_codes, len(columns)),
+        'value': values.values
+    })
+    melted = melted.loc[(melted['student'] >= 0) & melted['value'].notna() & (melted['value'] != '')]
+    # factorizing with sort=True makes the value codes sort in the same order as the values themselves
+    value_codes, unique_values = pd.factorize(melted['value'].astype(str), sort=True)
+    melted = melted.assign(value=value_codes).drop_duplicates().sort_values(['column', 'student', 'value'])
+    is_group_start = np.ones(len(melted), dtype=bool)
+    is_group_start[1:] = (np.diff(melted['column'].values) != 0) | (np.diff(melted['student'].values) != 0)
+    group_starts = np.flatnonzero(is_group_start)
+    # null ids are factorized to a code of -1, which reads the extra, always empty, last slot
+    joined = np.full((len(columns), len(hopkins_ids) + 1), '', dtype=object)
+    if len(group_starts):
+        delimited_values = np.char.add(';', unique_values.values.astype(str)).astype(object)
+        joined_groups = np.add.reduceat(delimited_values[melted['value'].values], group_starts)
+        joined[melted['column'].values[group_starts], melted['student'].values[group_starts]] = \
+            pd.Series(joined_groups).str.slice(1).values
+    return pd.DataFrame({unmelted_column: joined[i][student_codes]
+                         for i, unmelted_column in enumerate(columns.values())}, index=students.index)
 
 
 def filter_columns_for_roster_file(students: pd.DataFrame) -> pd.DataFrame:
-    return students[[
-        'hopkins_id',
-        'jhed',
-        'email_address',
-        'handshake_id',
-        'first_name',
-        'legal_first_name',
-        'preferred_name',
-        'last_name',
-        'department',
-        'departments',
-        'colleges',
-        'majors',
-        'education_start_date',
-        'school_year',
-        'is_pre_med',
-        'has_activated_handshake',
-        'has_completed_profile',
-        'is_athlete',
-        'is_in_org',
-        'is_top_4_officer',
-        'gender',
-        'is_first_generation',
-        'is_pell_eligible',
-        'is_urm',
-        'citizenship',
-    ]]
+    return students[ROSTER_FILE_COLUMNS]
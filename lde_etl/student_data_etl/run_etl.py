@@ -1,58 +1,363 @@
-import pandas as pd
 import glob
+import math
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from functools import partial
+from operator import itemgetter
+from typing import Callable, List, Tuple
+
+import numpy as np
+import pandas as pd
 
-from lde_etl.file_writers import write_roster_excel_files
+from lde_etl.checkpoints import RunCheckpoints, get_raw_data_cache
+from lde_etl.common import process_pool
+from lde_etl.file_writers import write_excel_file, write_roster_excel_files
+from lde_etl.session_manager import HandshakeSessionManager
+from lde_etl.stage_graph import Stage, StageGraphRun, cache_source_stages, run_stage_graph, select_stages
 import lde_etl.student_data_etl.extract as extract
 from lde_etl.student_data_etl.lde_roster_file import format_for_roster_file, split_into_separate_department_rosters
-from lde_etl.student_data_etl.transform_engagement_data import count_engagements_by_type
+from lde_etl.student_data_etl.spreadsheet_cache import read_spreadsheets, write_and_cache_spreadsheet
+from lde_etl.student_data_etl.student_schema import optimize_student_dtypes
 import lde_etl.student_data_etl.transform_student_data as ts
+from lde_etl.transform_utils import hash_partition_positions, read_spilled_columns, read_spilled_partitions
+from lde_etl.transform_utils import spill_partition
+
+# the stages whose outputs the student transforms take, in the order transform_students takes them
+STUDENT_TRANSFORM_INPUTS = ['sis_students', 'pell_data', 'wgs_students', 'athlete_data', 'sli_data', 'handshake_data',
+                            'major_metadata', 'previous_departments', 'previous_fingerprints', 'engagement_counts']
+# the estimated peak memory of transforming a partition of the enriched student data, as a multiple of the memory
+# of the partition itself. Covers the melted major table, the department rule inputs and the joined student and
+# roster tables, which all exist at once.
+PARTITION_MEMORY_FACTOR = 10
+# the column that keeps the original position of each row while it is in a partition
+PARTITION_ROW_COLUMN = '_partition_row'
+# the outputs of transform_student_partition that are spilled as they are, in order
+SPILLED_PARTITION_OUTPUT_NAMES = ['departments', 'fingerprints', 'students']
+# the file that lists the department of each of a partition's spilled rosters and the student of its first row
+ROSTER_INDEX_FILENAME = 'roster_index.pkl'
 
 
-def run_student_etl(config):
-    print('Extracting SIS data...')
-    students = ts.clean_potentially_mistyped_bool_fields(extract.get_student_sis_data())
-    students = students.merge(extract.get_pell_data(config['pell_data_filepath']), how='left', on='hopkins_id')
-    wgs_students = extract.get_wgs_sis_data()
-    students = ts.add_wgs_data(students, wgs_students)
-    wse_masters_students = extract.get_wse_masters_student_data()
-
-    print('Extracting athlete roster...')
-    athlete_data = extract.get_athlete_data(config['athlete_filepath'])
-    students = ts.add_athlete_data(students, athlete_data)
-
-    print('Extracting SLI roster...')
-    sli_data = extract.get_sli_data(config['sli_filepath'])
-    students = ts.add_sli_data(students, sli_data)
-
-    print('Extracting handshake data...')
-    handshake_data = extract.get_handshake_data(config)
-    students = ts.merge_with_handshake_data(students, handshake_data)
-    wse_masters_students = ts.merge_with_handshake_data(wse_masters_students, handshake_data)
-
-    print('Extracting major metadata...')
-    major_metadata = extract.get_major_metadata(config["major_metadata_filepath"])
-
-    print('Adding major and department data to student records...')
-    students = ts.melt_majors(students)
-    students = ts.clean_majors(students)
-    students = ts.add_major_metadata(students, major_metadata)
-    student_departments = ts.make_student_department_table(students)
-    student_departments.to_csv(config['student_departments_filepath'], index=False)
-    students = ts.merge_with_student_department_data(students, student_departments)
-
-    print('Writing output to file...')
-    students.to_excel(config['current_semester_data_filepath'], index=False)
-    wse_masters_students.to_excel(config['wse_masters_students_filepath'], index=False)
-
-    print('Combining student data files...')
-    combined = pd.concat([pd.read_excel(filename) for filename in glob.glob(config['semester_data_dir'] + "\\*.xlsx")], sort=True)
-    combined.to_excel(config['student_data_filepath'], index=False)
-
-    print('Creating roster file...')
-    roster_file = format_for_roster_file(pd.read_excel(config['current_semester_data_filepath']))
-    engagement_data = count_engagements_by_type(extract.get_this_years_engagement_data(config['engagement_data_filepath']))
-    roster_file = ts.merge_with_engagement_data(roster_file, engagement_data)
-    department_roster_files = split_into_separate_department_rosters(roster_file)
-    write_roster_excel_files(config['lde_roster_dir'], department_roster_files)
+def run_student_etl(config, full_department_recompute=False, checkpoints: RunCheckpoints = None,
+                    sessions: HandshakeSessionManager = None, stage_names: List[str] = None,
+                    transform_only=False, memory_budget_mb: int = None) -> StageGraphRun:
+    """
+    Run the stages of the student ETL
 
+    :param config: the ETL config
+    :param full_department_recompute: whether to recompute every student's departments
+    :param checkpoints: the checkpoints of the run, if it can be resumed
+    :param sessions: the run's Handshake session manager
+    :param stage_names: the names of the stages to run, along with the stages they depend on, or None to run
+        every stage
+    :param transform_only: whether to load the raw data cached by the last run instead of pulling it again
+    :param memory_budget_mb: if given, the students are transformed in partitions that are small enough to
+        transform in parallel within this many megabytes, rather than all at once
+    :return: the outputs and timings of the stages
+    """
+    print('Running student ETL stages...')
+    run = run_stage_graph(select_student_etl_stages(config, full_department_recompute, sessions, stage_names,
+                                                    transform_only, memory_budget_mb),
+                          checkpoints=checkpoints)
+    print(run.report())
     print('Done!')
+    return run
+
+
+def make_student_etl_stages(config, full_department_recompute=False, sessions: HandshakeSessionManager = None,
+                            memory_budget_mb: int = None) -> List[Stage]:
+    """
+    Declare the stages of the student ETL and the stages each one takes the output of. Extractions that do not
+    depend on each other run concurrently, and transforms and excel writes run in other processes. The student
+    transforms each need the one before, so they run one after another in a single process stage, and stages
+    that pick its outputs apart let later stages take each output by name. If a Handshake session manager is
+    given, the Handshake report is downloaded with its browser rather than a new login. If a memory budget is
+    given, the students are transformed in partitions by transform_students_in_partitions.
+    """
+    stages = [
+        Stage('sis_students', extract_sis_students, pulls_raw_data=True),
+        Stage('pell_data', partial(extract.get_pell_data, config['pell_data_filepath'])),
+        Stage('wgs_students', extract.get_wgs_sis_data, pulls_raw_data=True),
+        Stage('wse_masters_students', extract.get_wse_masters_student_data, pulls_raw_data=True),
+        Stage('athlete_data', partial(extract.get_athlete_data, config['athlete_filepath'])),
+        Stage('sli_data', partial(extract.get_sli_data, config['sli_filepath'])),
+        Stage('handshake_data', partial(extract.get_handshake_data, config, sessions), pulls_raw_data=True),
+        Stage('major_metadata', partial(extract.get_major_metadata, config['major_metadata_filepath'])),
+        Stage('previous_departments', partial(extract.get_previous_run_table, config['student_departments_filepath'],
+                                              ['hopkins_id', 'department'])),
+        Stage('previous_fingerprints', partial(extract.get_previous_run_table,
+                                               config['student_department_fingerprints_filepath'],
+                                               ['hopkins_id', 'fingerprint'])),
+        Stage('engagement_counts', partial(extract.get_this_years_engagement_counts,
+                                           config['engagement_data_filepath'], config['engagement_counts_filepath'])),
+        Stage('transformed_students', partial(transform_students, full_department_recompute),
+              STUDENT_TRANSFORM_INPUTS, kind='cpu'),
+        Stage('wse_masters_with_handshake_data', ts.merge_with_handshake_data,
+              ['wse_masters_students', 'handshake_data'], kind='cpu'),
+        Stage('student_departments', itemgetter(0), ['transformed_students']),
+        Stage('write_student_departments', partial(write_student_departments, config), ['student_departments']),
+        Stage('students', itemgetter(1), ['transformed_students']),
+        Stage('write_semester_file', partial(write_and_cache_spreadsheet, config['current_semester_data_filepath']),
+              ['students'], kind='cpu'),
+        Stage('write_wse_masters_file', partial(write_excel_file, config['wse_masters_students_filepath']),
+              ['wse_masters_with_handshake_data'], kind='cpu'),
+        Stage('combined_semester_data', partial(combine_semester_data, config), ['write_semester_file']),
+        Stage('write_combined_file', partial(write_excel_file, config['student_data_filepath']),
+              ['combined_semester_data'], kind='cpu'),
+        Stage('department_rosters', itemgetter(2), ['transformed_students']),
+        Stage('write_department_rosters', partial(write_roster_excel_files, config['lde_roster_dir']),
+              ['department_rosters']),
+    ]
+    if memory_budget_mb is not None:
+        stages = partition_student_transform_stages(stages, full_department_recompute, memory_budget_mb)
+    return stages
+
+
+def partition_student_transform_stages(stages: List[Stage], full_department_recompute: bool,
+                                       memory_budget_mb: int) -> List[Stage]:
+    """Split the stage that transforms the students into one that enriches them and one that partitions the rest"""
+    partitioned_stages = [
+        Stage('enriched_students', enrich_students, STUDENT_TRANSFORM_INPUTS[:6], kind='cpu'),
+        # the stage runs the partitions on its own process pool, so it only waits on them
+        Stage('transformed_students', partial(transform_students_in_partitions, full_department_recompute,
+                                              memory_budget_mb),
+              ['enriched_students'] + STUDENT_TRANSFORM_INPUTS[6:]),
+    ]
+    position = [stage.name for stage in stages].index('transformed_students')
+    return stages[:position] + partitioned_stages + stages[position + 1:]
+
+
+def select_student_etl_stages(config, full_department_recompute=False, sessions: HandshakeSessionManager = None,
+                              stage_names: List[str] = None, transform_only=False,
+                              memory_budget_mb: int = None) -> List[Stage]:
+    """
+    Select the stages of the student ETL to run, with the stages that pull raw data caching it for later
+    transform-only runs, or loading it from the cache in a transform-only run
+    """
+    stages = make_student_etl_stages(config, full_department_recompute, sessions, memory_budget_mb)
+    if stage_names is not None:
+        stages = select_stages(stages, stage_names)
+    return cache_source_stages(stages, get_raw_data_cache(config['run_dir'], 'student'),
+                               load_from_cache=transform_only)
+
+
+def extract_sis_students() -> pd.DataFrame:
+    return optimize_student_dtypes(ts.clean_potentially_mistyped_bool_fields(extract.get_student_sis_data()))
+
+
+def transform_students(full_department_recompute: bool, sis_students: pd.DataFrame, pell_data: pd.DataFrame,
+                       wgs_students: pd.DataFrame, athlete_data: pd.DataFrame, sli_data: pd.DataFrame,
+                       handshake_data: pd.DataFrame, major_metadata: pd.DataFrame, previous_departments: pd.DataFrame,
+                       previous_fingerprints: pd.DataFrame, engagement_counts: pd.DataFrame) \
+        -> Tuple[Tuple[pd.DataFrame, pd.DataFrame], pd.DataFrame, List[pd.DataFrame]]:
+    """
+    Transform the extracted student data into the student departments, the students and the department rosters,
+    keeping the intermediate student tables in this process
+
+    :return: the student departments and fingerprints, the students and the department rosters
+    """
+    students = enrich_students(sis_students, pell_data, wgs_students, athlete_data, sli_data, handshake_data)
+    normalized_students = normalize_students(students, major_metadata)
+    student_departments = make_student_departments(full_department_recompute, normalized_students,
+                                                   previous_departments, previous_fingerprints)
+    students = join_student_departments(normalized_students, student_departments)
+    return student_departments, students, make_department_rosters(students, engagement_counts)
+
+
+def enrich_students(students: pd.DataFrame, pell_data: pd.DataFrame, wgs_students: pd.DataFrame,
+                    athlete_data: pd.DataFrame, sli_data: pd.DataFrame, handshake_data: pd.DataFrame) -> pd.DataFrame:
+    return optimize_student_dtypes(
+        ts.enrich_students(students, pell_data, wgs_students, athlete_data, sli_data, handshake_data))
+
+
+def normalize_students(students: pd.DataFrame, major_metadata: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Split the student data into an attribute table and a table of each student's majors and major metadata"""
+    student_attributes, student_majors = ts.normalize_majors(students)
+    student_majors = ts.add_major_metadata(ts.join_student_attributes(student_majors, student_attributes, ['is_ep']),
+                                           major_metadata)
+    student_majors = optimize_student_dtypes(student_majors.drop(columns=['is_ep']))
+    return student_attributes, student_majors
+
+
+def make_student_departments(full_recompute: bool, normalized_students: Tuple[pd.DataFrame, pd.DataFrame],
+                             previous_departments: pd.DataFrame,
+                             previous_fingerprints: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    return ts.make_student_department_table_incrementally(
+        get_department_rule_inputs(normalized_students), previous_departments, previous_fingerprints,
+        full_recompute=full_recompute or previous_departments.empty)
+
+
+def get_department_rule_inputs(normalized_students: Tuple[pd.DataFrame, pd.DataFrame]) -> pd.DataFrame:
+    student_attributes, student_majors = normalized_students
+    rule_fields = [field for field in ts.DEPARTMENT_RULE_FIELDS if field in student_attributes.columns]
+    return ts.join_student_attributes(student_majors, student_attributes, rule_fields)
+
+
+def write_student_departments(config, student_departments: Tuple[pd.DataFrame, pd.DataFrame]):
+    departments, fingerprints = student_departments
+    departments.to_csv(config['student_departments_filepath'], index=False)
+    fingerprints.to_csv(config['student_department_fingerprints_filepath'], index=False)
+
+
+def join_student_departments(normalized_students: Tuple[pd.DataFrame, pd.DataFrame],
+                             student_departments: Tuple[pd.DataFrame, pd.DataFrame]) -> pd.DataFrame:
+    student_attributes, student_majors = normalized_students
+    departments, _ = student_departments
+    students = ts.join_student_attributes(student_majors, student_attributes)
+    return optimize_student_dtypes(ts.merge_with_student_department_data(students, departments))
+
+
+def make_department_rosters(students: pd.DataFrame, engagement_counts: pd.DataFrame) -> List[pd.DataFrame]:
+    return split_into_separate_department_rosters(make_roster_file(students, engagement_counts))
+
+
+def make_roster_file(students: pd.DataFrame, engagement_counts: pd.DataFrame) -> pd.DataFrame:
+    return ts.merge_with_engagement_data(format_for_roster_file(students), engagement_counts)
+
+
+def transform_students_in_partitions(full_department_recompute: bool, memory_budget_mb: int, students: pd.DataFrame,
+                                     major_metadata: pd.DataFrame, previous_departments: pd.DataFrame,
+                                     previous_fingerprints: pd.DataFrame, engagement_counts: pd.DataFrame,
+                                     max_workers: int = None) \
+        -> Tuple[Tuple[pd.DataFrame, pd.DataFrame], pd.DataFrame, List[pd.DataFrame]]:
+    """
+    Transform the enriched students in partitions by hopkins_id, within a memory budget. The outputs are the same,
+    and in the same order, as transforming every student at once.
+
+    :param full_department_recompute: whether to recompute every student's departments
+    :param memory_budget_mb: the number of megabytes the partitions being transformed can use between them
+    :param students: the enriched students
+    :param major_metadata: the major metadata
+    :param previous_departments: the student department table of the previous run
+    :param previous_fingerprints: the department rule input fingerprints of the previous run
+    :param engagement_counts: this year's engagement counts of each student
+    :param max_workers: the maximum number of partitions to transform at once, defaulting to the number of cores
+    :return: the outputs of the student_departments, students and department_rosters stages
+    """
+    max_workers = max_workers or os.cpu_count()
+    partition_count = count_student_partitions(students, memory_budget_mb, max_workers)
+    full_department_recompute = full_department_recompute or previous_departments.empty
+    partitions = list(zip(hash_partition_positions(students['hopkins_id'], partition_count),
+                          hash_partition_positions(previous_departments['hopkins_id'], partition_count),
+                          hash_partition_positions(previous_fingerprints['hopkins_id'], partition_count)))
+    # the previous departments of students who are no longer in the data are dropped, like in unpartitioned runs
+    partitions = [partition for partition in partitions if len(partition[0])] or partitions[:1]
+    with tempfile.TemporaryDirectory() as spill_dir, process_pool(max_workers=max_workers) as executor:
+        running = set()
+        partition_dirs = []
+        for i, (student_positions, department_positions, fingerprint_positions) in enumerate(partitions):
+            if len(running) == max_workers:
+                _wait_for_partition(running)
+            partition_students = students.take(student_positions).assign(**{PARTITION_ROW_COLUMN: student_positions})
+            partition_engagement_counts = engagement_counts.loc[
+                engagement_counts['student_handshake_id'].isin(partition_students['handshake_id'])]
+            partition_dirs.append(os.path.join(spill_dir, str(i)))
+            running.add(executor.submit(
+                transform_and_spill_student_partition, partition_dirs[-1], full_department_recompute,
+                major_metadata, partition_students,
+                previous_departments.take(department_positions).assign(**{PARTITION_ROW_COLUMN: department_positions}),
+                previous_fingerprints.take(fingerprint_positions), partition_engagement_counts))
+            del partition_students
+        while running:
+            _wait_for_partition(running)
+        return _merge_spilled_partitions(partition_dirs, students['hopkins_id'], len(previous_departments))
+
+
+def count_student_partitions(students: pd.DataFrame, memory_budget_mb: int, max_workers: int) -> int:
+    """
+    Count the partitions to split the students into so that max_workers of them can be transformed at once
+    within the memory budget, and so that there is at least one partition for each worker
+    """
+    estimated_memory = students.memory_usage(deep=True).sum() * PARTITION_MEMORY_FACTOR
+    return max(max_workers, math.ceil(estimated_memory * max_workers / (memory_budget_mb * 2 ** 20)))
+
+
+def transform_student_partition(full_department_recompute: bool, major_metadata: pd.DataFrame,
+                                students: pd.DataFrame, previous_departments: pd.DataFrame,
+                                previous_fingerprints: pd.DataFrame, engagement_counts: pd.DataFrame) \
+        -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Transform one partition of the students into its departments, fingerprints, students and roster file"""
+    normalized_students = normalize_students(students, major_metadata)
+    departments, fingerprints = ts.make_student_department_table_incrementally(
+        get_department_rule_inputs(normalized_students), previous_departments, previous_fingerprints,
+        full_recompute=full_department_recompute)
+    students = join_student_departments(normalized_students,
+                                        (departments.drop(columns=[PARTITION_ROW_COLUMN]), fingerprints))
+    roster_file = make_roster_file(students.drop(columns=[PARTITION_ROW_COLUMN]), engagement_counts)
+    return departments, fingerprints, students, roster_file
+
+
+def transform_and_spill_student_partition(partition_dir: str, *args):
+    """Transform one partition of the students and spill its outputs, with the roster file split by department"""
+    *outputs, roster_file = transform_student_partition(*args)
+    for name, output in zip(SPILLED_PARTITION_OUTPUT_NAMES, outputs):
+        spill_partition(output, os.path.join(partition_dir, name))
+    rosters = split_into_separate_department_rosters(roster_file)
+    for i, roster in enumerate(rosters):
+        spill_partition(roster, os.path.join(partition_dir, 'rosters', str(i)))
+    roster_index = pd.DataFrame({'department': [roster['department'].iloc[0] for roster in rosters],
+                                 'hopkins_id': [roster['hopkins_id'].iloc[0] for roster in rosters]})
+    roster_index.to_pickle(os.path.join(partition_dir, ROSTER_INDEX_FILENAME))
+
+
+def _wait_for_partition(running: set):
+    done, _ = wait(running, return_when=FIRST_COMPLETED)
+    for future in done:
+        running.remove(future)
+        # re-raise the partition's error, if it failed
+        future.result()
+
+
+def _merge_spilled_partitions(partition_dirs: List[str], hopkins_ids: pd.Series, previous_department_count: int) \
+        -> Tuple[Tuple[pd.DataFrame, pd.DataFrame], pd.DataFrame, List[pd.DataFrame]]:
+    # each student's rows stay together and in order within a partition, so sorting the rows by the position of
+    # the student, or of the row they came from, restores the order of an unpartitioned run
+    student_positions = pd.Index(pd.unique(hopkins_ids))
+
+    def read_output(output_dirs: List[str], order_keys: Callable[[pd.DataFrame], np.ndarray],
+                    key_columns: List[str]):
+        order = np.argsort(np.asarray(order_keys(read_spilled_partitions(output_dirs, key_columns))), kind='stable')
+        return read_spilled_partitions(output_dirs, [column for column in read_spilled_columns(output_dirs[0])
+                                                     if column != PARTITION_ROW_COLUMN], order)
+
+    def department_order_keys(keys: pd.DataFrame) -> np.ndarray:
+        # unpartitioned runs list the departments carried over from the previous run first, then the recomputed ones
+        return np.where(keys[PARTITION_ROW_COLUMN].isna(),
+                        previous_department_count + student_positions.get_indexer(keys['hopkins_id']),
+                        keys[PARTITION_ROW_COLUMN])
+
+    def student_order_keys(keys: pd.DataFrame) -> np.ndarray:
+        return student_positions.get_indexer(keys['hopkins_id'])
+
+    def output_dirs(name: str) -> List[str]:
+        return [os.path.join(partition_dir, name) for partition_dir in partition_dirs]
+
+    departments = read_output(output_dirs('departments'), department_order_keys, ['hopkins_id', PARTITION_ROW_COLUMN])
+    fingerprints = read_output(output_dirs('fingerprints'), student_order_keys, ['hopkins_id'])
+    students = read_output(output_dirs('students'), lambda keys: keys[PARTITION_ROW_COLUMN], [PARTITION_ROW_COLUMN])
+    # unpartitioned runs list the rosters in the order their departments first appear, and departments that first
+    # appear on the same student are in one partition, which already has them in that order
+    roster_index = pd.concat([pd.read_pickle(os.path.join(partition_dir, ROSTER_INDEX_FILENAME)).assign(
+        roster_dir=lambda index: [os.path.join(partition_dir, 'rosters', str(i)) for i in range(len(index))],
+        first_row=lambda index: student_positions.get_indexer(index['hopkins_id']),
+        partition_roster=lambda index: np.arange(len(index)))
+        for partition_dir in partition_dirs], ignore_index=True)
+    departments_in_order = roster_index.sort_values(['first_row', 'partition_roster'])['department'].unique()
+    rosters = [read_output(list(roster_index.loc[roster_index['department'] == department, 'roster_dir']),
+                           student_order_keys, ['hopkins_id'])
+               for department in departments_in_order]
+    return (departments, fingerprints), students, rosters
+
+
+def combine_semester_data(config, current_semester_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Combine the data from every semester file, in the order the files are found, using the current semester's
+    data as it reads back from its file rather than parsing the file
+    """
+    current_semester_filepath = os.path.abspath(config['current_semester_data_filepath'])
+    semester_filepaths = glob.glob(config['semester_data_dir'] + "\\*.xlsx")
+    other_semester_data = iter(read_spreadsheets([filepath for filepath in semester_filepaths
+                                                  if os.path.abspath(filepath) != current_semester_filepath]))
+    semester_data = [current_semester_data if os.path.abspath(filepath) == current_semester_filepath
+                     else next(other_semester_data) for filepath in semester_filepaths]
+    return pd.concat(semester_data, sort=True)
@@ -1,27 +1,101 @@
 import os
+import threading
+from functools import lru_cache
 from typing import List
 
-import pyodbc
-
 from lde_etl.common import load_config
 
 CONFIG_FILEPATH = f'{os.path.dirname(os.path.abspath(__file__))}/../../sis_config.json'
-SIS_CONFIG = load_config(CONFIG_FILEPATH)
+
+
+@lru_cache(maxsize=None)
+def get_sis_config() -> dict:
+    """Load the SIS config the first time a connection is opened, so that importing this module has no side effects"""
+    return load_config(CONFIG_FILEPATH)
+
+
+class SISConnectionPool:
+    """
+    SIS connections that are kept open between queries so that later queries skip the connection handshake.
+
+    By default no connections are kept, and each connection is closed once its query is done. A long-running
+    process can keep connections warm by raising max_idle_connections. Idle connections are checked with a
+    trivial query before they are reused, and replaced if the server has dropped them.
+    """
+
+    def __init__(self, max_idle_connections: int = 0):
+        self.max_idle_connections = max_idle_connections
+        self._idle_connections = []
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take an idle connection, or open a new one if none are idle"""
+        while True:
+            with self._lock:
+                if not self._idle_connections:
+                    break
+                cnxn = self._idle_connections.pop()
+            if _connection_is_alive(cnxn):
+                return cnxn
+            _close_quietly(cnxn)
+        # pyodbc needs an ODBC driver manager, which only the machines that query SIS have
+        import pyodbc
+        sis_config = get_sis_config()
+        return pyodbc.connect('DRIVER={ODBC Driver 17 for SQL Server};SERVER=' + \
+                              sis_config['server'] + ';DATABASE=' + \
+                              sis_config['database'] + ';UID=' +
+                              ';Trusted_Connection=yes')
+
+    def release(self, cnxn):
+        """Return a connection to the pool, closing it if the pool already holds as many as it keeps"""
+        with self._lock:
+            if len(self._idle_connections) < self.max_idle_connections:
+                self._idle_connections.append(cnxn)
+                return
+        cnxn.close()
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle_connections, self._idle_connections = self._idle_connections, []
+        for cnxn in idle_connections:
+            _close_quietly(cnxn)
+
+
+SIS_CONNECTION_POOL = SISConnectionPool()
 
 
 class SISConnection:
 
     def __enter__(self):
-        self.cnxn = pyodbc.connect('DRIVER={ODBC Driver 17 for SQL Server};SERVER=' + \
-                                   SIS_CONFIG['server'] + ';DATABASE=' + \
-                                   SIS_CONFIG['database'] + ';UID=' +
-                                   ';Trusted_Connection=yes')
+        self.cnxn = SIS_CONNECTION_POOL.acquire()
         self.cursor = self.cnxn.cursor()
         return SISCursor(self.cursor)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.cursor.close()
-        self.cnxn.close()
+        # a connection whose query failed may be in a bad state, so it is not reused
+        if exc_type is None:
+            SIS_CONNECTION_POOL.release(self.cnxn)
+        else:
+            self.cnxn.close()
+
+
+def _connection_is_alive(cnxn) -> bool:
+    import pyodbc
+    try:
+        cnxn.cursor().execute('SELECT 1').fetchall()
+        return True
+    except pyodbc.Error:
+        return False
+
+
+def _close_quietly(cnxn):
+    import pyodbc
+    try:
+        cnxn.close()
+    except pyodbc.Error:
+        pass
 
 
 class SISCursor:
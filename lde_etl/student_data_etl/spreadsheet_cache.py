@@ -0,0 +1,142 @@
+import datetime
+import glob
+import hashlib
+import math
+import numbers
+import os
+from typing import List
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+from lde_etl.common import atomic_write, process_pool
+
+CACHE_DIR_NAME = '.lde_etl_cache'
+
+
+def read_spreadsheet(filepath: str) -> pd.DataFrame:
+    """
+    Read an excel or csv file, using its cached copy if the file has not changed since it was last read.
+
+    :param filepath: the filepath of the spreadsheet to read
+    :return: the spreadsheet's data
+    """
+    cache_filepath = get_cache_filepath(filepath)
+    if os.path.exists(cache_filepath):
+        return pd.read_pickle(cache_filepath)
+    else:
+        return read_and_cache_spreadsheet(filepath)
+
+
+def read_spreadsheets(filepaths: List[str], max_workers: int = None) -> List[pd.DataFrame]:
+    """
+    Read several excel or csv files, parsing any files without an up-to-date cached copy in parallel
+    across processes.
+
+    :param filepaths: the filepaths of the spreadsheets to read
+    :param max_workers: the maximum number of processes to parse spreadsheets with
+    :return: the data of each spreadsheet, in the same order as the given filepaths
+    """
+    cache_filepaths = [get_cache_filepath(filepath) for filepath in filepaths]
+    uncached_filepaths = [filepath for filepath, cache_filepath in zip(filepaths, cache_filepaths)
+                          if not os.path.exists(cache_filepath)]
+    if len(uncached_filepaths) > 1:
+        with process_pool(max_workers=max_workers) as executor:
+            parsed = dict(zip(uncached_filepaths, executor.map(read_and_cache_spreadsheet, uncached_filepaths)))
+    else:
+        parsed = {filepath: read_and_cache_spreadsheet(filepath) for filepath in uncached_filepaths}
+    return [parsed[filepath] if filepath in parsed else pd.read_pickle(cache_filepath)
+            for filepath, cache_filepath in zip(filepaths, cache_filepaths)]
+
+
+def read_and_cache_spreadsheet(filepath: str) -> pd.DataFrame:
+    if filepath.lower().endswith('.csv'):
+        data = pd.read_csv(filepath)
+    else:
+        data = pd.read_excel(filepath)
+    cache_spreadsheet(filepath, data)
+    return data
+
+
+def write_and_cache_spreadsheet(filepath: str, data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Write data to an excel file and cache the data as it would be read back from the file, so that later reads
+    of the file get the same data, with the same dtypes, as parsing the file would, without parsing it now
+
+    :param filepath: the filepath of the excel file to write
+    :param data: the data to write
+    :return: the data as it would be read back from the file
+    """
+    data.to_excel(filepath, index=False)
+    read_back_data = as_read_back_from_excel(data)
+    cache_spreadsheet(filepath, read_back_data)
+    return read_back_data
+
+
+def as_read_back_from_excel(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert data to what read_excel returns for an excel file that the data was written to with to_excel. Each
+    value is converted to the value of its excel cell, and the cells are parsed by the same parser read_excel
+    uses, so the dtypes of the columns are inferred from the cells in the same way.
+
+    :param data: the data that was written
+    :return: the data as read back from the file
+    """
+    cell_columns = [[_as_excel_cell(value) for value in data[column]] for column in data.columns]
+    rows = [list(data.columns)] + [list(row) for row in zip(*cell_columns)]
+    # read_excel leaves out the empty rows at the end of a sheet
+    while len(rows) > 1 and all(cell == '' for cell in rows[-1]):
+        rows.pop()
+    return TextParser(rows, header=0, skip_blank_lines=False).read()
+
+
+def _as_excel_cell(value):
+    # the cell values openpyxl reads back, which are what read_excel parses
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if pd.isna(value):
+        return ''
+    if isinstance(value, numbers.Number):
+        # excel stores every number as a float, and read_excel reads whole numbers back as integers
+        number = float(value)
+        if math.isinf(number):
+            return str(number)
+        return int(number) if number.is_integer() else number
+    if isinstance(value, datetime.date):
+        return pd.Timestamp(value).to_pydatetime()
+    return value
+
+
+def cache_spreadsheet(filepath: str, data: pd.DataFrame):
+    """
+    Store the cached copy of a spreadsheet's data, replacing any copies cached for older versions of the file.
+
+    :param filepath: the filepath of the spreadsheet the data was read from or written to
+    :param data: the spreadsheet's data
+    """
+    cache_filepath = get_cache_filepath(filepath)
+    os.makedirs(os.path.dirname(cache_filepath), exist_ok=True)
+    for stale_cache_filepath in glob.glob(_cache_filepath_pattern(filepath)):
+        os.remove(stale_cache_filepath)
+    with atomic_write(cache_filepath, 'wb') as file:
+        data.to_pickle(file)
+
+
+def get_cache_filepath(filepath: str) -> str:
+    """
+    Get the filepath of a spreadsheet's cached copy. The cache key changes whenever the file is modified.
+
+    :param filepath: the filepath of the spreadsheet
+    :return: the filepath of the cached copy, in a cache directory next to the spreadsheet
+    """
+    file_stats = os.stat(filepath)
+    file_version = f'{os.path.abspath(filepath)}:{file_stats.st_mtime_ns}:{file_stats.st_size}'
+    cache_key = hashlib.sha1(file_version.encode('utf-8')).hexdigest()[:16]
+    directory, filename = os.path.split(filepath)
+    return os.path.join(directory, CACHE_DIR_NAME, f'{filename}.{cache_key}.pkl')
+
+
+def _cache_filepath_pattern(filepath: str) -> str:
+    directory, filename = os.path.split(filepath)
+    return os.path.join(glob.escape(directory), CACHE_DIR_NAME, f'{glob.escape(filename)}.*.pkl')
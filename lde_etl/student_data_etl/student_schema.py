@@ -0,0 +1,52 @@
+import pandas as pd
+
+# the compact dtype of each student data field that has one. Fields that are not listed keep the dtype they were
+# read with.
+STUDENT_SCHEMA = {
+    'academic_year': 'Int16',
+    'cmn_persons_id': 'Int64',
+    'semester': 'category',
+    'school_year': 'category',
+    'ethnicity': 'category',
+    'primary_college': 'category',
+    'college': 'category',
+    'major': 'category',
+    'major_department': 'category',
+    'department': 'category',
+    'citizenship': 'category',
+    'gender': 'category',
+    'wgs_affiliation_type': 'category',
+    'sport': 'category',
+    'is_urm': 'boolean',
+    'is_ep': 'boolean',
+    'is_first_generation': 'boolean',
+    'is_veteran': 'boolean',
+    'is_pell_eligible': 'boolean',
+    'is_athlete': 'boolean',
+    'is_in_org': 'boolean',
+    'is_top_4_officer': 'boolean',
+    'is_pre_med': 'boolean',
+    'has_activated_handshake': 'boolean',
+    'has_completed_profile': 'boolean',
+}
+
+
+def optimize_student_dtypes(students: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the student data fields to the compact dtypes of the student schema: nullable booleans for flags,
+    categoricals for low-cardinality text fields and nullable integers for ids. Fields that are already
+    converted are left alone, so this can be re-applied cheaply after each transform that adds fields.
+
+    A field whose values do not fit its schema dtype, like a flag spelled 'Y' or 'N', keeps its original dtype.
+
+    :param students: student data
+    :return: the student data with its fields converted
+    """
+    converted = {}
+    for column, dtype in STUDENT_SCHEMA.items():
+        if column in students.columns and students[column].dtype != dtype:
+            try:
+                converted[column] = students[column].astype(dtype)
+            except (TypeError, ValueError):
+                pass
+    return students.assign(**converted) if converted else students
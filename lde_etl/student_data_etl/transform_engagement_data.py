@@ -1,20 +1,51 @@
+from typing import List
+
 import pandas as pd
 import numpy as np
 
+ENGAGEMENT_COUNT_KEYS = ['student_handshake_id', 'engagement_type']
+
+
 def count_engagements_by_type(engagements: pd.DataFrame) -> pd.DataFrame:
+    return pivot_engagement_counts(count_engagements(engagements))
+
+
+def accumulate_engagement_counts(counts: pd.Series, engagements: pd.DataFrame,
+                                 keys: List[str] = ENGAGEMENT_COUNT_KEYS) -> pd.Series:
+    """
+    Add the engagement counts of another batch of engagements to a running count
+
+    :param counts: the running engagement counts, as returned by count_engagements
+    :param engagements: a batch of engagement data
+    :param keys: the columns the engagements are counted by
+    :return: the updated engagement counts
+    """
+    return counts.add(count_engagements(engagements, keys), fill_value=0).astype(np.int64)
+
+
+def count_engagements(engagements: pd.DataFrame, keys: List[str] = ENGAGEMENT_COUNT_KEYS) -> pd.Series:
+    """
+    Count engagements by student and engagement type, or by other columns. Engagements with a null key, like
+    those of students without a Handshake id, are not counted.
+
+    :param engagements: engagement data
+    :param keys: the columns to count the engagements by
+    :return: a series of engagement counts indexed by the keys
+    """
+    return engagements.groupby(keys)['unique_engagement_id'].count()
+
+
+def pivot_engagement_counts(counts: pd.Series) -> pd.DataFrame:
+    """
+    Pivot engagement counts into a table with one row per student and one count column per engagement type
 
-    def groupby_handshake_id_and_engagement_type(df: pd.DataFrame) -> pd.DataFrame:
-        grouped_df = df.groupby(['student_handshake_id', 'engagement_type'])['unique_engagement_id'].count().reset_index()
-        grouped_df['engagement_type'] = grouped_df['engagement_type'] + '_engagements'
-        return grouped_df
-
-    def pivot_engagement_types(df):
-        pivoted_df = df.pivot(index='student_handshake_id', columns='engagement_type', values='unique_engagement_id').fillna(0).reset_index()
-        pivoted_df.axes[1].name = None
-        # convert engagement count columns to ints. They might have been floats if any counts were null
-        pivoted_df.iloc[:, 1:] = pivoted_df.iloc[:, 1:].astype(np.int64)
-        pivoted_df['total_engagements'] = pivoted_df.iloc[:, 1:].sum(axis=1)
-        return pivoted_df
-
-    grouped_engagements = groupby_handshake_id_and_engagement_type(engagements)
-    return pivot_engagement_types(grouped_engagements)
\ No newline at end of file
+    :param counts: engagement counts indexed by student_handshake_id and engagement_type
+    :return: the pivoted counts, along with each student's total engagement count
+    """
+    counts = counts.rename(lambda engagement_type: engagement_type + '_engagements', level='engagement_type')
+    pivoted_df = counts.unstack('engagement_type', fill_value=0).sort_index().sort_index(axis=1)
+    pivoted_df.columns.name = None
+    # accumulated counts might have been floats if a student had no engagements of a type in some batch
+    pivoted_df = pivoted_df.astype(np.int64)
+    pivoted_df['total_engagements'] = pivoted_df.sum(axis=1)
+    return pivoted_df.reset_index()
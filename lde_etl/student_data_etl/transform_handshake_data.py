@@ -1,24 +1,37 @@
 import pandas as pd
 
 from lde_etl.handshake_fields import StudentFields
+from lde_etl.label_index import LabelIndex
+
+
+PRE_HEALTH_LABEL = 'hwd: pre-health'
+LABEL_SEPARATOR = ', '
+
+# the report columns the student data uses, in output order, along with their names in the student data
+HANDSHAKE_COLUMN_NAMES = {
+    StudentFields.AUTH_ID: 'jhed',
+    StudentFields.USERNAME: 'handshake_username',
+    StudentFields.ID: 'handshake_id',
+    StudentFields.HAS_LOGGED_IN: 'has_activated_handshake',
+    StudentFields.HAS_COMPLETED_PROFILE: 'has_completed_profile',
+}
+HANDSHAKE_REPORT_FIELDS = list(HANDSHAKE_COLUMN_NAMES) + [StudentFields.LABELS]
 
 
 def transform_handshake_data(handshake_data: pd.DataFrame) -> pd.DataFrame:
-    handshake_data = rename_handshake_id_column(handshake_data)
-    handshake_data = clean_logged_in_column(handshake_data)
-    handshake_data = clean_profile_completion_column(handshake_data)
-    handshake_data = convert_auth_id_to_jhed(handshake_data)
-    handshake_data = add_pre_med_column(handshake_data)
-    handshake_data = uppercase_username(handshake_data)
-    handshake_data = handshake_data[[
-        'jhed',
-        'handshake_username',
-        'handshake_id',
-        'has_activated_handshake',
-        'has_completed_profile',
-        'is_pre_med'
-    ]]
-    return handshake_data
+    """
+    Clean the Handshake student report in a single projection: only the columns the student data uses are
+    selected, they are renamed together and each one is cleaned with a vectorized operation.
+    """
+    labels = handshake_data[StudentFields.LABELS]
+    handshake_data = handshake_data[list(HANDSHAKE_COLUMN_NAMES)].rename(columns=HANDSHAKE_COLUMN_NAMES)
+    return handshake_data.assign(
+        jhed=extract_jheds_from_auth_ids(handshake_data['jhed']),
+        handshake_username=handshake_data['handshake_username'].str.upper(),
+        has_activated_handshake=convert_yes_no_values_to_bool(handshake_data['has_activated_handshake']),
+        has_completed_profile=convert_yes_no_values_to_bool(handshake_data['has_completed_profile']),
+        is_pre_med=has_pre_health_labels(labels),
+    )
 
 
 def rename_handshake_id_column(handshake_data: pd.DataFrame) -> pd.DataFrame:
@@ -40,30 +53,41 @@ def clean_profile_completion_column(handshake_data: pd.DataFrame) -> pd.DataFram
 
 
 def convert_yes_no_column_to_bool(df: pd.DataFrame, column: str) -> pd.DataFrame:
-    df[column] = df[column].replace({'Yes': True, 'No': False})
+    df[column] = convert_yes_no_values_to_bool(df[column])
     return df
 
 
+def convert_yes_no_values_to_bool(values: pd.Series) -> pd.Series:
+    return values.replace({'Yes': True, 'No': False})
+
+
 def convert_auth_id_to_jhed(handshake_data: pd.DataFrame) -> pd.DataFrame:
     handshake_data = handshake_data.rename(columns={
         StudentFields.AUTH_ID: 'jhed'
     })
-    handshake_data['jhed'] = handshake_data['jhed'].apply(extract_jhed_from_auth_id)
+    handshake_data['jhed'] = extract_jheds_from_auth_ids(handshake_data['jhed'])
     return handshake_data
 
 
-def extract_jhed_from_auth_id(auth_id: str) -> str:
-    try:
-        return auth_id[:auth_id.index('@')]
-    except (AttributeError, ValueError):
-        return auth_id
+def extract_jheds_from_auth_ids(auth_ids: pd.Series) -> pd.Series:
+    """Take the part of each auth id before the '@', leaving auth ids without an '@' unchanged"""
+    if auth_ids.dtype != object:
+        # there are no auth id strings to split, e.g. when every auth id is missing
+        return auth_ids
+    return auth_ids.str.split('@', n=1).str[0]
 
 
 def add_pre_med_column(handshake_data: pd.DataFrame) -> pd.DataFrame:
-    handshake_data['is_pre_med'] = handshake_data[StudentFields.LABELS].str.contains('hwd: pre-health')
+    handshake_data['is_pre_med'] = has_pre_health_labels(handshake_data[StudentFields.LABELS])
     return handshake_data
 
 
+def has_pre_health_labels(labels: pd.Series) -> pd.Series:
+    has_label = LabelIndex(labels, separator=LABEL_SEPARATOR).has_label_containing(PRE_HEALTH_LABEL)
+    # students without a label list are left as None rather than being marked not pre-med
+    return has_label.where(labels.notna(), None)
+
+
 def uppercase_username(handshake_data: pd.DataFrame) -> pd.DataFrame:
     handshake_data = handshake_data.rename(columns={
         StudentFields.USERNAME: 'handshake_username'
@@ -1,7 +1,20 @@
+import hashlib
+import inspect
+from typing import List, Tuple
+
 import numpy as np
 import pandas as pd
 
 from lde_etl.data_model import Departments
+from lde_etl.transform_utils import Lookup
+from lde_etl.transform_utils import left_join_lookups
+from lde_etl.transform_utils import map_unique_values
+
+DEPARTMENT_RULE_FIELDS = ['school_year', 'college', 'major_department', 'is_ep', 'is_athlete', 'is_in_org', 'is_urm',
+                          'is_first_generation', 'is_pell_eligible', 'is_pre_med', 'wgs_affiliation_type']
+# bump to invalidate every stored department rule fingerprint when the rules change in a way their source doesn't
+# show, like a change to a helper outside of this module
+DEPARTMENT_RULES_VERSION = 1
 
 
 def clean_potentially_mistyped_bool_fields(students: pd.DataFrame) -> pd.DataFrame:
@@ -12,7 +25,7 @@ def clean_potentially_mistyped_bool_fields(students: pd.DataFrame) -> pd.DataFra
 
 
 def clean_mistyped_bool_field(df: pd.DataFrame, column_name: str) -> pd.DataFrame:
-    if df[column_name].dtype == 'bool':
+    if df[column_name].dtype == 'bool' or df[column_name].dtype == 'boolean':
         return df
     elif df[column_name].dtype == 'object':
         lower_column = df[column_name].fillna('').str.lower()
@@ -22,58 +35,123 @@ def clean_mistyped_bool_field(df: pd.DataFrame, column_name: str) -> pd.DataFram
     return df
 
 
+def enrich_students(students: pd.DataFrame, pell_data: pd.DataFrame, wgs_data: pd.DataFrame,
+                    athlete_data: pd.DataFrame, sli_data: pd.DataFrame, handshake_data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the Pell, WGS, athlete, SLI and Handshake data to the student data with a single join pass
+
+    :return: the student data, with one row per row of the given student data
+    """
+    students = left_join_lookups(students, [
+        Lookup('hopkins_id', pell_data, duplicates='first'),
+        wgs_lookup(wgs_data),
+        athlete_lookup(athlete_data),
+        sli_lookup(sli_data),
+        handshake_lookup(handshake_data),
+    ])
+    return add_sli_flags(add_athlete_flag(students))
+
+
 def merge_with_handshake_data(students: pd.DataFrame, handshake_data: pd.DataFrame) -> pd.DataFrame:
-    return students.merge(handshake_data, how='left', on='jhed')
+    return left_join_lookups(students, [handshake_lookup(handshake_data)])
+
+
+def handshake_lookup(handshake_data: pd.DataFrame) -> Lookup:
+    return Lookup('jhed', handshake_data, duplicates='first')
 
 
 def melt_majors(students: pd.DataFrame) -> pd.DataFrame:
-    split_majors = students['majors'].str.split(';', expand=True)
-    split_major_columns = list(split_majors.columns)
-    split_majors['hopkins_id'] = students['hopkins_id']
-    melted_majors = split_majors.melt(id_vars=['hopkins_id'], value_vars=split_major_columns, value_name='major').dropna()
-    melted_majors = melted_majors.drop(columns=['variable'])
-    students = students.merge(melted_majors, how='left', on='hopkins_id')
-    students = students.drop(columns=['majors'])
-    return students
+    student_attributes = students.drop(columns=['majors'])
+    return join_student_attributes(explode_majors(students), student_attributes)
 
 
-def clean_majors(students: pd.DataFrame) -> pd.DataFrame:
-    def clean_major(major: str) -> str:
-        lowercase_major = major.lower()
-        if ':' in lowercase_major:
-            if lowercase_major.startswith('m.') or lowercase_major.startswith('ph.d'):
-                return major
-            else:
-                return major[major.index(':') + 1:].strip()
-        else:
-            return major
+def normalize_majors(students: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split the student data into a table of student attributes, with one row per student, and a narrow table of
+    cleaned majors, with one row per student major. The two tables can be joined with join_student_attributes.
 
-    students['major'] = students['major'].apply(clean_major)
+    :param students: student data with a semicolon-delimited 'majors' column
+    :return: the student attribute table and the student major table
+    """
+    student_attributes = students.drop(columns=['majors'])
+    student_majors = explode_majors(students)
+    student_majors['major'] = clean_major_values(student_majors['major'])
+    return student_attributes, student_majors
+
+
+def explode_majors(students: pd.DataFrame) -> pd.DataFrame:
+    majors = students['majors'].str.split(';').explode().dropna()
+    return pd.DataFrame({
+        'hopkins_id': students['hopkins_id'].loc[majors.index].values,
+        'major': majors.values
+    })
+
+
+def join_student_attributes(student_majors: pd.DataFrame, student_attributes: pd.DataFrame,
+                            columns: List[str] = None) -> pd.DataFrame:
+    if columns is not None:
+        student_attributes = student_attributes[['hopkins_id'] + columns]
+    return student_attributes.merge(student_majors, how='left', on='hopkins_id')
+
+
+def clean_majors(students: pd.DataFrame) -> pd.DataFrame:
+    students['major'] = clean_major_values(students['major'])
     return students
 
 
+def clean_major_values(majors: pd.Series) -> pd.Series:
+    return map_unique_values(majors, clean_major)
+
+
+def clean_major(major: str) -> str:
+    lowercase_major = major.lower()
+    if ':' in lowercase_major:
+        if lowercase_major.startswith('m.') or lowercase_major.startswith('ph.d'):
+            return major
+        else:
+            return major[major.index(':') + 1:].strip()
+    else:
+        return major
+
+
 def add_major_metadata(students: pd.DataFrame, major_metadata: pd.DataFrame) -> pd.DataFrame:
     merged_data = students.merge(major_metadata, how='left', on='major')
     merged_data = merged_data.rename(columns={'department': 'major_department'})
-    merged_data.loc[merged_data['is_ep'], ['college', 'major_department']] = ['wse', Departments.EP.value.name]
+    merged_data.loc[merged_data['is_ep'].fillna(False).astype(bool), ['college', 'major_department']] = ['wse', Departments.EP.value.name]
     return merged_data
 
 
 def add_athlete_data(students: pd.DataFrame, athlete_data: pd.DataFrame) -> pd.DataFrame:
-    students = students.merge(athlete_data, how='left', left_on='hopkins_id', right_on='University ID')
-    students = students.drop(columns=['University ID'])
-    students = students.rename(columns={'Sport': 'sport'})
-    students['is_athlete'] = ~students['sport'].isna()
+    return add_athlete_flag(left_join_lookups(students, [athlete_lookup(athlete_data)]))
+
+
+def athlete_lookup(athlete_data: pd.DataFrame) -> Lookup:
+    # athletes who play more than one sport are listed once per sport
+    return Lookup('hopkins_id', athlete_data.rename(columns={'Sport': 'sport'}), table_key='University ID',
+                  duplicates='join')
+
+
+def add_athlete_flag(students: pd.DataFrame) -> pd.DataFrame:
+    students.insert(students.columns.get_loc('sport') + 1, 'is_athlete', ~students['sport'].isna())
     return students
 
 
-def add_wgs_data(students: pd.DataFrame, wgs_data: pd.DataFrame) -> pd.DataFrame:
-    return students.merge(wgs_data, how='left', on='hopkins_id')
+def wgs_lookup(wgs_data: pd.DataFrame) -> Lookup:
+    return Lookup('hopkins_id', wgs_data, duplicates='first')
 
 
 def add_sli_data(students: pd.DataFrame, sli_data: pd.DataFrame) -> pd.DataFrame:
-    students = students.merge(sli_data, how='left', on='hopkins_id')
-    students['is_in_org'] = ~students['is_top_4_officer'].isna()
+    return add_sli_flags(left_join_lookups(students, [sli_lookup(sli_data)]))
+
+
+def sli_lookup(sli_data: pd.DataFrame) -> Lookup:
+    # students in more than one organization count as top 4 officers if they are one in any of them
+    return Lookup('hopkins_id', sli_data, duplicates='max')
+
+
+def add_sli_flags(students: pd.DataFrame) -> pd.DataFrame:
+    students.insert(students.columns.get_loc('is_top_4_officer') + 1, 'is_in_org',
+                    ~students['is_top_4_officer'].isna())
     students['is_top_4_officer'] = students['is_top_4_officer'].fillna(False)
     return students
 
@@ -82,9 +160,14 @@ def make_student_department_table(students: pd.DataFrame) -> pd.DataFrame:
     if students.empty:
         return pd.DataFrame(data={'hopkins_id': [], 'department': []})
     else:
+        # group each student's rows by an integer key once, instead of comparing every hopkins_id for each student
+        codes, hopkins_ids = pd.factorize(students['hopkins_id'], use_na_sentinel=False)
+        order = np.argsort(codes, kind='stable')
+        group_bounds = np.searchsorted(codes[order], np.arange(len(hopkins_ids) + 1))
         sub_tables = []
-        for hopkins_id in students['hopkins_id'].unique():
-            sub_tables.append(make_student_department_subtable(students, hopkins_id))
+        for code, hopkins_id in enumerate(hopkins_ids):
+            student_rows = students.iloc[order[group_bounds[code]:group_bounds[code + 1]]]
+            sub_tables.append(make_student_department_subtable(student_rows, hopkins_id))
         return pd.concat(sub_tables, ignore_index=True)
 
 
@@ -96,7 +179,7 @@ def make_student_department_subtable(students: pd.DataFrame, hopkins_id: str) ->
         return student_df.iloc[0]['school_year'] in ['Freshman', 'Sophomore', 'Junior', 'Senior']
 
     def is_ep(student_df: pd.DataFrame) -> bool:
-        return student_df.iloc[0]['is_ep']
+        return _is_true(student_df.iloc[0]['is_ep'])
 
     def is_bme(student_df: pd.DataFrame) -> bool:
         return student_df.iloc[0]['major_department'] == Departments.BME.value.name
@@ -110,7 +193,7 @@ def make_student_department_subtable(students: pd.DataFrame, hopkins_id: str) ->
         return pd.concat([major_depts, department_table])
 
     def add_soar_departments(student_df: pd.DataFrame, table_df: pd.DataFrame) -> pd.DataFrame:
-        if student_df.iloc[0]['is_athlete'] == True:
+        if _is_true(student_df.iloc[0]['is_athlete']):
             table_df = append_department(hopkins_id, Departments.SOAR_ATHLETICS.value.name, table_df)
         if is_undergrad(student_df):
             if is_freshman(student_df):
@@ -118,12 +201,12 @@ def make_student_department_subtable(students: pd.DataFrame, hopkins_id: str) ->
                     table_df = append_department(hopkins_id, Departments.SOAR_FYE_KSAS.value.name, table_df)
                 if 'wse' in student_df['college'].values:
                     table_df = append_department(hopkins_id, Departments.SOAR_FYE_WSE.value.name, table_df)
-            if student_df.iloc[0]['is_in_org'] == True:
+            if _is_true(student_df.iloc[0]['is_in_org']):
                 table_df = append_department(hopkins_id, Departments.SOAR_SLI.value.name, table_df)
-            if student_df.iloc[0]['is_urm'] == True or student_df.iloc[0]['is_first_generation'] == True or student_df.iloc[0]['is_pell_eligible'] == True:
-                if student_df.iloc[0]['is_pre_med'] == True:
+            if _is_true(student_df.iloc[0]['is_urm']) or _is_true(student_df.iloc[0]['is_first_generation']) or _is_true(student_df.iloc[0]['is_pell_eligible']):
+                if _is_true(student_df.iloc[0]['is_pre_med']):
                     table_df = append_department(hopkins_id, Departments.SOAR_CSS.value.name, table_df)
-                elif student_df.iloc[0]['is_athlete'] == False and student_df.iloc[0]['is_in_org'] == False and not is_freshman(student_df):
+                elif _is_false(student_df.iloc[0]['is_athlete']) and _is_false(student_df.iloc[0]['is_in_org']) and not is_freshman(student_df):
                     table_df = append_department(hopkins_id, Departments.SOAR_DIV_INCL.value.name, table_df)
         return table_df
 
@@ -149,6 +232,78 @@ def make_student_department_subtable(students: pd.DataFrame, hopkins_id: str) ->
     return student_dept_table
 
 
+def _is_true(value) -> bool:
+    # flags can be missing, and a missing nullable boolean can't be used as a condition
+    return value is not pd.NA and value == True
+
+
+def _is_false(value) -> bool:
+    return value is not pd.NA and value == False
+
+
+def make_student_department_table_incrementally(students: pd.DataFrame, previous_departments: pd.DataFrame,
+                                                previous_fingerprints: pd.DataFrame,
+                                                full_recompute: bool = False) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Make the student department table, only re-running the department rules for students whose rule inputs
+    have changed since the previous run. The department assignments of all other students are carried over
+    from the previous run's table.
+
+    :param students: the melted student data
+    :param previous_departments: the student department table from the previous run
+    :param previous_fingerprints: the department rule input fingerprints from the previous run
+    :param full_recompute: whether to re-run the department rules for every student
+    :return: the student department table and the fingerprints to store for the next run
+    """
+    fingerprints = fingerprint_department_rule_inputs(students)
+    if full_recompute:
+        changed_ids = fingerprints['hopkins_id']
+    else:
+        compared = fingerprints.merge(previous_fingerprints, how='left', on='hopkins_id', suffixes=('', '_previous'))
+        changed_ids = compared.loc[compared['fingerprint'] != compared['fingerprint_previous'], 'hopkins_id']
+    is_unchanged = previous_departments['hopkins_id'].isin(fingerprints['hopkins_id']) & \
+                   ~previous_departments['hopkins_id'].isin(changed_ids)
+    recomputed_departments = make_student_department_table(students.loc[students['hopkins_id'].isin(changed_ids)])
+    student_departments = pd.concat([previous_departments.loc[is_unchanged], recomputed_departments], ignore_index=True)
+    return student_departments, fingerprints
+
+
+def fingerprint_department_rule_inputs(students: pd.DataFrame) -> pd.DataFrame:
+    """
+    Hash every field read by the department rules into a single fingerprint per student. The fingerprints
+    also cover the source of the rules themselves, so changing the rules invalidates every fingerprint.
+
+    :param students: the melted student data
+    :return: a table mapping each hopkins_id to its fingerprint
+    """
+    rule_inputs = students.reindex(columns=DEPARTMENT_RULE_FIELDS).astype(object)
+    rule_inputs = rule_inputs.where(rule_inputs.notna(), '').astype(str)
+    row_hashes = pd.util.hash_pandas_object(rule_inputs, index=False).values
+    codes, hopkins_ids = pd.factorize(students['hopkins_id'])
+    order = np.argsort(codes, kind='stable')
+    group_starts = np.searchsorted(codes[order], np.arange(len(hopkins_ids)))
+    # weight each row by its position within the student so that the order of a student's rows matters
+    positions = np.arange(len(order)) - np.repeat(group_starts, np.bincount(codes, minlength=len(hopkins_ids)))
+    with np.errstate(over='ignore'):
+        weighted_hashes = row_hashes[order] * (2 * positions.astype(np.uint64) + np.uint64(1))
+        combined_hashes = np.add.reduceat(weighted_hashes, group_starts) if len(order) else weighted_hashes
+    fingerprints = pd.util.hash_array(combined_hashes ^ department_rules_version())
+    return pd.DataFrame({'hopkins_id': hopkins_ids, 'fingerprint': fingerprints.astype(str)})
+
+
+def department_rules_version() -> np.uint64:
+    """
+    Hash everything the department rules depend on: DEPARTMENT_RULES_VERSION, the source of the rules and of the
+    flag helpers they use, and the department names they assign. The hash changes whenever any of them do.
+    """
+    rules_sources = [inspect.getsource(function) for function in [make_student_department_table,
+                                                                   make_student_department_subtable,
+                                                                   _is_true, _is_false]]
+    department_names = [department.value.name for department in Departments]
+    rules_version = '\n'.join([str(DEPARTMENT_RULES_VERSION)] + rules_sources + department_names)
+    return np.uint64(int(hashlib.sha1(rules_version.encode('utf-8')).hexdigest()[:16], 16))
+
+
 def merge_with_student_department_data(students: pd.DataFrame, student_department_data: pd.DataFrame) -> pd.DataFrame:
     return students.merge(student_department_data, how='left', on='hopkins_id')
 
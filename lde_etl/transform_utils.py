@@ -0,0 +1,261 @@
+import os
+import pickle
+import warnings
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+_UNIQUE_VALUE_CACHES: Dict[Callable, Dict[Hashable, Any]] = {}
+# bounds on the results map_unique_values keeps, so that a long-running process doesn't grow without limit
+MAX_CACHED_FUNCTIONS = 64
+MAX_CACHED_VALUES = 100000
+DUPLICATE_KEY_POLICIES = ['raise', 'first', 'max', 'join']
+SPILLED_COLUMNS_FILENAME = 'columns.pkl'
+
+
+def map_unique_values(values: Union[pd.Series, Sequence], func: Callable, skip_nulls: bool = True) -> pd.Series:
+    """
+    Apply a function to a column of low-cardinality values, calling it only once per distinct value.
+
+    The column is factorized into integer codes, the function is applied to each distinct value and the
+    results are mapped back through the codes. Results are cached per function until the cache is cleared,
+    so later calls only pay for values that have not been seen before. A function's cache is emptied once it
+    holds MAX_CACHED_VALUES results, and the oldest function's cache is dropped once more than
+    MAX_CACHED_FUNCTIONS functions have one.
+
+    :param values: a Series or sequence of hashable values
+    :param func: the function to apply to each distinct value
+    :param skip_nulls: whether to leave null values as None without calling the function. Otherwise the
+        function is called with None, so that a function that rejects nulls raises on them.
+    :return: a Series of results aligned with the given values
+    """
+    codes, unique_values = pd.factorize(values)
+    cache = _get_unique_value_cache(func)
+    results = np.empty(len(unique_values) + 1, dtype=object)
+    for i, value in enumerate(unique_values):
+        # values like 1, 1.0 and True are equal and hash the same, so the results are cached by type as well
+        key = (type(value), value)
+        if key not in cache:
+            if len(cache) >= MAX_CACHED_VALUES:
+                cache.clear()
+            cache[key] = func(value)
+        results[i] = cache[key]
+    # null values are factorized to a code of -1
+    results[-1] = func(None) if not skip_nulls and (codes < 0).any() else None
+    if isinstance(values, pd.Series):
+        return pd.Series(results[codes], index=values.index, name=values.name).infer_objects()
+    else:
+        return pd.Series(results[codes]).infer_objects()
+
+
+def _get_unique_value_cache(func: Callable) -> Dict[Hashable, Any]:
+    if func not in _UNIQUE_VALUE_CACHES and len(_UNIQUE_VALUE_CACHES) >= MAX_CACHED_FUNCTIONS:
+        del _UNIQUE_VALUE_CACHES[next(iter(_UNIQUE_VALUE_CACHES))]
+    return _UNIQUE_VALUE_CACHES.setdefault(func, {})
+
+
+def clear_unique_value_cache():
+    """Forget every cached result of map_unique_values"""
+    _UNIQUE_VALUE_CACHES.clear()
+
+
+def partition_by_column(df: pd.DataFrame, column: str, sort: bool = False) -> Iterator[Tuple[Any, pd.DataFrame]]:
+    """
+    Split a dataframe into one slice per distinct value of a column.
+
+    The rows are grouped with a single stable sort, so the cost does not depend on the number of distinct
+    values. Each slice is a view into the one regrouped copy of the dataframe and keeps its rows in their
+    original order. Rows with a null value in the column are left out.
+
+    :param df: the dataframe to split
+    :param column: the column to split on
+    :param sort: whether to yield the slices in sorted value order rather than order of first appearance
+    :return: an iterator of (value, slice) pairs
+    """
+    codes, values = pd.factorize(df[column], sort=sort)
+    order = np.argsort(codes, kind='stable')
+    order = order[codes[order] >= 0]
+    grouped = df.take(order)
+    slice_ends = np.cumsum(np.bincount(codes[order], minlength=len(values)))
+    slice_start = 0
+    for value, slice_end in zip(values, slice_ends):
+        yield value, grouped.iloc[slice_start:slice_end]
+        slice_start = slice_end
+
+
+def hash_partition_positions(values: pd.Series, partition_count: int) -> List[np.ndarray]:
+    """
+    Split the rows of a dataframe into a fixed number of partitions by a hash of a column, finding the positions
+    of each partition's rows so that the partitions can be taken one at a time.
+
+    Rows with the same value always land in the same partition, whatever else is in the dataframe, so several
+    tables keyed by the same column can be partitioned separately and processed partition by partition.
+
+    :param values: the column to hash
+    :param partition_count: the number of partitions
+    :return: the positions of each partition's rows, in order
+    """
+    partition_ids = pd.util.hash_array(values.to_numpy(dtype=object)) % np.uint64(partition_count)
+    order = np.argsort(partition_ids, kind='stable')
+    partition_ends = np.cumsum(np.bincount(partition_ids.astype(np.int64), minlength=partition_count))
+    return [order[partition_end - partition_size:partition_end]
+            for partition_end, partition_size in zip(partition_ends, np.diff(partition_ends, prepend=0))]
+
+
+def spill_partition(df: pd.DataFrame, dirpath: str):
+    """
+    Write a partition of a dataframe to a directory, each column to its own file, so that the partitions can be
+    concatenated by read_spilled_partitions without holding all of them in memory
+
+    :param df: the partition
+    :param dirpath: the directory to write the partition to, which must not exist yet
+    """
+    os.makedirs(dirpath)
+    with open(os.path.join(dirpath, SPILLED_COLUMNS_FILENAME), 'wb') as file:
+        pickle.dump(list(df.columns), file)
+    for position, column in enumerate(df.columns):
+        # the values are written without a Series around them, which takes far more memory than the values of
+        # a small partition once there are many partitions to read back at once
+        values = df[column].array
+        if isinstance(values, pd.arrays.PandasArray):
+            values = values.to_numpy()
+        with open(os.path.join(dirpath, f'{position}.pkl'), 'wb') as file:
+            pickle.dump(values, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_spilled_columns(dirpath: str) -> List[str]:
+    """Get the columns of a partition of a dataframe written by spill_partition"""
+    with open(os.path.join(dirpath, SPILLED_COLUMNS_FILENAME), 'rb') as file:
+        return pickle.load(file)
+
+
+def read_spilled_partitions(dirpaths: List[str], columns: List[str] = None, order: np.ndarray = None) -> pd.DataFrame:
+    """
+    Concatenate the partitions of a dataframe written by spill_partition, one column at a time, so that apart
+    from the result only one column of the partitions is ever in memory.
+
+    pandas only keeps a column categorical if it has the same categories in every partition, so a column whose
+    categories differ between partitions is first given the sorted union of their categories, which are the
+    categories the column would have had if it had been converted before it was partitioned.
+
+    :param dirpaths: the directories the partitions were written to, in the order to concatenate them in
+    :param columns: the columns to read, defaulting to every column
+    :param order: the positions of the concatenated rows in the order to take them, if they should be reordered
+    :return: the concatenated partitions, with a new range index
+    """
+    spilled_columns = read_spilled_columns(dirpaths[0])
+    concatenated = {}
+    for column in (columns if columns is not None else spilled_columns):
+        pieces = []
+        for dirpath in dirpaths:
+            with open(os.path.join(dirpath, f'{spilled_columns.index(column)}.pkl'), 'rb') as file:
+                pieces.append(pickle.load(file))
+        values = _concat_spilled_values(pieces)
+        del pieces
+        concatenated[column] = pd.Series(values if order is None else values.take(order), copy=False)
+    # the columns are put together without copying them into blocks
+    return pd.DataFrame(concatenated, copy=False)
+
+
+def _concat_spilled_values(pieces: list):
+    if all(isinstance(piece, pd.Categorical) for piece in pieces):
+        if any(piece.dtype != pieces[0].dtype for piece in pieces):
+            categories = sorted(set().union(*(piece.categories for piece in pieces)))
+            pieces = [piece.set_categories(categories) for piece in pieces]
+        return union_categoricals(pieces)
+    if all(isinstance(piece, np.ndarray) and piece.dtype == pieces[0].dtype for piece in pieces):
+        return np.concatenate(pieces)
+    return pd.concat([pd.Series(piece, copy=False) for piece in pieces], ignore_index=True).array
+
+
+class Lookup:
+    """
+    A side table to look columns up from by key, as one of the lookups of left_join_lookups
+
+    :param key: the column of the main table to look rows up by
+    :param table: the side table
+    :param table_key: the column of the side table to match the key against, if it is named differently
+    :param columns: the side table columns to add to the main table, defaulting to every non-key column
+    :param duplicates: what to do with keys that appear in more than one row of the side table, rather than
+        multiplying the main table's rows: 'raise' an error, keep the 'first' row, keep the 'max' of each
+        column, or 'join' each column's distinct values with semicolons. Every policy but 'raise' warns with the
+        number of duplicated keys, so that rows are never dropped silently.
+    """
+
+    def __init__(self, key: str, table: pd.DataFrame, table_key: str = None, columns: List[str] = None,
+                 duplicates: str = 'raise'):
+        if duplicates not in DUPLICATE_KEY_POLICIES:
+            raise ValueError(f'Unknown duplicate key policy {duplicates!r}, expected one of {DUPLICATE_KEY_POLICIES}')
+        self.key = key
+        self.table_key = table_key if table_key is not None else key
+        self.columns = columns if columns is not None else [column for column in table.columns
+                                                            if column != self.table_key]
+        self.table = table
+        self.duplicates = duplicates
+
+    def indexed_table(self) -> pd.DataFrame:
+        """Get the lookup columns of the side table, indexed by a unique, non-null key"""
+        table = self.table[[self.table_key] + self.columns].dropna(subset=[self.table_key])
+        is_duplicate = table[self.table_key].duplicated(keep=False)
+        if is_duplicate.any():
+            duplicate_rows = table.loc[is_duplicate]
+            if self.duplicates == 'raise':
+                duplicate_keys = duplicate_rows[self.table_key].unique()
+                raise ValueError(f'{len(duplicate_keys)} values of {self.table_key} appear in more than one row '
+                                 f'of the lookup table, e.g. {list(duplicate_keys[:5])}')
+            duplicate_key_count = duplicate_rows[self.table_key].nunique()
+            warnings.warn(f'{duplicate_key_count} values of {self.table_key} appear in more than one row of the '
+                          f'lookup table, so {len(duplicate_rows) - duplicate_key_count} rows were dropped by the '
+                          f'{self.duplicates!r} duplicate key policy')
+            if self.duplicates == 'first':
+                table = table.drop_duplicates(subset=[self.table_key])
+            else:
+                aggregate = 'max' if self.duplicates == 'max' else _join_distinct_values
+                deduplicated = duplicate_rows.groupby(self.table_key, sort=False).agg(aggregate).reset_index()
+                table = pd.concat([table.loc[~is_duplicate], deduplicated], ignore_index=True)
+        return table.set_index(self.table_key)
+
+
+def _join_distinct_values(values: pd.Series) -> str:
+    return ';'.join(values.dropna().astype(str).unique())
+
+
+def left_join_lookups(df: pd.DataFrame, lookups: List[Lookup]) -> pd.DataFrame:
+    """
+    Left join several side tables onto a dataframe in a single pass.
+
+    Each key column is factorized once, however many side tables are looked up by it, and each side table is
+    aligned to the distinct key values rather than to every row. All of the looked-up columns are then added
+    with one concatenation instead of copying the whole dataframe once per join. Null keys never match, and
+    keys that appear more than once in a side table are handled by the lookup's duplicate key policy, so the
+    result always has exactly the rows of the given dataframe, in the same order.
+
+    :param df: the main table
+    :param lookups: the side tables to look columns up from
+    :return: the main table with the looked-up columns added
+    """
+    factorized_keys = {}
+    looked_up = []
+    for lookup in lookups:
+        clashing_columns = [column for column in lookup.columns
+                            if column in df.columns or any(column in table.columns for table in looked_up)]
+        if clashing_columns:
+            raise ValueError(f'Lookup columns {clashing_columns} are already in the table')
+        if lookup.key not in factorized_keys:
+            factorized_keys[lookup.key] = _factorize_lookup_key(df[lookup.key])
+        codes, key_values = factorized_keys[lookup.key]
+        aligned = lookup.indexed_table().reindex(key_values).take(codes)
+        looked_up.append(aligned.set_axis(df.index, axis=0))
+    return pd.concat([df] + looked_up, axis=1)
+
+
+def _factorize_lookup_key(keys: pd.Series) -> Tuple[np.ndarray, pd.Index]:
+    codes, key_values = pd.factorize(keys)
+    key_values = pd.Index(key_values)
+    if (codes < 0).any():
+        # null keys are pointed at an extra value that no side table has, so they never match
+        codes = np.where(codes < 0, len(key_values), codes)
+        key_values = key_values.append(pd.Index([object()]))
+    return codes, key_values
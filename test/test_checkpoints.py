@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lde_etl.checkpoints import RAW_DATA_RUN_ID
+from lde_etl.checkpoints import RunCheckpoints
+from lde_etl.checkpoints import delete_run
+from lde_etl.checkpoints import get_raw_data_cache
+from lde_etl.checkpoints import get_run_checkpoints
+from lde_etl.checkpoints import prune_runs
+
+
+class TestRunCheckpoints(unittest.TestCase):
+
+    def test_reloads_the_outputs_of_finished_stages_when_a_run_is_resumed(self):
+        students = pd.DataFrame({'hopkins_id': ['8fj4t2', 'sfs834'], 'is_athlete': [True, False]})
+        with tempfile.TemporaryDirectory() as runs_dir:
+            checkpoints = get_run_checkpoints(runs_dir, '20210301-120000', 'student')
+            checkpoints.save('sis_students', students)
+            checkpoints.save('write_student_departments', None)
+
+            resumed_checkpoints = get_run_checkpoints(runs_dir, '20210301-120000', 'student')
+
+            self.assertTrue(resumed_checkpoints.is_complete('sis_students'))
+            self.assertTrue(resumed_checkpoints.is_complete('write_student_departments'))
+            self.assertFalse(resumed_checkpoints.is_complete('handshake_data'))
+            assert_frame_equal(students, resumed_checkpoints.load('sis_students'))
+            self.assertIsNone(resumed_checkpoints.load('write_student_departments'))
+
+    def test_gives_stage_names_that_are_not_valid_filenames_a_safe_checkpoint_file(self):
+        with tempfile.TemporaryDirectory() as run_dir:
+            checkpoints = RunCheckpoints(run_dir)
+            checkpoints.save('office hour', ['record'])
+
+            self.assertEqual(['record'], RunCheckpoints(run_dir).load('office hour'))
+            self.assertIn('office_hour.pkl', os.listdir(run_dir))
+
+
+class TestRunRetention(unittest.TestCase):
+
+    def test_deletes_every_etl_of_a_run(self):
+        with tempfile.TemporaryDirectory() as runs_dir:
+            get_run_checkpoints(runs_dir, '20210301-120000', 'student').save('sis_students', None)
+            get_run_checkpoints(runs_dir, '20210301-120000', 'engagement').save('events', None)
+
+            delete_run(runs_dir, '20210301-120000')
+
+            self.assertEqual([], os.listdir(runs_dir))
+
+    def test_keeps_only_the_latest_earlier_runs_the_current_run_and_the_raw_data_cache(self):
+        run_ids = ['20210301-120000', '20210302-120000', '20210303-120000', '20210304-120000']
+        with tempfile.TemporaryDirectory() as runs_dir:
+            for run_id in run_ids:
+                get_run_checkpoints(runs_dir, run_id, 'student').save('sis_students', None)
+            get_raw_data_cache(runs_dir, 'student').save('sis_students', None)
+
+            prune_runs(runs_dir, '20210301-120000', max_kept_runs=2)
+
+            self.assertEqual(sorted([RAW_DATA_RUN_ID, '20210301-120000', '20210303-120000', '20210304-120000']),
+                             sorted(os.listdir(runs_dir)))
+
+    def test_does_nothing_before_the_first_run(self):
+        with tempfile.TemporaryDirectory() as runs_dir:
+            prune_runs(os.path.join(runs_dir, 'runs'), '20210301-120000')
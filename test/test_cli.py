@@ -0,0 +1,28 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from lde_etl.cli import load_credentials
+
+
+class TestLoadCredentials(unittest.TestCase):
+
+    def test_prefers_the_secrets_file_to_the_environment(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            secrets_filepath = os.path.join(dir_path, 'secrets.json')
+            with open(secrets_filepath, 'w') as file:
+                json.dump({'jhed': 'jsmith1', 'handshake_pw': 'from file'}, file)
+            with mock.patch.dict(os.environ, {'LDE_ETL_HANDSHAKE_EMAIL': 'jsmith@jhu.edu',
+                                              'LDE_ETL_HANDSHAKE_PW': 'from environment'}):
+                credentials = load_credentials(secrets_filepath)
+
+        self.assertEqual({'jhed': 'jsmith1', 'handshake_email': 'jsmith@jhu.edu', 'handshake_pw': 'from file'},
+                         credentials)
+
+    def test_raises_instead_of_prompting_when_there_is_no_terminal(self):
+        with mock.patch.dict(os.environ, {}, clear=True), mock.patch('sys.stdin') as stdin:
+            stdin.isatty.return_value = False
+            with self.assertRaises(ValueError):
+                load_credentials(names=['jhed'])
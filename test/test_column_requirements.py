@@ -0,0 +1,34 @@
+import unittest
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lde_etl.column_requirements import ALL_COLUMNS
+from lde_etl.column_requirements import project_columns
+from lde_etl.column_requirements import project_records
+
+
+class TestProjectColumns(unittest.TestCase):
+
+    def test_selects_the_required_columns_that_the_dataframe_has(self):
+        df = pd.DataFrame({'hopkins_id': ['93aml3'], 'major': ['economics'], 'system_labels': ['system gen: hwd']})
+        expected = pd.DataFrame({'major': ['economics'], 'hopkins_id': ['93aml3']})
+        assert_frame_equal(expected, project_columns(df, ['major', 'hopkins_id', 'college']))
+
+
+class TestProjectRecords(unittest.TestCase):
+
+    def test_keeps_only_the_required_fields_of_each_record(self):
+        records = [{'Students ID': '1', 'Students Username': 'ab1', 'Unused': 'x'},
+                   {'Students ID': '2', 'Students Username': None}]
+        expected = [{'Students ID': '1', 'Students Username': 'ab1'}, {'Students ID': '2', 'Students Username': None}]
+        self.assertEqual(expected, project_records(records, ['Students ID', 'Students Username']))
+
+    def test_raises_an_error_if_a_record_is_missing_a_required_field(self):
+        records = [{'Students ID': '1', 'Students Username': 'ab1'}, {'Students ID': '2'}]
+        with self.assertRaisesRegex(KeyError, r"Record 1 is missing the required fields \['Students Username'\]"):
+            project_records(records, ['Students ID', 'Students Username'])
+
+    def test_leaves_records_unchanged_if_every_field_is_required(self):
+        records = [{'Students ID': '1', 'Unused': 'x'}]
+        self.assertEqual(records, project_records(records, ALL_COLUMNS))
@@ -0,0 +1,33 @@
+import os
+import tempfile
+import unittest
+
+from lde_etl.common import atomic_write
+
+
+class TestAtomicWrite(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.filepath = os.path.join(self.temp_dir.name, 'data.txt')
+        with open(self.filepath, 'w') as file:
+            file.write('previous')
+
+    def test_replaces_the_file_once_it_is_written(self):
+        with atomic_write(self.filepath) as file:
+            file.write('latest')
+            with open(self.filepath) as previous_file:
+                self.assertEqual('previous', previous_file.read())
+        with open(self.filepath) as file:
+            self.assertEqual('latest', file.read())
+        self.assertEqual(['data.txt'], os.listdir(self.temp_dir.name))
+
+    def test_leaves_the_previous_file_in_place_if_the_write_fails(self):
+        with self.assertRaises(ValueError):
+            with atomic_write(self.filepath, 'wb') as file:
+                file.write(b'partial')
+                raise ValueError('interrupted')
+        with open(self.filepath) as file:
+            self.assertEqual('previous', file.read())
+        self.assertEqual(['data.txt'], os.listdir(self.temp_dir.name))
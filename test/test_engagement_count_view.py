@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from typing import List
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lde_etl.data_model import Departments
+from lde_etl.data_model import EngagementRecord
+from lde_etl.data_model import EngagementTypes
+from lde_etl.data_model import Mediums
+from lde_etl.engagement_count_view import EngagementCountView
+from lde_etl.engagement_count_view import load_engagement_count_view
+from lde_etl.engagement_count_view import save_engagement_count_view
+from lde_etl.file_writers import write_engagement_data
+from lde_etl.student_data_etl.transform_engagement_data import count_engagements_by_type
+
+
+def make_engagement_record(engagement_type: EngagementTypes, engagement_id: str, start_date_time: datetime,
+                           student_handshake_id: str) -> EngagementRecord:
+    return EngagementRecord(engagement_type=engagement_type, handshake_engagement_id=engagement_id,
+                            start_date_time=start_date_time, medium=Mediums.IN_PERSON, engagement_name='',
+                            engagement_department=Departments.BME.value, student_handshake_id=student_handshake_id,
+                            student_school_year_at_time_of_engagement='Junior', student_pre_registered=False,
+                            associated_staff_email='')
+
+
+def make_view(engagement_data: List[EngagementRecord]) -> EngagementCountView:
+    view = EngagementCountView()
+    view.add_records(engagement_data)
+    return view
+
+
+ENGAGEMENT_DATA = [
+    make_engagement_record(EngagementTypes.EVENT, '1', datetime(2020, 10, 1), '8029382'),
+    make_engagement_record(EngagementTypes.EVENT, '2', datetime(2021, 2, 1), '8029382'),
+    make_engagement_record(EngagementTypes.INTERVIEW, '3', datetime(2020, 11, 1), '8029382'),
+    make_engagement_record(EngagementTypes.OFFICE_HOURS, '4', datetime(2021, 3, 1), '4738743'),
+    make_engagement_record(EngagementTypes.OFFICE_HOURS, '5', datetime(2019, 12, 1), '4738743'),
+]
+
+
+class TestEngagementCountView(unittest.TestCase):
+
+    def test_counts_one_academic_year_like_count_engagements_by_type(self):
+        view = EngagementCountView()
+        view.add_records(ENGAGEMENT_DATA)
+        this_years_engagements = pd.DataFrame([record.data for record in ENGAGEMENT_DATA
+                                               if record.data['academic_year'] == 2021])
+
+        assert_frame_equal(count_engagements_by_type(this_years_engagements), view.engagement_counts(2021))
+
+    def test_building_from_the_engagement_file_in_chunks_matches_counting_the_records(self):
+        view = EngagementCountView()
+        view.add_records(ENGAGEMENT_DATA)
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath = os.path.join(dir_path, 'engagements.csv')
+            write_engagement_data(filepath, ENGAGEMENT_DATA)
+            streamed_view = EngagementCountView.from_engagement_file(filepath, chunksize=2)
+
+        assert_frame_equal(view.engagement_counts(2021), streamed_view.engagement_counts(2021))
+        assert_frame_equal(view.engagement_counts(2020), streamed_view.engagement_counts(2020))
+
+    def test_combining_views_matches_counting_all_of_their_records(self):
+        view = EngagementCountView()
+        view.add_records(ENGAGEMENT_DATA)
+        views = [EngagementCountView(), EngagementCountView()]
+        views[0].add_records(ENGAGEMENT_DATA[:2])
+        views[1].add_records(ENGAGEMENT_DATA[2:])
+        combined = EngagementCountView.combine(views)
+
+        self.assertEqual(view.academic_years(), combined.academic_years())
+        for academic_year in view.academic_years():
+            assert_frame_equal(view.engagement_counts(academic_year), combined.engagement_counts(academic_year))
+
+    def test_a_year_without_engagements_has_no_counts(self):
+        view = EngagementCountView()
+        view.add_records(ENGAGEMENT_DATA)
+
+        self.assertEqual([2020, 2021], view.academic_years())
+        self.assertEqual(0, len(view.engagement_counts(2030)))
+
+
+class TestLoadEngagementCountView(unittest.TestCase):
+
+    def test_uses_the_stored_view_while_the_engagement_file_is_unchanged(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            engagements_filepath = os.path.join(dir_path, 'engagements.csv')
+            view_filepath = os.path.join(dir_path, 'engagement_counts.pkl')
+            write_engagement_data(engagements_filepath, ENGAGEMENT_DATA)
+            save_engagement_count_view(make_view(ENGAGEMENT_DATA[:1]), view_filepath, engagements_filepath)
+
+            self.assertEqual(1, len(load_engagement_count_view(view_filepath, engagements_filepath)
+                                    .engagement_counts(2021)))
+
+    def test_rebuilds_the_view_when_the_engagement_file_has_changed(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            engagements_filepath = os.path.join(dir_path, 'engagements.csv')
+            view_filepath = os.path.join(dir_path, 'engagement_counts.pkl')
+            write_engagement_data(engagements_filepath, ENGAGEMENT_DATA[:1])
+            save_engagement_count_view(make_view(ENGAGEMENT_DATA[:1]), view_filepath, engagements_filepath)
+            write_engagement_data(engagements_filepath, ENGAGEMENT_DATA)
+
+            self.assertEqual(2, len(load_engagement_count_view(view_filepath, engagements_filepath)
+                                    .engagement_counts(2021)))
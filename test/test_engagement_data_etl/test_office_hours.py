@@ -72,3 +72,19 @@ class TestOfficeHourDataTransformation(unittest.TestCase):
         }
 
         self.assertEqual(expected, transform_office_hours_data(test_data)[0].data)
+
+    def test_raises_on_a_missing_medium_or_type(self):
+        row = {
+            AppointmentFields.ID: '4146716',
+            AppointmentFields.START_DATE_TIME: '2019-08-19 10:00:00',
+            AppointmentFields.MEDIUM: 'In-Person',
+            AppointmentFields.TYPE: 'Homewood: Pre-Med',
+            AppointmentFields.STAFF_MEMBER_EMAIL: 'kelli.johnson@jhu.edu',
+            AppointmentFields.STUDENT_ID: '14140603',
+            AppointmentFields.STUDENT_SCHOOL_YEAR: 'Alumni',
+            AppointmentFields.IS_DROP_IN: 'No'
+        }
+        with self.assertRaises(AttributeError):
+            transform_office_hours_data([row, dict(row, **{AppointmentFields.MEDIUM: None})])
+        with self.assertRaises(KeyError):
+            transform_office_hours_data([row, dict(row, **{AppointmentFields.TYPE: None})])
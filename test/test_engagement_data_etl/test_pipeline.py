@@ -0,0 +1,118 @@
+import tempfile
+import threading
+import time
+import unittest
+
+from lde_etl.checkpoints import RunCheckpoints
+from lde_etl.engagement_data_etl.pipeline import EngagementSource
+from lde_etl.engagement_data_etl.pipeline import cache_source_extracts
+from lde_etl.engagement_data_etl.pipeline import run_engagement_pipeline
+
+
+def make_source(name: str, downloads: list, transform=None) -> EngagementSource:
+    def extract(browser, download_dir):
+        downloads.append(name)
+        return [f'{name}_{i}' for i in range(2)]
+
+    return EngagementSource(name, extract, transform or (lambda raw_data: [row.upper() for row in raw_data]))
+
+
+class TestRunEngagementPipeline(unittest.TestCase):
+
+    def test_writes_the_transformed_records_of_each_source_in_order(self):
+        downloads = []
+        batches = []
+        sources = [make_source(name, downloads) for name in ['office_hours', 'events', 'interviews']]
+
+        run_engagement_pipeline(None, '', sources, batches.append)
+
+        self.assertEqual([['OFFICE_HOURS_0', 'OFFICE_HOURS_1'], ['EVENTS_0', 'EVENTS_1'],
+                          ['INTERVIEWS_0', 'INTERVIEWS_1']], batches)
+
+    def test_downloads_the_next_source_while_the_previous_one_is_transformed(self):
+        downloads = []
+        second_download_started = threading.Event()
+        transforms_overlapping_downloads = []
+
+        def transform(raw_data):
+            transforms_overlapping_downloads.append(second_download_started.wait(timeout=5))
+            return raw_data
+
+        def extract_second(browser, download_dir):
+            second_download_started.set()
+            return []
+
+        sources = [make_source('events', downloads, transform), EngagementSource('fairs', extract_second, list)]
+        run_engagement_pipeline(None, '', sources, lambda engagement_data: None)
+
+        self.assertEqual([True], transforms_overlapping_downloads)
+
+    def test_stops_downloading_and_reraises_when_a_transform_fails(self):
+        downloads = []
+        first_transform_done = threading.Event()
+
+        def failing_transform(raw_data):
+            first_transform_done.set()
+            raise ValueError('bad report')
+
+        def extract_after_failure(browser, download_dir):
+            first_transform_done.wait(timeout=5)
+            # give the worker time to record the error it is about to raise
+            time.sleep(0.1)
+            downloads.append('events')
+            return []
+
+        sources = [make_source('office_hours', downloads, failing_transform),
+                   EngagementSource('events', extract_after_failure, list),
+                   make_source('interviews', downloads)]
+
+        with self.assertRaises(ValueError):
+            run_engagement_pipeline(None, '', sources, lambda engagement_data: None)
+        self.assertNotIn('interviews', downloads)
+
+    def test_reraises_download_errors(self):
+        def failing_extract(browser, download_dir):
+            raise RuntimeError('download failed')
+
+        batches = []
+        sources = [make_source('office_hours', []), EngagementSource('events', failing_extract, list)]
+
+        with self.assertRaises(RuntimeError):
+            run_engagement_pipeline(None, '', sources, batches.append)
+        self.assertEqual([['OFFICE_HOURS_0', 'OFFICE_HOURS_1']], batches)
+
+    def test_writes_checkpointed_sources_without_downloading_them_again(self):
+        def failing_extract(browser, download_dir):
+            raise RuntimeError('download failed')
+
+        with tempfile.TemporaryDirectory() as run_dir:
+            downloads = []
+            with self.assertRaises(RuntimeError):
+                run_engagement_pipeline(None, '', [make_source('office_hours', downloads),
+                                                   EngagementSource('interviews', failing_extract, list)],
+                                        lambda engagement_data: None, checkpoints=RunCheckpoints(run_dir))
+            downloads.clear()
+            batches = []
+            run_engagement_pipeline(None, '', [make_source('office_hours', downloads),
+                                               make_source('interviews', downloads)],
+                                    batches.append, checkpoints=RunCheckpoints(run_dir))
+
+        self.assertEqual(['interviews'], downloads)
+        self.assertEqual([['OFFICE_HOURS_0', 'OFFICE_HOURS_1'], ['INTERVIEWS_0', 'INTERVIEWS_1']], batches)
+
+
+class TestCacheSourceExtracts(unittest.TestCase):
+
+    def test_transforms_sources_that_are_not_pulled_from_their_cached_raw_data(self):
+        downloads = []
+        sources = [make_source(name, downloads) for name in ['office_hours', 'events']]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            run_engagement_pipeline(None, '', cache_source_extracts(sources, RunCheckpoints(cache_dir)),
+                                    lambda engagement_data: None)
+            downloads.clear()
+            batches = []
+            run_engagement_pipeline(None, '', cache_source_extracts(sources, RunCheckpoints(cache_dir), ['events']),
+                                    batches.append)
+
+        self.assertEqual(['events'], downloads)
+        self.assertEqual([['OFFICE_HOURS_0', 'OFFICE_HOURS_1'], ['EVENTS_0', 'EVENTS_1']], batches)
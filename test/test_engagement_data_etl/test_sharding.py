@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+from pandas.testing import assert_frame_equal
+
+from lde_etl.engagement_count_view import EngagementCountView
+from lde_etl.engagement_data_etl.events import transform_extracted_events_data
+from lde_etl.engagement_data_etl.office_hours import transform_office_hours_data
+from lde_etl.engagement_data_etl.sharding import transform_in_shards
+from lde_etl.file_writers import EngagementDataWriter
+from lde_etl.file_writers import format_engagement_rows
+from lde_etl.file_writers import write_engagement_data
+from lde_etl.handshake_fields import AppointmentFields, EventFields
+
+EVENT_LABELS = [None, 'hwd: bme dept', 'hwd: soar sli', 'hwd: some other label']
+
+
+def make_office_hours_data(size: int) -> list:
+    return [
+        {
+            AppointmentFields.ID: str(1000 + i),
+            AppointmentFields.START_DATE_TIME: f'2019-{i % 12 + 1:02}-12 13:00:00',
+            AppointmentFields.MEDIUM: 'In-Person' if i % 2 else 'Virtual',
+            AppointmentFields.TYPE: 'Homewood: Brain Sciences' if i % 3 else 'Homewood: Pre-Med',
+            AppointmentFields.STAFF_MEMBER_EMAIL: f'staff{i % 4}@jhu.edu',
+            AppointmentFields.STUDENT_ID: str(2000 + i),
+            AppointmentFields.STUDENT_SCHOOL_YEAR: None if i % 5 == 0 else 'Junior',
+            AppointmentFields.IS_DROP_IN: 'Yes' if i % 7 == 0 else 'No',
+        }
+        for i in range(size)
+    ]
+
+
+def make_events_data(size: int) -> tuple:
+    events = [
+        {
+            EventFields.ID: str(i % 10),
+            EventFields.START_DATE_TIME: '2019-09-12 13:00:00',
+            EventFields.NAME: f'Homewood: Event {i % 10}',
+            EventFields.STUDENT_ID: str(2000 + i),
+            EventFields.IS_PRE_REGISTERED: 'Yes' if i % 2 else 'No',
+        }
+        for i in range(size)
+    ]
+    labels = [{EventFields.ID: str(event_id), EventFields.LABEL: label}
+              for event_id in range(10) for label in EVENT_LABELS[:event_id % len(EVENT_LABELS) + 1]]
+    return events, labels
+
+
+class TestTransformInShards(unittest.TestCase):
+
+    def assert_match_the_unsharded_transform(self, transform, raw_data):
+        expected = transform(raw_data)
+        expected_counts = EngagementCountView()
+        expected_counts.add_records(expected)
+
+        actual = transform_in_shards(transform, raw_data, shard_size=60, max_workers=2)
+
+        self.assertEqual(5, len(actual.rows))
+        self.assertEqual(list(expected[0].data), actual.fields)
+        self.assertEqual(format_engagement_rows(expected), ''.join(actual.rows))
+        self.assertEqual(expected_counts.academic_years(), actual.count_view.academic_years())
+        for academic_year in expected_counts.academic_years():
+            assert_frame_equal(expected_counts.engagement_counts(academic_year),
+                               actual.count_view.engagement_counts(academic_year))
+
+    def test_sharded_office_hours_match_the_unsharded_transform(self):
+        self.assert_match_the_unsharded_transform(transform_office_hours_data, make_office_hours_data(250))
+
+    def test_sharded_events_match_the_unsharded_transform(self):
+        self.assert_match_the_unsharded_transform(transform_extracted_events_data, make_events_data(250))
+
+    def test_transforms_raw_data_that_fits_in_one_shard_in_this_process(self):
+        raw_data = make_office_hours_data(2)
+
+        # a lambda can't be sent to another process, so this would fail if the data were sharded
+        transformed = transform_in_shards(lambda rows: transform_office_hours_data(rows), raw_data, shard_size=2)
+
+        self.assertEqual([format_engagement_rows(transform_office_hours_data(raw_data))], transformed.rows)
+
+    def test_writes_the_same_engagement_data_file_as_the_unsharded_records(self):
+        raw_data = make_office_hours_data(250)
+        with tempfile.TemporaryDirectory() as dir_path:
+            write_engagement_data(os.path.join(dir_path, 'unsharded.csv'), transform_office_hours_data(raw_data))
+            transformed = transform_in_shards(transform_office_hours_data, raw_data, shard_size=60, max_workers=2)
+            with EngagementDataWriter(os.path.join(dir_path, 'sharded.csv')) as writer:
+                for rows in transformed.rows:
+                    writer.write_rows(transformed.fields, rows)
+            with open(os.path.join(dir_path, 'unsharded.csv')) as unsharded_file, \
+                    open(os.path.join(dir_path, 'sharded.csv')) as sharded_file:
+                self.assertEqual(unsharded_file.read(), sharded_file.read())
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lde_etl.data_model import Departments
+from lde_etl.data_model import EngagementRecord
+from lde_etl.data_model import EngagementTypes
+from lde_etl.data_model import Mediums
+from lde_etl.file_writers import EngagementDataWriter
+from lde_etl.file_writers import column_widths
+from lde_etl.file_writers import write_engagement_data
+from lde_etl.file_writers import write_roster_excel_files
+
+
+class TestColumnWidths(unittest.TestCase):
+
+    def test_uses_the_length_of_the_longest_value_or_header_in_each_column(self):
+        df = pd.DataFrame({'id': ['a', 'abcde'], 'is_athlete': [True, None], 'count': [1, 100000]})
+        self.assertEqual([5, 10, 6], column_widths(df))
+
+    def test_uses_the_header_length_for_empty_dataframes(self):
+        self.assertEqual([4], column_widths(pd.DataFrame({'name': []})))
+
+
+class TestWriteRosterExcelFiles(unittest.TestCase):
+
+    def test_writes_one_file_per_department_roster(self):
+        rosters = [
+            pd.DataFrame({'hopkins_id': ['8fj4t2', 'sfs834'], 'department': ['humanities', 'humanities'],
+                          'is_athlete': [True, False], 'total_engagements': [3, 0]}),
+            pd.DataFrame({'hopkins_id': ['8fj4t2'], 'department': ['phys_sci'],
+                          'is_athlete': [True], 'total_engagements': [3]})
+        ]
+        with tempfile.TemporaryDirectory() as dir_path:
+            write_roster_excel_files(dir_path + os.sep, rosters, max_workers=2)
+            assert_frame_equal(rosters[0], pd.read_excel(os.path.join(dir_path, 'humanities_roster.xlsx')))
+            assert_frame_equal(rosters[1], pd.read_excel(os.path.join(dir_path, 'phys_sci_roster.xlsx')))
+
+
+def make_engagement_record(engagement_id: str) -> EngagementRecord:
+    return EngagementRecord(engagement_type=EngagementTypes.EVENT, handshake_engagement_id=engagement_id,
+                            start_date_time=datetime(2020, 10, 1), medium=Mediums.IN_PERSON, engagement_name='',
+                            engagement_department=Departments.BME.value, student_handshake_id='8029382',
+                            student_school_year_at_time_of_engagement='Junior', student_pre_registered=False,
+                            associated_staff_email='')
+
+
+class TestEngagementDataWriter(unittest.TestCase):
+
+    def test_writing_in_batches_matches_writing_all_records_at_once(self):
+        records = [make_engagement_record(str(i)) for i in range(3)]
+        with tempfile.TemporaryDirectory() as dir_path:
+            write_engagement_data(os.path.join(dir_path, 'all.csv'), records)
+            with EngagementDataWriter(os.path.join(dir_path, 'batched.csv')) as writer:
+                writer.write(records[:1])
+                writer.write([])
+                writer.write(records[1:])
+            with open(os.path.join(dir_path, 'all.csv')) as all_file, \
+                    open(os.path.join(dir_path, 'batched.csv')) as batched_file:
+                self.assertEqual(all_file.read(), batched_file.read())
+
+    def test_keeps_the_previous_file_when_writing_fails(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath = os.path.join(dir_path, 'engagements.csv')
+            write_engagement_data(filepath, [make_engagement_record('1')])
+            with open(filepath) as file:
+                previous_contents = file.read()
+            with self.assertRaises(ValueError):
+                with EngagementDataWriter(filepath) as writer:
+                    writer.write([make_engagement_record('2')])
+                    raise ValueError('transform failed')
+            with open(filepath) as file:
+                self.assertEqual(previous_contents, file.read())
+            self.assertEqual(['engagements.csv'], os.listdir(dir_path))
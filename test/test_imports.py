@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+import unittest
+
+REPOSITORY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the dependencies that only the machines that pull data from Handshake or SIS need
+ENVIRONMENT_SPECIFIC_MODULES = ['autohandshake', 'selenium', 'pyodbc']
+
+
+def modules_loaded_by_importing(module: str):
+    """Import a module in a fresh interpreter and find which environment-specific modules it loaded"""
+    script = (f'import sys, {module}\n'
+              f'print(",".join(name for name in {ENVIRONMENT_SPECIFIC_MODULES!r} if name in sys.modules))')
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=REPOSITORY_DIR).stdout
+    return [name for name in output.strip().split(',') if name]
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_importing_the_etls_does_not_load_handshake_or_sis_dependencies(self):
+        for module in ['lde_etl.engagement_data_etl.run_etl', 'lde_etl.student_data_etl.run_etl', 'lde_etl.cli']:
+            with self.subTest(module=module):
+                self.assertEqual([], modules_loaded_by_importing(module))
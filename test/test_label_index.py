@@ -0,0 +1,37 @@
+import unittest
+
+import pandas as pd
+from pandas.testing import assert_series_equal
+
+from lde_etl.label_index import LabelIndex
+
+
+class TestLabelIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.label_lists = pd.Series(['system gen: hwd, hwd: pre-health', 'system gen: bsph', None,
+                                      'system gen: hwd', ''], index=[4, 5, 6, 7, 8])
+        self.index = LabelIndex(self.label_lists)
+
+    def test_builds_a_vocabulary_of_every_label(self):
+        self.assertEqual(['system gen: hwd', 'hwd: pre-health', 'system gen: bsph'], list(self.index.vocabulary))
+
+    def test_finds_rows_with_a_label(self):
+        expected = pd.Series([True, False, False, True, False], index=[4, 5, 6, 7, 8])
+        assert_series_equal(expected, self.index.has_label('system gen: hwd'))
+
+    def test_does_not_match_labels_that_only_contain_the_given_label(self):
+        expected = pd.Series([False, False, False, False, False], index=[4, 5, 6, 7, 8])
+        assert_series_equal(expected, self.index.has_label('hwd'))
+
+    def test_finds_rows_with_any_of_several_labels(self):
+        expected = pd.Series([True, True, False, False, False], index=[4, 5, 6, 7, 8])
+        assert_series_equal(expected, self.index.has_any_label(['hwd: pre-health', 'system gen: bsph']))
+
+    def test_finds_rows_with_a_label_containing_some_text(self):
+        expected = pd.Series([True, True, False, True, False], index=[4, 5, 6, 7, 8])
+        assert_series_equal(expected, self.index.has_label_containing('system gen:'))
+
+    def test_finds_no_rows_for_a_label_that_does_not_appear(self):
+        expected = pd.Series([False, False, False, False, False], index=[4, 5, 6, 7, 8])
+        assert_series_equal(expected, self.index.has_label('soar: athlete'))
@@ -0,0 +1,161 @@
+import json
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import datetime
+from unittest import mock
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lde_etl.data_model import Departments
+from lde_etl.data_model import EngagementRecord
+from lde_etl.data_model import EngagementTypes
+from lde_etl.data_model import Mediums
+
+from lde_etl.checkpoints import get_raw_data_cache
+from lde_etl.service import EtlService
+from lde_etl.service import RefreshJob
+from lde_etl.service import RefreshScheduler
+from lde_etl.service import ServiceData
+from lde_etl.service import make_query_server
+
+
+def make_engagement_record(engagement_type: EngagementTypes, engagement_id: str, student_handshake_id: str,
+                           start_date_time: datetime = datetime(2020, 10, 1)) -> EngagementRecord:
+    return EngagementRecord(engagement_type=engagement_type, handshake_engagement_id=engagement_id,
+                            start_date_time=start_date_time, medium=Mediums.IN_PERSON, engagement_name='',
+                            engagement_department=Departments.BME.value, student_handshake_id=student_handshake_id,
+                            student_school_year_at_time_of_engagement='Junior', student_pre_registered=False,
+                            associated_staff_email='')
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRefreshScheduler(unittest.TestCase):
+
+    def test_runs_each_job_on_its_own_interval(self):
+        clock = FakeClock()
+        runs = []
+        scheduler = RefreshScheduler([RefreshJob('events', 60, lambda: runs.append('events')),
+                                      RefreshJob('students', 600, lambda: runs.append('students'))], clock=clock)
+
+        self.assertEqual(60, scheduler.run_due_jobs())
+        clock.now += 60
+        scheduler.run_due_jobs()
+
+        self.assertEqual(['events', 'students', 'events'], runs)
+
+    def test_keeps_running_other_jobs_after_a_job_fails(self):
+        def fail():
+            raise RuntimeError('session expired')
+
+        failures = []
+        runs = []
+        scheduler = RefreshScheduler([RefreshJob('events', 60, fail),
+                                      RefreshJob('students', 60, lambda: runs.append('students'))],
+                                     on_failure=lambda job, error: failures.append(job.name), clock=FakeClock())
+        scheduler.run_due_jobs()
+
+        self.assertEqual(['events'], failures)
+        self.assertEqual(['students'], runs)
+        self.assertIn('session expired', scheduler.status()['events']['last_error'])
+        self.assertIsNone(scheduler.status()['students']['last_error'])
+
+
+class TestQueryServer(unittest.TestCase):
+
+    def setUp(self):
+        self.data = ServiceData(['office_hours', 'events'])
+        self.server = make_query_server(self.data, lambda: {'events': {'last_error': None}}, port=0)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, path: str):
+        with urllib.request.urlopen(f'http://127.0.0.1:{self.server.server_port}{path}') as response:
+            return json.loads(response.read())
+
+    def test_serves_the_latest_engagement_data_of_every_source_in_source_order(self):
+        self.data.update_engagement_source('events', [make_engagement_record(EngagementTypes.EVENT, '1', '100')])
+        self.data.update_engagement_source('office_hours',
+                                           [make_engagement_record(EngagementTypes.OFFICE_HOURS, '2', '100')])
+        self.data.update_engagement_source('events', [make_engagement_record(EngagementTypes.EVENT, '3', '200')])
+
+        engagements = self.get('/engagements')
+        self.assertEqual(['office_hours_2_100', 'event_3_200'],
+                         [engagement['unique_engagement_id'] for engagement in engagements])
+        self.assertEqual('2020-10-01T00:00:00', engagements[0]['start_date_time'])
+        self.assertEqual(['event_3_200'], [engagement['unique_engagement_id']
+                                           for engagement in self.get('/engagements/events')])
+        self.assertEqual([{'student_handshake_id': '100', 'event_engagements': 0, 'office_hours_engagements': 1,
+                           'total_engagements': 1},
+                          {'student_handshake_id': '200', 'event_engagements': 1, 'office_hours_engagements': 0,
+                           'total_engagements': 1}],
+                         self.get('/engagement_counts/2021'))
+
+    def test_only_keeps_the_counts_of_years_that_still_have_engagements(self):
+        self.data.update_engagement_source('events', [
+            make_engagement_record(EngagementTypes.EVENT, '1', '100'),
+            make_engagement_record(EngagementTypes.EVENT, '2', '100', start_date_time=datetime(2021, 10, 1)),
+        ])
+        self.data.update_engagement_source('office_hours', [])
+        self.data.update_engagement_source('events', [make_engagement_record(EngagementTypes.EVENT, '3', '200')])
+
+        self.assertEqual(['event_3_200'], [engagement['unique_engagement_id']
+                                           for engagement in self.get('/engagements')])
+        self.assertEqual([{'student_handshake_id': '200', 'event_engagements': 1, 'total_engagements': 1}],
+                         self.get('/engagement_counts/2021'))
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get('/engagement_counts/2022')
+        self.assertEqual(404, context.exception.code)
+
+    def test_serves_department_rosters_and_the_status_of_each_job(self):
+        self.data.update_rosters([pd.DataFrame({'hopkins_id': ['8fj4t2'], 'department': ['humanities']}),
+                                  pd.DataFrame({'hopkins_id': ['sfs834'], 'department': ['bme']})])
+
+        self.assertEqual(['bme', 'humanities'], self.get('/rosters'))
+        self.assertEqual([{'hopkins_id': 'sfs834', 'department': 'bme'}], self.get('/rosters/bme'))
+        self.assertEqual({'events': {'last_error': None}}, self.get('/status'))
+
+    def test_answers_paths_without_data_with_not_found(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.get('/rosters/bme')
+        self.assertEqual(404, context.exception.code)
+
+
+class TestEtlService(unittest.TestCase):
+
+    def setUp(self):
+        self.run_dir = tempfile.TemporaryDirectory()
+        self.config = defaultdict(str, run_dir=self.run_dir.name)
+
+    def tearDown(self):
+        self.run_dir.cleanup()
+
+    def test_refreshes_each_student_source_in_a_job_of_its_own_before_the_student_job(self):
+        jobs = EtlService(self.config).scheduler.jobs
+        self.assertEqual(['office_hours', 'events', 'career_fairs', 'interviews', 'sis_students', 'wgs_students',
+                          'wse_masters_students', 'handshake_data', 'students'], [job.name for job in jobs])
+
+    def test_student_source_jobs_only_refresh_their_own_raw_data(self):
+        wgs_students = pd.DataFrame({'hopkins_id': ['8fj4t2'], 'wgs_affiliation_type': ['minor']})
+        with mock.patch('lde_etl.student_data_etl.extract.get_wgs_sis_data', return_value=wgs_students):
+            jobs = {job.name: job for job in EtlService(self.config).scheduler.jobs}
+        jobs['wgs_students'].refresh()
+
+        raw_data_cache = get_raw_data_cache(self.run_dir.name, 'student')
+        assert_frame_equal(wgs_students, raw_data_cache.load('wgs_students'))
+        self.assertFalse(raw_data_cache.is_complete('sis_students'))
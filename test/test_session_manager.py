@@ -0,0 +1,120 @@
+import os
+import stat
+import tempfile
+import unittest
+
+from lde_etl.session_manager import HandshakeSessionManager
+from lde_etl.session_manager import load_session_cookies
+from lde_etl.session_manager import save_session_cookies
+
+LOGIN_URL = 'https://jhu.joinhandshake.com'
+COOKIE = {'name': 'hss', 'value': 'abc', 'domain': 'jhu.joinhandshake.com', 'path': '/', 'secure': True,
+          'sameSite': 'Lax'}
+
+
+class FakeDriver:
+
+    def __init__(self):
+        self.cookies = []
+
+    def add_cookie(self, cookie):
+        self.cookies.append(cookie)
+
+    def get_cookies(self):
+        return self.cookies
+
+    def delete_all_cookies(self):
+        self.cookies = []
+
+
+class FakeBrowser:
+
+    def __init__(self, valid_cookie_values):
+        self._browser = FakeDriver()
+        self.valid_cookie_values = valid_cookie_values
+        self.quit_called = False
+
+    def get(self, url):
+        pass
+
+    def element_exists_by_xpath(self, xpath):
+        return any(cookie['value'] in self.valid_cookie_values for cookie in self._browser.cookies)
+
+    def update_constants(self):
+        pass
+
+    def quit(self):
+        self.quit_called = True
+
+
+class FakeSessionManager(HandshakeSessionManager):
+    """A session manager whose browser is a fake that logs in by being given a valid session cookie"""
+
+    def __init__(self, cookies_filepath, valid_cookie_values):
+        super().__init__({'handshake_url': LOGIN_URL, 'handshake_email': 'staff@jhu.edu', 'handshake_pw': 'pw',
+                          'download_dir': '', 'chromedriver_path': '', 'handshake_session_filepath': cookies_filepath})
+        self.valid_cookie_values = valid_cookie_values
+        self.browsers_started = 0
+        self.logins = 0
+
+    def _start_browser(self):
+        self.browsers_started += 1
+        return FakeBrowser(self.valid_cookie_values)
+
+    def _log_in(self, browser):
+        self.logins += 1
+        browser._browser.add_cookie(dict(COOKIE, value='fresh'))
+
+
+class TestSessionCookies(unittest.TestCase):
+
+    def test_loads_the_cookies_saved_for_the_same_account(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath = os.path.join(dir_path, 'session.json')
+            save_session_cookies(filepath, LOGIN_URL, 'staff@jhu.edu', [COOKIE])
+
+            self.assertEqual([{key: value for key, value in COOKIE.items() if key != 'sameSite'}],
+                             load_session_cookies(filepath, LOGIN_URL, 'staff@jhu.edu'))
+            self.assertIsNone(load_session_cookies(filepath, LOGIN_URL, 'other@jhu.edu'))
+            self.assertIsNone(load_session_cookies(os.path.join(dir_path, 'missing.json'), LOGIN_URL,
+                                                   'staff@jhu.edu'))
+
+    @unittest.skipIf(os.name == 'nt', 'file permissions are not POSIX on Windows')
+    def test_saved_cookies_are_only_readable_by_the_current_user(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath = os.path.join(dir_path, 'session.json')
+            save_session_cookies(filepath, LOGIN_URL, 'staff@jhu.edu', [COOKIE])
+            self.assertEqual(0o600, stat.S_IMODE(os.stat(filepath).st_mode))
+
+
+class TestHandshakeSessionManager(unittest.TestCase):
+
+    def test_starts_one_browser_for_every_caller_and_only_when_first_asked(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            with FakeSessionManager(os.path.join(dir_path, 'session.json'), ['fresh']) as sessions:
+                self.assertEqual(0, sessions.browsers_started)
+                browser = sessions.get_browser()
+                self.assertIs(browser, sessions.get_browser())
+            self.assertEqual(1, sessions.browsers_started)
+            self.assertTrue(browser.quit_called)
+
+    def test_restores_the_saved_session_instead_of_logging_in_again(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath = os.path.join(dir_path, 'session.json')
+            with FakeSessionManager(filepath, ['fresh']) as first_run:
+                first_run.get_browser()
+            with FakeSessionManager(filepath, ['fresh']) as second_run:
+                second_run.get_browser()
+        self.assertEqual(1, first_run.logins)
+        self.assertEqual(0, second_run.logins)
+
+    def test_logs_in_again_when_the_saved_session_has_expired(self):
+        with tempfile.TemporaryDirectory() as dir_path:
+            filepath = os.path.join(dir_path, 'session.json')
+            save_session_cookies(filepath, LOGIN_URL, 'staff@jhu.edu', [dict(COOKIE, value='expired')])
+            with FakeSessionManager(filepath, ['fresh']) as sessions:
+                browser = sessions.get_browser()
+                self.assertEqual(['fresh'], [cookie['value'] for cookie in browser._browser.get_cookies()])
+            self.assertEqual(1, sessions.logins)
+            self.assertEqual(['fresh'], [cookie['value'] for cookie in
+                                         load_session_cookies(filepath, LOGIN_URL, 'staff@jhu.edu')])
@@ -0,0 +1,174 @@
+import tempfile
+import threading
+import time
+import unittest
+
+from lde_etl.checkpoints import RunCheckpoints
+from lde_etl.stage_graph import Stage
+from lde_etl.stage_graph import cache_source_stages
+from lde_etl.stage_graph import run_stage_graph
+from lde_etl.stage_graph import select_stages
+
+
+def add(a: int, b: int) -> int:
+    return a + b
+
+
+def wait_and_return(seconds: float, value):
+    time.sleep(seconds)
+    return value
+
+
+def fail():
+    raise RuntimeError('extraction failed')
+
+
+class TestRunStageGraph(unittest.TestCase):
+
+    def test_passes_the_outputs_of_dependencies_to_each_stage_in_order(self):
+        run = run_stage_graph([
+            Stage('sum', add, ['one', 'two'], kind='cpu'),
+            Stage('one', lambda: 1),
+            Stage('two', lambda: 2),
+            Stage('double', lambda total: total * 2, ['sum']),
+        ])
+        self.assertEqual({'one': 1, 'two': 2, 'sum': 3, 'double': 6}, run.outputs)
+
+    def test_runs_independent_io_stages_concurrently(self):
+        run = run_stage_graph([Stage(f'extract_{i}', lambda: wait_and_return(0.2, None)) for i in range(4)])
+        timings = run.timings.values()
+        self.assertLess(max(timing.finished for timing in timings) - min(timing.started for timing in timings), 0.6)
+
+    def test_finds_the_longest_chain_of_dependent_stages(self):
+        run = run_stage_graph([
+            Stage('quick_extract', lambda: wait_and_return(0, 1)),
+            Stage('slow_extract', lambda: wait_and_return(0.2, 2)),
+            Stage('transform', add, ['quick_extract', 'slow_extract'], kind='cpu'),
+        ])
+        self.assertEqual(['slow_extract', 'transform'], run.critical_path())
+        self.assertIn('Critical path', run.report())
+
+    def test_reraises_the_error_of_a_failed_stage_without_starting_its_dependents(self):
+        started = []
+        with self.assertRaises(RuntimeError):
+            run_stage_graph([Stage('extract', fail), Stage('transform', lambda data: started.append(data), ['extract'])])
+        self.assertEqual([], started)
+
+    def test_rejects_graphs_with_unknown_or_circular_dependencies(self):
+        with self.assertRaises(ValueError):
+            run_stage_graph([Stage('transform', lambda data: data, ['extract'])])
+        with self.assertRaises(ValueError):
+            run_stage_graph([Stage('a', lambda b: b, ['b']), Stage('b', lambda a: a, ['a'])])
+
+
+class TestResumeStageGraph(unittest.TestCase):
+
+    def test_skips_stages_that_finished_before_a_failure_and_reloads_their_outputs(self):
+        calls = []
+
+        def extract(value):
+            calls.append(value)
+            return value
+
+        def flaky_write(total):
+            if not calls_after_failure:
+                raise RuntimeError('excel write failed')
+            calls_after_failure.append(total)
+
+        calls_after_failure = []
+        stages = [
+            Stage('one', lambda: extract(1)),
+            Stage('two', lambda: extract(2)),
+            Stage('sum', add, ['one', 'two']),
+            Stage('write', flaky_write, ['sum']),
+        ]
+        with tempfile.TemporaryDirectory() as run_dir:
+            with self.assertRaises(RuntimeError):
+                run_stage_graph(stages, checkpoints=RunCheckpoints(run_dir))
+            calls_after_failure.append('resumed')
+            run = run_stage_graph(stages, checkpoints=RunCheckpoints(run_dir))
+
+        self.assertEqual([1, 2], sorted(calls))
+        self.assertEqual(['resumed', 3], calls_after_failure)
+        self.assertEqual(['write'], list(run.timings))
+        self.assertEqual(['write'], run.critical_path())
+
+    def test_starts_the_stages_that_take_an_output_without_waiting_for_its_checkpoint(self):
+        dependent_started = threading.Event()
+        saved_after_dependent_started = []
+
+        class SlowCheckpoints(RunCheckpoints):
+
+            def save(self, stage_name, output):
+                saved_after_dependent_started.append(dependent_started.wait(timeout=5))
+                super().save(stage_name, output)
+
+        stages = [
+            Stage('one', lambda: 1),
+            Stage('two', lambda one: dependent_started.set(), ['one']),
+        ]
+        with tempfile.TemporaryDirectory() as run_dir:
+            run_stage_graph(stages, checkpoints=SlowCheckpoints(run_dir))
+
+            self.assertTrue(RunCheckpoints(run_dir).is_complete('two'))
+        self.assertEqual([True, True], saved_after_dependent_started)
+
+
+class TestSelectStages(unittest.TestCase):
+
+    def test_selects_stages_along_with_everything_they_depend_on(self):
+        stages = [
+            Stage('one', lambda: 1),
+            Stage('two', lambda: 2),
+            Stage('three', lambda: 3),
+            Stage('sum', add, ['one', 'two']),
+            Stage('double', lambda total: total * 2, ['sum']),
+            Stage('triple', lambda value: value * 3, ['three']),
+        ]
+        self.assertEqual(['one', 'two', 'sum', 'double'],
+                         [stage.name for stage in select_stages(stages, ['double'])])
+        with self.assertRaises(ValueError):
+            select_stages(stages, ['quadruple'])
+
+
+class TestCacheSourceStages(unittest.TestCase):
+
+    def test_reruns_transforms_from_the_cached_outputs_of_source_stages(self):
+        pulls = []
+
+        def pull(value):
+            pulls.append(value)
+            return value
+
+        stages = [
+            Stage('one', lambda: pull(1), pulls_raw_data=True),
+            Stage('two', lambda: pull(2), pulls_raw_data=True),
+            Stage('sum', add, ['one', 'two']),
+        ]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            pulled_run = run_stage_graph(cache_source_stages(stages, RunCheckpoints(cache_dir)))
+            transformed_run = run_stage_graph(cache_source_stages(stages, RunCheckpoints(cache_dir),
+                                                                  load_from_cache=True))
+
+        self.assertEqual(pulled_run.outputs, transformed_run.outputs)
+        self.assertEqual([1, 2], sorted(pulls))
+
+    def test_always_reruns_stages_that_do_not_pull_raw_data(self):
+        local_file_contents = [10]
+        stages = [
+            Stage('pulled', lambda: 1, pulls_raw_data=True),
+            Stage('local_file', lambda: local_file_contents[0]),
+            Stage('sum', add, ['pulled', 'local_file']),
+        ]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            run_stage_graph(cache_source_stages(stages, RunCheckpoints(cache_dir)))
+            local_file_contents[0] = 20
+            transformed_run = run_stage_graph(cache_source_stages(stages, RunCheckpoints(cache_dir),
+                                                                  load_from_cache=True))
+
+            self.assertFalse(RunCheckpoints(cache_dir).is_complete('local_file'))
+        self.assertEqual(21, transformed_run.outputs['sum'])
+
+    def test_stages_that_pull_raw_data_cannot_have_dependencies(self):
+        with self.assertRaises(ValueError):
+            Stage('pulled', add, ['one', 'two'], pulls_raw_data=True)
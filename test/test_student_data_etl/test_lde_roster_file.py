@@ -3,8 +3,8 @@ import unittest
 import pandas as pd
 from pandas.testing import assert_frame_equal
 
+from lde_etl.student_data_etl.lde_roster_file import join_unique_values_by_student
 from lde_etl.student_data_etl.lde_roster_file import split_into_separate_department_rosters
-from lde_etl.student_data_etl.lde_roster_file import unmelt_and_join
 from lde_etl.student_data_etl.lde_roster_file import unmelt_students_for_roster_file
 
 
@@ -51,77 +51,59 @@ class TestUnmeltStudentsForRosterFile(unittest.TestCase):
         assert_frame_equal(expected, unmelt_students_for_roster_file(students))
 
 
-class TestUnmeltAndJoin(unittest.TestCase):
+class TestJoinUniqueValuesByStudent(unittest.TestCase):
 
-    def test_only_changes_the_column_name_if_a_student_only_has_a_single_row_to_begin_with(self):
-        students = pd.DataFrame({'hopkins_id': ['8fj4t2'], 'other_field': [1], 'melted_field': ['value1']})
+    def test_joins_sorted_unique_values_of_every_column_aligned_with_the_input_rows(self):
+        students = pd.DataFrame({
+            'hopkins_id': ['8fj4t2', 'pap9f3', '8fj4t2', '8fj4t2'],
+            'major': ['physics', None, 'english', 'physics'],
+            'college': ['wse', '', 'ksas', 'wse']
+        }, index=[4, 5, 6, 7])
         expected = pd.DataFrame({
-            'hopkins_id': ['8fj4t2'],
-            'other_field': [1],
-            'melted_field': ['value1'],
-            'unmelted_field': ['value1']
-        })
-        assert_frame_equal(expected, unmelt_and_join(students, 'melted_field', 'unmelted_field'))
+            'majors': ['english;physics', '', 'english;physics', 'english;physics'],
+            'colleges': ['ksas;wse', '', 'ksas;wse', 'ksas;wse']
+        }, index=[4, 5, 6, 7])
+        assert_frame_equal(expected, join_unique_values_by_student(students, {'major': 'majors', 'college': 'colleges'}))
+
+    def test_leaves_the_values_of_rows_without_a_hopkins_id_empty(self):
+        students = pd.DataFrame({'hopkins_id': ['a', 'b', None], 'major': ['x', 'y', 'z']})
+        expected = pd.DataFrame({'majors': ['x', 'y', '']})
+        assert_frame_equal(expected, join_unique_values_by_student(students, {'major': 'majors'}))
 
-    def test_concatenates_all_values_in_the_column_to_unmelt_and_merges_the_resulting_string_back_onto_the_student_df(self):
+    def test_only_renames_the_column_if_a_student_only_has_a_single_row_to_begin_with(self):
+        students = pd.DataFrame({'hopkins_id': ['8fj4t2'], 'other_field': [1], 'melted_field': ['value1']})
+        expected = pd.DataFrame({'unmelted_field': ['value1']})
+        assert_frame_equal(expected, join_unique_values_by_student(students, {'melted_field': 'unmelted_field'}))
+
+    def test_concatenates_all_values_in_the_column_to_unmelt_for_every_row_of_the_student(self):
         students = pd.DataFrame({'hopkins_id': ['8fj4t2', '8fj4t2'], 'other_field': [1, 0], 'melted_field': ['value1', 'value2']})
-        expected = pd.DataFrame({
-            'hopkins_id': ['8fj4t2', '8fj4t2'],
-            'other_field': [1, 0],
-            'melted_field': ['value1', 'value2'],
-            'unmelted_field': ['value1;value2', 'value1;value2']
-        })
-        assert_frame_equal(expected, unmelt_and_join(students, 'melted_field', 'unmelted_field'))
+        expected = pd.DataFrame({'unmelted_field': ['value1;value2', 'value1;value2']})
+        assert_frame_equal(expected, join_unique_values_by_student(students, {'melted_field': 'unmelted_field'}))
 
     def test_only_concatenates_unique_values_in_the_column_to_unmelt(self):
         students = pd.DataFrame({'hopkins_id': ['8fj4t2', '8fj4t2'], 'other_field': [1, 0], 'melted_field': ['value1', 'value1']})
-        expected = pd.DataFrame({
-            'hopkins_id': ['8fj4t2', '8fj4t2'],
-            'other_field': [1, 0],
-            'melted_field': ['value1', 'value1'],
-            'unmelted_field': ['value1', 'value1']
-        })
-        assert_frame_equal(expected, unmelt_and_join(students, 'melted_field', 'unmelted_field'))
+        expected = pd.DataFrame({'unmelted_field': ['value1', 'value1']})
+        assert_frame_equal(expected, join_unique_values_by_student(students, {'melted_field': 'unmelted_field'}))
 
     def test_unmelts_using_hopkins_id_as_the_id(self):
         students = pd.DataFrame({'hopkins_id': ['8fj4t2', 'pap9f3', '8fj4t2'], 'other_field': [1, 0, 0], 'melted_field': ['value1', 'value3', 'value2']})
-        expected = pd.DataFrame({
-            'hopkins_id': ['8fj4t2', 'pap9f3', '8fj4t2'],
-            'other_field': [1, 0, 0],
-            'melted_field': ['value1', 'value3', 'value2'],
-            'unmelted_field': ['value1;value2', 'value3', 'value1;value2']
-        })
-        assert_frame_equal(expected, unmelt_and_join(students, 'melted_field', 'unmelted_field'))
+        expected = pd.DataFrame({'unmelted_field': ['value1;value2', 'value3', 'value1;value2']})
+        assert_frame_equal(expected, join_unique_values_by_student(students, {'melted_field': 'unmelted_field'}))
 
     def test_converts_entirely_null_column_to_the_empty_string(self):
         students = pd.DataFrame({'hopkins_id': ['8fj4t2'], 'other_field': [1], 'melted_field': [None]})
-        expected = pd.DataFrame({
-            'hopkins_id': ['8fj4t2'],
-            'other_field': [1],
-            'melted_field': [None],
-            'unmelted_field': ['']
-        })
-        assert_frame_equal(expected, unmelt_and_join(students, 'melted_field', 'unmelted_field'))
+        expected = pd.DataFrame({'unmelted_field': ['']})
+        assert_frame_equal(expected, join_unique_values_by_student(students, {'melted_field': 'unmelted_field'}))
 
     def test_ignores_nulls_intermixed_among_real_values(self):
         students = pd.DataFrame({'hopkins_id': ['8fj4t2', 'pap9f3', '8fj4t2'], 'other_field': [1, 0, 0], 'melted_field': [None, None, 'value2']})
-        expected = pd.DataFrame({
-            'hopkins_id': ['8fj4t2', 'pap9f3', '8fj4t2'],
-            'other_field': [1, 0, 0],
-            'melted_field': [None, None, 'value2'],
-            'unmelted_field': ['value2', '', 'value2']
-        })
-        assert_frame_equal(expected, unmelt_and_join(students, 'melted_field', 'unmelted_field'))
+        expected = pd.DataFrame({'unmelted_field': ['value2', '', 'value2']})
+        assert_frame_equal(expected, join_unique_values_by_student(students, {'melted_field': 'unmelted_field'}))
 
     def test_ignores_empty_strings_intermixed_among_real_values(self):
         students = pd.DataFrame({'hopkins_id': ['8fj4t2', 'pap9f3', '8fj4t2'], 'other_field': [1, 0, 0], 'melted_field': ['', '', 'value2']})
-        expected = pd.DataFrame({
-            'hopkins_id': ['8fj4t2', 'pap9f3', '8fj4t2'],
-            'other_field': [1, 0, 0],
-            'melted_field': ['', '', 'value2'],
-            'unmelted_field': ['value2', '', 'value2']
-        })
-        assert_frame_equal(expected, unmelt_and_join(students, 'melted_field', 'unmelted_field'))
+        expected = pd.DataFrame({'unmelted_field': ['value2', '', 'value2']})
+        assert_frame_equal(expected, join_unique_values_by_student(students, {'melted_field': 'unmelted_field'}))
 
 
 class TestSplitIntoSeparateDepartmentRosters(unittest.TestCase):
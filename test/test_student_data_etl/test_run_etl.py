@@ -0,0 +1,140 @@
+import tracemalloc
+import unittest
+from collections import defaultdict
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lde_etl.student_data_etl.run_etl import join_student_departments, make_department_rosters
+from lde_etl.student_data_etl.run_etl import make_student_departments, make_student_etl_stages, normalize_students
+from lde_etl.student_data_etl.run_etl import transform_students_in_partitions
+from lde_etl.student_data_etl.student_schema import optimize_student_dtypes
+
+MAJORS = ['B.A.: economics', 'B.S.: math', 'B.S.E.: bme', 'B.A.: history']
+SCHOOL_YEARS = ['Freshman', 'Sophomore', 'Junior', 'Senior', 'Masters']
+
+
+def make_enriched_students(size: int, changed_school_years: bool = False) -> pd.DataFrame:
+    return optimize_student_dtypes(pd.DataFrame({
+        'hopkins_id': [f'h{i}' for i in range(size)],
+        'jhed': [f'j{i}' for i in range(size)],
+        'email_address': [f'j{i}@jhu.edu' for i in range(size)],
+        'handshake_id': [str(100 + i) if i % 4 else None for i in range(size)],
+        'first_name': [f'First{i}' for i in range(size)],
+        'legal_first_name': [f'First{i}' for i in range(size)],
+        'preferred_name': [None] * size,
+        'last_name': [f'Last{i}' for i in range(size)],
+        'majors': [';'.join(MAJORS[i % 4:i % 4 + i % 3]) or None for i in range(size)],
+        'education_start_date': ['2019'] * size,
+        'school_year': [SCHOOL_YEARS[(i + (changed_school_years and i % 3 == 0)) % 5] for i in range(size)],
+        'is_ep': [i % 11 == 0 for i in range(size)],
+        'is_pre_med': [i % 6 == 0 for i in range(size)],
+        'has_activated_handshake': [i % 2 == 0 for i in range(size)],
+        'has_completed_profile': [i % 3 == 0 for i in range(size)],
+        'sport': ['soccer' if i % 7 == 0 else None for i in range(size)],
+        'is_athlete': [i % 7 == 0 for i in range(size)],
+        'is_top_4_officer': [i % 9 == 0 for i in range(size)],
+        'is_in_org': [i % 5 == 0 for i in range(size)],
+        'gender': ['F' if i % 2 else 'M' for i in range(size)],
+        'is_first_generation': [i % 4 == 1 for i in range(size)],
+        'is_pell_eligible': [i % 8 == 3 for i in range(size)],
+        'is_urm': [None if i % 10 == 0 else i % 3 == 2 for i in range(size)],
+        'citizenship': ['US'] * size,
+        'wgs_affiliation_type': ['minor' if i % 13 == 0 else None for i in range(size)],
+    }))
+
+
+MAJOR_METADATA = pd.DataFrame({'major': ['economics', 'math', 'bme'], 'college': ['ksas', 'ksas', 'wse'],
+                               'department': ['social_sci', 'sciences', 'bme']})
+ENGAGEMENT_COUNTS = pd.DataFrame({'student_handshake_id': ['101', '102', '130'], 'events': [1, 2, 3]})
+
+
+def transform_students_at_once(students: pd.DataFrame, previous_departments: pd.DataFrame,
+                               previous_fingerprints: pd.DataFrame):
+    normalized_students = normalize_students(students, MAJOR_METADATA)
+    student_departments = make_student_departments(False, normalized_students, previous_departments,
+                                                   previous_fingerprints)
+    students = join_student_departments(normalized_students, student_departments)
+    return student_departments, students, make_department_rosters(students, ENGAGEMENT_COUNTS)
+
+
+class TestTransformStudentsInPartitions(unittest.TestCase):
+
+    def assert_same_outputs(self, expected, actual):
+        (expected_departments, expected_fingerprints), expected_students, expected_rosters = expected
+        (departments, fingerprints), students, rosters = actual
+        assert_frame_equal(expected_departments, departments)
+        assert_frame_equal(expected_fingerprints, fingerprints)
+        assert_frame_equal(expected_students, students)
+        self.assertEqual(len(expected_rosters), len(rosters))
+        for expected_roster, roster in zip(expected_rosters, rosters):
+            assert_frame_equal(expected_roster, roster)
+
+    def test_matches_transforming_every_student_at_once(self):
+        students = make_enriched_students(60)
+        no_previous_departments = pd.DataFrame({'hopkins_id': [], 'department': []}, dtype=str)
+        no_previous_fingerprints = pd.DataFrame({'hopkins_id': [], 'fingerprint': []}, dtype=str)
+
+        expected = transform_students_at_once(students, no_previous_departments, no_previous_fingerprints)
+        actual = transform_students_in_partitions(False, 0.01, students, MAJOR_METADATA, no_previous_departments,
+                                                  no_previous_fingerprints, ENGAGEMENT_COUNTS, max_workers=2)
+
+        self.assert_same_outputs(expected, actual)
+
+    def test_matches_transforming_every_student_at_once_when_departments_are_carried_over(self):
+        (previous_departments, previous_fingerprints), _, _ = transform_students_at_once(
+            make_enriched_students(60), pd.DataFrame({'hopkins_id': [], 'department': []}, dtype=str),
+            pd.DataFrame({'hopkins_id': [], 'fingerprint': []}, dtype=str))
+        # as if read back from the previous run's files, and with some students' school years changed since
+        previous_departments = previous_departments.astype(str).iloc[::-1].reset_index(drop=True)
+        previous_fingerprints = previous_fingerprints.astype(str)
+        students = make_enriched_students(50, changed_school_years=True).iloc[::2]
+
+        expected = transform_students_at_once(students, previous_departments, previous_fingerprints)
+        actual = transform_students_in_partitions(False, 0.01, students, MAJOR_METADATA, previous_departments,
+                                                  previous_fingerprints, ENGAGEMENT_COUNTS, max_workers=2)
+
+        self.assert_same_outputs(expected, actual)
+
+    def test_merges_the_partitions_within_the_memory_budget(self):
+        memory_budget_mb = 0.5
+        students = make_enriched_students(600)
+        no_previous_departments = pd.DataFrame({'hopkins_id': [], 'department': []}, dtype=str)
+        no_previous_fingerprints = pd.DataFrame({'hopkins_id': [], 'fingerprint': []}, dtype=str)
+
+        tracemalloc.start()
+        try:
+            start_memory, _ = tracemalloc.get_traced_memory()
+            outputs = transform_students_in_partitions(False, memory_budget_mb, students, MAJOR_METADATA,
+                                                       no_previous_departments, no_previous_fingerprints,
+                                                       ENGAGEMENT_COUNTS, max_workers=2)
+            output_memory, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        # beyond the merged outputs it returns, this process only ever holds what fits in the budget
+        self.assertGreater(output_memory - start_memory, memory_budget_mb * 2 ** 20)
+        self.assertLessEqual(peak_memory - output_memory, memory_budget_mb * 2 ** 20)
+        self.assertEqual(3, len(outputs))
+
+
+class TestMakeStudentEtlStages(unittest.TestCase):
+
+    def test_transforms_the_students_in_a_single_process_stage(self):
+        for memory_budget_mb in [None, 100]:
+            with self.subTest(memory_budget_mb=memory_budget_mb):
+                stages = {stage.name: stage for stage in make_student_etl_stages(defaultdict(str),
+                                                                                 memory_budget_mb=memory_budget_mb)}
+                for name in ['student_departments', 'students', 'department_rosters']:
+                    self.assertEqual('io', stages[name].kind)
+                    self.assertEqual(['transformed_students'], stages[name].dependencies)
+                transform_kinds = {name: stage.kind for name, stage in stages.items()
+                                   if name in ['enriched_students', 'transformed_students']}
+                expected = {'transformed_students': 'cpu'} if memory_budget_mb is None else \
+                    {'enriched_students': 'cpu', 'transformed_students': 'io'}
+                self.assertEqual(expected, transform_kinds)
+
+    def test_only_caches_the_stages_that_pull_from_handshake_or_sis(self):
+        stages = make_student_etl_stages(defaultdict(str))
+        self.assertEqual(['sis_students', 'wgs_students', 'wse_masters_students', 'handshake_data'],
+                         [stage.name for stage in stages if stage.pulls_raw_data])
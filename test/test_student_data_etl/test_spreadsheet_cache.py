@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lde_etl.student_data_etl.spreadsheet_cache import get_cache_filepath
+from lde_etl.student_data_etl.spreadsheet_cache import read_spreadsheet
+from lde_etl.student_data_etl.spreadsheet_cache import read_spreadsheets
+from lde_etl.student_data_etl.spreadsheet_cache import write_and_cache_spreadsheet
+
+
+class TestReadSpreadsheet(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.csv_filepath = os.path.join(self.temp_dir.name, 'athletes.csv')
+        pd.DataFrame({'University ID': ['fie673'], 'Sport': ['Soccer']}).to_csv(self.csv_filepath, index=False)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_caches_the_spreadsheet_the_first_time_it_is_read(self):
+        expected = pd.DataFrame({'University ID': ['fie673'], 'Sport': ['Soccer']})
+        assert_frame_equal(expected, read_spreadsheet(self.csv_filepath))
+        self.assertTrue(os.path.exists(get_cache_filepath(self.csv_filepath)))
+
+    def test_reads_the_cached_copy_while_the_file_is_unchanged(self):
+        read_spreadsheet(self.csv_filepath)
+        pd.DataFrame({'cached': [True]}).to_pickle(get_cache_filepath(self.csv_filepath))
+        assert_frame_equal(pd.DataFrame({'cached': [True]}), read_spreadsheet(self.csv_filepath))
+
+    def test_rereads_and_replaces_the_cached_copy_once_the_file_changes(self):
+        read_spreadsheet(self.csv_filepath)
+        old_cache_filepath = get_cache_filepath(self.csv_filepath)
+        pd.DataFrame({'University ID': ['xjf84e'], 'Sport': ['Basketball']}).to_csv(self.csv_filepath, index=False)
+        os.utime(self.csv_filepath, ns=(0, 0))
+        expected = pd.DataFrame({'University ID': ['xjf84e'], 'Sport': ['Basketball']})
+        assert_frame_equal(expected, read_spreadsheet(self.csv_filepath))
+        self.assertFalse(os.path.exists(old_cache_filepath))
+
+    def test_reads_several_spreadsheets_in_order(self):
+        excel_filepath = os.path.join(self.temp_dir.name, 'spring_2020.xlsx')
+        pd.DataFrame({'hopkins_id': ['8fj4t2']}).to_excel(excel_filepath, index=False)
+        excel_filepath2 = os.path.join(self.temp_dir.name, 'fall_2020.xlsx')
+        pd.DataFrame({'hopkins_id': ['sfs834']}).to_excel(excel_filepath2, index=False)
+        read_spreadsheet(self.csv_filepath)
+        result = read_spreadsheets([excel_filepath, self.csv_filepath, excel_filepath2], max_workers=2)
+        assert_frame_equal(pd.DataFrame({'hopkins_id': ['8fj4t2']}), result[0])
+        assert_frame_equal(pd.DataFrame({'University ID': ['fie673'], 'Sport': ['Soccer']}), result[1])
+        assert_frame_equal(pd.DataFrame({'hopkins_id': ['sfs834']}), result[2])
+
+    def test_caches_what_reading_back_a_written_spreadsheet_returns_without_reading_it(self):
+        excel_filepath = os.path.join(self.temp_dir.name, 'fall_2020.xlsx')
+        data = pd.DataFrame({'hopkins_id': ['8fj4t2', 'sfs834'], 'is_urm': pd.array([True, None], dtype='boolean'),
+                             'school_year': pd.Categorical(['Junior', 'Senior']), 'handshake_id': ['0103', None],
+                             'events': [2.0, 0.0], 'education_start_date': pd.to_datetime(['2019-08-30', None])})
+        with mock.patch.object(pd, 'read_excel', side_effect=AssertionError('the written file was read back')):
+            written = write_and_cache_spreadsheet(excel_filepath, data)
+        expected = pd.read_excel(excel_filepath)
+        assert_frame_equal(expected, written)
+        assert_frame_equal(expected, pd.read_pickle(get_cache_filepath(excel_filepath)))
@@ -0,0 +1,32 @@
+import unittest
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from lde_etl.student_data_etl.student_schema import optimize_student_dtypes
+
+
+class TestOptimizeStudentDtypes(unittest.TestCase):
+
+    def test_converts_schema_fields_to_their_compact_dtypes(self):
+        students = pd.DataFrame({
+            'hopkins_id': ['93aml3', 'ndfe83'],
+            'cmn_persons_id': [4538, 9012],
+            'school_year': ['Senior', 'Senior'],
+            'is_urm': [True, None],
+        })
+        expected = pd.DataFrame({
+            'hopkins_id': ['93aml3', 'ndfe83'],
+            'cmn_persons_id': pd.array([4538, 9012], dtype='Int64'),
+            'school_year': pd.Categorical(['Senior', 'Senior']),
+            'is_urm': pd.array([True, None], dtype='boolean'),
+        })
+        assert_frame_equal(expected, optimize_student_dtypes(students))
+
+    def test_leaves_fields_whose_values_do_not_fit_the_schema_dtype_unchanged(self):
+        students = pd.DataFrame({'is_veteran': ['Y', 'N']})
+        assert_frame_equal(pd.DataFrame({'is_veteran': ['Y', 'N']}), optimize_student_dtypes(students))
+
+    def test_ignores_fields_that_are_not_in_the_schema(self):
+        students = pd.DataFrame({'majors': ['economics;math']})
+        assert_frame_equal(pd.DataFrame({'majors': ['economics;math']}), optimize_student_dtypes(students))
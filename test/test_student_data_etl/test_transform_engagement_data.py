@@ -1,9 +1,13 @@
 import unittest
 
+import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal
 
+from lde_etl.student_data_etl.transform_engagement_data import accumulate_engagement_counts
+from lde_etl.student_data_etl.transform_engagement_data import count_engagements
 from lde_etl.student_data_etl.transform_engagement_data import count_engagements_by_type
+from lde_etl.student_data_etl.transform_engagement_data import pivot_engagement_counts
 
 
 class TestCountEngagementsByType(unittest.TestCase):
@@ -24,4 +28,20 @@ class TestCountEngagementsByType(unittest.TestCase):
             'total_engagements': [1, 4]
         })
 
-        assert_frame_equal(expected, count_engagements_by_type(engagements))
\ No newline at end of file
+        assert_frame_equal(expected, count_engagements_by_type(engagements))
+
+
+class TestAccumulateEngagementCounts(unittest.TestCase):
+
+    def test_counts_accumulated_over_batches_match_counts_of_all_engagements(self):
+        engagements = pd.DataFrame({
+            'student_handshake_id': ['8029382', '8029382', '4738743', '8029382', '8029382', '1234567'],
+            'engagement_type': ['office_hours', 'event', 'vmock', 'event', 'interview', 'event'],
+            'unique_engagement_id': ['1a4f32r', '028j9g4h3', 'dd8dj9g8g', 'f09j09g43', '0f902fj83', '9g8h7j6k5'],
+        })
+        counts = count_engagements(engagements.iloc[:0])
+        for start in range(0, len(engagements), 2):
+            counts = accumulate_engagement_counts(counts, engagements.iloc[start:start + 2])
+
+        assert_frame_equal(count_engagements_by_type(engagements), pivot_engagement_counts(counts))
+        self.assertEqual(np.int64, counts.dtype)
@@ -1,10 +1,13 @@
 import unittest
+from unittest import mock
 
 import pandas as pd
 import numpy as np
 from pandas.testing import assert_frame_equal
 
 from lde_etl.data_model import Departments
+from lde_etl.student_data_etl import transform_student_data
+from lde_etl.student_data_etl.student_schema import optimize_student_dtypes
 from lde_etl.student_data_etl.transform_student_data import add_major_metadata
 from lde_etl.student_data_etl.transform_student_data import make_student_department_subtable
 from lde_etl.student_data_etl.transform_student_data import make_student_department_table
@@ -16,6 +19,10 @@ from lde_etl.student_data_etl.transform_student_data import merge_with_engagemen
 from lde_etl.student_data_etl.transform_student_data import clean_mistyped_bool_field
 from lde_etl.student_data_etl.transform_student_data import add_athlete_data
 from lde_etl.student_data_etl.transform_student_data import add_sli_data
+from lde_etl.student_data_etl.transform_student_data import normalize_majors
+from lde_etl.student_data_etl.transform_student_data import join_student_attributes
+from lde_etl.student_data_etl.transform_student_data import make_student_department_table_incrementally
+from lde_etl.student_data_etl.transform_student_data import fingerprint_department_rule_inputs
 
 
 class TestCleanMistypedBoolField(unittest.TestCase):
@@ -107,6 +114,13 @@ class TestAddAthleteData(unittest.TestCase):
         expected = pd.DataFrame({'hopkins_id': ['fie673'], 'sport': [None], 'is_athlete': [False]})
         assert_frame_equal(expected, add_athlete_data(students, athlete_data))
 
+    def test_joins_the_sports_of_athletes_who_play_more_than_one_sport(self):
+        students = pd.DataFrame({'hopkins_id': ['fie673', 'xjf84e']})
+        athlete_data = pd.DataFrame({'University ID': ['fie673', 'fie673'], 'Sport': ['Soccer', 'Lacrosse']})
+        expected = pd.DataFrame({'hopkins_id': ['fie673', 'xjf84e'], 'sport': ['Soccer;Lacrosse', None],
+                                 'is_athlete': [True, False]})
+        assert_frame_equal(expected, add_athlete_data(students, athlete_data))
+
 
 class TestAddSLIData(unittest.TestCase):
 
@@ -141,6 +155,46 @@ class TestMeltMajors(unittest.TestCase):
         assert_frame_equal(expected, melt_majors(students))
 
 
+class TestNormalizeMajors(unittest.TestCase):
+
+    def test_splits_students_into_an_attribute_table_and_a_cleaned_major_table(self):
+        students = pd.DataFrame({
+            'hopkins_id': ['uu9d32', '938tjg'],
+            'majors': ['B.A.: economics;M.S.: math', 'B.A.: economics'],
+            'school_year': ['Senior', 'Junior']
+        })
+        expected_attributes = pd.DataFrame({'hopkins_id': ['uu9d32', '938tjg'], 'school_year': ['Senior', 'Junior']})
+        expected_majors = pd.DataFrame({
+            'hopkins_id': ['uu9d32', 'uu9d32', '938tjg'],
+            'major': ['economics', 'M.S.: math', 'economics']
+        })
+        student_attributes, student_majors = normalize_majors(students)
+        assert_frame_equal(expected_attributes, student_attributes)
+        assert_frame_equal(expected_majors, student_majors)
+
+    def test_leaves_students_without_majors_out_of_the_major_table(self):
+        students = pd.DataFrame({'hopkins_id': ['uu9d32', '938tjg'], 'majors': ['economics', None]})
+        expected = pd.DataFrame({'hopkins_id': ['uu9d32'], 'major': ['economics']})
+        assert_frame_equal(expected, normalize_majors(students)[1])
+
+
+class TestJoinStudentAttributes(unittest.TestCase):
+
+    def test_joins_the_requested_attributes_onto_each_major_keeping_students_without_majors(self):
+        student_attributes = pd.DataFrame({
+            'hopkins_id': ['uu9d32', '938tjg'],
+            'school_year': ['Senior', 'Junior'],
+            'gender': ['F', 'M']
+        })
+        student_majors = pd.DataFrame({'hopkins_id': ['uu9d32', 'uu9d32'], 'major': ['economics', 'math']})
+        expected = pd.DataFrame({
+            'hopkins_id': ['uu9d32', 'uu9d32', '938tjg'],
+            'school_year': ['Senior', 'Senior', 'Junior'],
+            'major': ['economics', 'math', np.nan]
+        })
+        assert_frame_equal(expected, join_student_attributes(student_majors, student_attributes, ['school_year']))
+
+
 class TestMergeWithHandshakeData(unittest.TestCase):
 
     def test_merges_student_data_with_handshake_data_on_jhed(self):
@@ -449,6 +503,27 @@ class TestMakeStudentDepartmentsSubTable(unittest.TestCase):
         })
         assert_frame_equal(expected, make_student_department_subtable(students, 'pmle45'))
 
+    def test_treats_missing_nullable_boolean_flags_as_neither_true_nor_false(self):
+        students = pd.DataFrame({
+            'hopkins_id': ['pmle45'],
+            'college': ['wse'],
+            'school_year': ['Sophomore'],
+            'is_athlete': pd.array([None], dtype='boolean'),
+            'is_urm': pd.array([True], dtype='boolean'),
+            'is_first_generation': pd.array([None], dtype='boolean'),
+            'is_pell_eligible': pd.array([None], dtype='boolean'),
+            'is_pre_med': pd.array([None], dtype='boolean'),
+            'major_department': ['elec_eng'],
+            'is_in_org': pd.array([None], dtype='boolean'),
+            'is_ep': pd.array([False], dtype='boolean'),
+            'wgs_affiliation_type': [None]
+        })
+        expected = pd.DataFrame({
+            'hopkins_id': ['pmle45'],
+            'department': ['elec_eng']
+        })
+        assert_frame_equal(expected, make_student_department_subtable(students, 'pmle45'))
+
     def test_includes_css_department_for_pre_med_fli_urms(self):
         students = pd.DataFrame({
             'hopkins_id': ['pmle45'],
@@ -551,3 +626,78 @@ class TestMakeStudentDepartmentsTable(unittest.TestCase):
             'department': ['pol_sci_econ', 'brain_sci', 'comp_sci']
         })
         assert_frame_equal(expected, make_student_department_table(students))
+
+
+class TestMakeStudentDepartmentTableIncrementally(unittest.TestCase):
+
+    def setUp(self):
+        self.students = pd.DataFrame({
+            'hopkins_id': ['93aml3', 'ndfe83'],
+            'college': ['ksas', 'ksas'],
+            'school_year': ['Sophomore', 'Sophomore'],
+            'is_athlete': [False, False],
+            'is_urm': [False, False],
+            'is_first_generation': [False, False],
+            'is_pell_eligible': [False, False],
+            'major_department': ['pol_sci_econ', 'brain_sci'],
+            'is_in_org': [False, False],
+            'is_ep': [False, False],
+            'wgs_affiliation_type': [None, None]
+        })
+        self.previous_departments, self.previous_fingerprints = make_student_department_table_incrementally(
+            self.students, pd.DataFrame({'hopkins_id': [], 'department': []}),
+            pd.DataFrame({'hopkins_id': [], 'fingerprint': []}), full_recompute=True)
+
+    def test_full_recompute_matches_the_regular_department_table(self):
+        assert_frame_equal(make_student_department_table(self.students), self.previous_departments)
+
+    def test_carries_over_previous_departments_for_students_whose_rule_inputs_did_not_change(self):
+        previous_departments = pd.DataFrame({'hopkins_id': ['93aml3', 'ndfe83'], 'department': ['stale', 'brain_sci']})
+        expected = pd.DataFrame({'hopkins_id': ['93aml3', 'ndfe83'], 'department': ['stale', 'brain_sci']})
+        actual, _ = make_student_department_table_incrementally(self.students, previous_departments,
+                                                                self.previous_fingerprints)
+        assert_frame_equal(expected, actual)
+
+    def test_recomputes_departments_for_students_whose_rule_inputs_changed(self):
+        students = self.students.copy()
+        students.loc[students['hopkins_id'] == '93aml3', 'is_athlete'] = True
+        expected = pd.DataFrame({
+            'hopkins_id': ['ndfe83', '93aml3', '93aml3'],
+            'department': ['brain_sci', 'pol_sci_econ', Departments.SOAR_ATHLETICS.value.name]
+        })
+        actual, _ = make_student_department_table_incrementally(students, self.previous_departments,
+                                                                self.previous_fingerprints)
+        assert_frame_equal(expected, actual)
+
+    def test_drops_students_who_are_no_longer_present(self):
+        expected = pd.DataFrame({'hopkins_id': ['ndfe83'], 'department': ['brain_sci']})
+        actual, fingerprints = make_student_department_table_incrementally(
+            self.students.iloc[1:], self.previous_departments, self.previous_fingerprints)
+        assert_frame_equal(expected, actual)
+        self.assertEqual(['ndfe83'], list(fingerprints['hopkins_id']))
+
+    def test_fingerprints_change_when_the_order_of_a_students_major_rows_changes(self):
+        students = pd.DataFrame({'hopkins_id': ['93aml3', '93aml3'], 'major_department': ['bme', 'comp_sci']})
+        reordered = students.iloc[::-1].reset_index(drop=True)
+        self.assertNotEqual(fingerprint_department_rule_inputs(students)['fingerprint'][0],
+                            fingerprint_department_rule_inputs(reordered)['fingerprint'][0])
+
+    def test_fingerprints_change_when_the_rules_version_changes(self):
+        with mock.patch.object(transform_student_data, 'DEPARTMENT_RULES_VERSION',
+                               transform_student_data.DEPARTMENT_RULES_VERSION + 1):
+            fingerprints = fingerprint_department_rule_inputs(self.students)
+        self.assertFalse((fingerprints['fingerprint'] == self.previous_fingerprints['fingerprint']).any())
+
+    def test_fingerprints_change_when_a_flag_helper_changes(self):
+        with mock.patch.object(transform_student_data.inspect, 'getsource',
+                               side_effect=lambda function: function.__name__):
+            patched_fingerprints = fingerprint_department_rule_inputs(self.students)
+        with mock.patch.object(transform_student_data.inspect, 'getsource',
+                               side_effect=lambda function: function.__name__ + (
+                                   ' changed' if function.__name__ == '_is_true' else '')):
+            fingerprints = fingerprint_department_rule_inputs(self.students)
+        self.assertFalse((fingerprints['fingerprint'] == patched_fingerprints['fingerprint']).any())
+
+    def test_fingerprints_do_not_depend_on_the_dtypes_of_the_rule_inputs(self):
+        assert_frame_equal(fingerprint_department_rule_inputs(self.students),
+                           fingerprint_department_rule_inputs(optimize_student_dtypes(self.students)))
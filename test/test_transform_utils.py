@@ -0,0 +1,208 @@
+import os
+import tempfile
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal, assert_series_equal
+
+from lde_etl import transform_utils
+from lde_etl.transform_utils import Lookup
+from lde_etl.transform_utils import clear_unique_value_cache
+from lde_etl.transform_utils import hash_partition_positions
+from lde_etl.transform_utils import left_join_lookups
+from lde_etl.transform_utils import map_unique_values
+from lde_etl.transform_utils import partition_by_column
+from lde_etl.transform_utils import read_spilled_columns
+from lde_etl.transform_utils import read_spilled_partitions
+from lde_etl.transform_utils import spill_partition
+
+
+class TestMapUniqueValues(unittest.TestCase):
+
+    def setUp(self):
+        clear_unique_value_cache()
+        self.calls = []
+
+    def record_and_upper(self, value: str) -> str:
+        self.calls.append(value)
+        return value.upper()
+
+    def test_applies_the_function_to_every_value_preserving_the_index_and_name(self):
+        values = pd.Series(['a', 'b', 'a'], index=[3, 5, 7], name='field')
+        expected = pd.Series(['A', 'B', 'A'], index=[3, 5, 7], name='field')
+        assert_series_equal(expected, map_unique_values(values, self.record_and_upper))
+
+    def test_only_calls_the_function_once_per_distinct_value(self):
+        map_unique_values(pd.Series(['a', 'b', 'a', 'a', 'b']), self.record_and_upper)
+        self.assertEqual(['a', 'b'], self.calls)
+
+    def test_caches_results_across_calls(self):
+        map_unique_values(pd.Series(['a', 'b']), self.record_and_upper)
+        map_unique_values(pd.Series(['b', 'c']), self.record_and_upper)
+        self.assertEqual(['a', 'b', 'c'], self.calls)
+
+    def test_keeps_equal_values_of_different_types_apart_in_the_cache(self):
+        map_unique_values(pd.Series([1], dtype=object), repr)
+        assert_series_equal(pd.Series(['True']), map_unique_values(pd.Series([True], dtype=object), repr))
+        assert_series_equal(pd.Series(['1.0']), map_unique_values(pd.Series([1.0], dtype=object), repr))
+
+    def test_leaves_nulls_as_none_without_calling_the_function(self):
+        expected = pd.Series(['A', None, None])
+        assert_series_equal(expected, map_unique_values(pd.Series(['a', None, float('nan')]), self.record_and_upper))
+        self.assertEqual(['a'], self.calls)
+
+    def test_accepts_plain_lists(self):
+        expected = pd.Series([True, False, True])
+        assert_series_equal(expected, map_unique_values(['x', 'y', 'x'], lambda value: value == 'x'))
+
+    def test_calls_the_function_on_nulls_when_they_are_not_skipped(self):
+        with self.assertRaises(AttributeError):
+            map_unique_values(pd.Series(['a', None]), self.record_and_upper, skip_nulls=False)
+
+    def test_empties_a_functions_cache_once_it_is_full(self):
+        with mock.patch.object(transform_utils, 'MAX_CACHED_VALUES', 2):
+            map_unique_values(pd.Series(['a', 'b', 'c']), self.record_and_upper)
+            map_unique_values(pd.Series(['a']), self.record_and_upper)
+        self.assertEqual(['a', 'b', 'c', 'a'], self.calls)
+        self.assertLessEqual(len(transform_utils._UNIQUE_VALUE_CACHES[self.record_and_upper]), 2)
+
+    def test_drops_the_oldest_functions_cache_once_too_many_functions_are_cached(self):
+        with mock.patch.object(transform_utils, 'MAX_CACHED_FUNCTIONS', 2):
+            for suffix in ['1', '2', '3']:
+                map_unique_values(['a'], lambda value, suffix=suffix: value + suffix)
+        self.assertEqual(2, len(transform_utils._UNIQUE_VALUE_CACHES))
+
+
+class TestPartitionByColumn(unittest.TestCase):
+
+    def setUp(self):
+        self.df = pd.DataFrame({
+            'department': ['wgs', 'bme', None, 'wgs', 'bme'],
+            'hopkins_id': ['a', 'b', 'c', 'd', 'e']
+        })
+
+    def test_yields_a_slice_per_value_in_order_of_first_appearance_keeping_row_order(self):
+        partitions = list(partition_by_column(self.df, 'department'))
+        self.assertEqual(['wgs', 'bme'], [value for value, _ in partitions])
+        assert_frame_equal(self.df.iloc[[0, 3]], partitions[0][1])
+        assert_frame_equal(self.df.iloc[[1, 4]], partitions[1][1])
+
+    def test_yields_slices_in_sorted_value_order_if_requested(self):
+        partitions = list(partition_by_column(self.df, 'department', sort=True))
+        self.assertEqual(['bme', 'wgs'], [value for value, _ in partitions])
+
+    def test_yields_nothing_for_an_empty_dataframe(self):
+        self.assertEqual([], list(partition_by_column(self.df.iloc[:0], 'department')))
+
+
+class TestHashPartitionPositions(unittest.TestCase):
+
+    def test_puts_rows_with_the_same_value_in_the_same_partition_in_their_original_order(self):
+        values = pd.Series([f'h{i % 7}' for i in range(30)], index=range(100, 130))
+
+        partitions = hash_partition_positions(values, 4)
+
+        self.assertEqual(4, len(partitions))
+        self.assertEqual(list(range(30)), sorted(np.concatenate(partitions)))
+        for positions in partitions:
+            self.assertTrue((np.diff(positions) > 0).all())
+        values_by_partition = [set(values.iloc[positions]) for positions in partitions]
+        self.assertEqual(7, sum(len(partition_values) for partition_values in values_by_partition))
+
+    def test_partitions_values_the_same_way_in_every_table(self):
+        student_ids = pd.Series(['a', 'b', 'c', 'd'])
+        department_ids = pd.Series(['d', 'c', 'a', 'a', 'e'])
+
+        for student_positions, department_positions in zip(hash_partition_positions(student_ids, 3),
+                                                           hash_partition_positions(department_ids, 3)):
+            self.assertTrue(set(department_ids.iloc[department_positions]) - {'e'} <=
+                            set(student_ids.iloc[student_positions]))
+
+
+class TestSpilledPartitions(unittest.TestCase):
+
+    def setUp(self):
+        self.spill_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.spill_dir.cleanup)
+        self.partitions = [
+            pd.DataFrame({'department': pd.Categorical(['bme', 'wgs']), 'row': [0, 1], 'name': ['a', 'b']},
+                         index=[5, 6]),
+            pd.DataFrame({'department': pd.Series(['ams', None], dtype='category'), 'row': [2, 3],
+                          'name': ['c', None]}),
+        ]
+        self.dirpaths = [os.path.join(self.spill_dir.name, str(i)) for i in range(len(self.partitions))]
+        for partition, dirpath in zip(self.partitions, self.dirpaths):
+            spill_partition(partition, dirpath)
+
+    def test_keeps_columns_categorical_when_their_categories_differ_between_partitions(self):
+        expected = pd.DataFrame({'department': pd.Series(['bme', 'wgs', 'ams', None], dtype='category'),
+                                 'row': [0, 1, 2, 3], 'name': ['a', 'b', 'c', None]})
+        self.assertEqual(['department', 'row', 'name'], read_spilled_columns(self.dirpaths[0]))
+        assert_frame_equal(expected, read_spilled_partitions(self.dirpaths))
+
+    def test_reads_only_the_given_columns_in_the_given_order(self):
+        expected = pd.DataFrame({'name': ['c', 'a', None, 'b'], 'row': [2, 0, 3, 1]})
+        assert_frame_equal(expected, read_spilled_partitions(self.dirpaths, ['name', 'row'],
+                                                             np.array([2, 0, 3, 1])))
+
+
+class TestLeftJoinLookups(unittest.TestCase):
+
+    def test_adds_the_columns_of_every_lookup_matching_rows_by_key(self):
+        students = pd.DataFrame({'hopkins_id': ['a1', 'b2', 'c3'], 'jhed': ['ja1', 'jb2', 'jc3']})
+        lookups = [
+            Lookup('hopkins_id', pd.DataFrame({'University ID': ['c3', 'a1'], 'Sport': ['Golf', 'Soccer']}),
+                   table_key='University ID'),
+            Lookup('jhed', pd.DataFrame({'jhed': ['jb2'], 'handshake_id': ['100']})),
+        ]
+        expected = pd.DataFrame({
+            'hopkins_id': ['a1', 'b2', 'c3'],
+            'jhed': ['ja1', 'jb2', 'jc3'],
+            'Sport': ['Soccer', None, 'Golf'],
+            'handshake_id': [None, '100', None],
+        })
+        assert_frame_equal(expected, left_join_lookups(students, lookups))
+
+    def test_never_matches_null_keys(self):
+        students = pd.DataFrame({'jhed': ['ja1', None]})
+        handshake_data = pd.DataFrame({'jhed': ['ja1', None], 'handshake_id': ['100', '200']})
+        expected = pd.DataFrame({'jhed': ['ja1', None], 'handshake_id': ['100', None]})
+        assert_frame_equal(expected, left_join_lookups(students, [Lookup('jhed', handshake_data)]))
+
+    def test_raises_an_error_for_duplicate_keys_by_default(self):
+        students = pd.DataFrame({'hopkins_id': ['a1']})
+        athletes = pd.DataFrame({'hopkins_id': ['a1', 'a1'], 'sport': ['Soccer', 'Golf']})
+        with self.assertRaises(ValueError):
+            left_join_lookups(students, [Lookup('hopkins_id', athletes)])
+
+    def test_handles_duplicate_keys_without_adding_rows(self):
+        students = pd.DataFrame({'hopkins_id': ['a1', 'b2']})
+        side_table = pd.DataFrame({'hopkins_id': ['a1', 'a1', 'b2'], 'sport': ['Soccer', 'Golf', 'Golf'],
+                                   'is_officer': [False, True, False]})
+        lookups = [
+            Lookup('hopkins_id', side_table, columns=['sport'], duplicates='join'),
+            Lookup('hopkins_id', side_table, columns=['is_officer'], duplicates='max'),
+        ]
+        expected = pd.DataFrame({'hopkins_id': ['a1', 'b2'], 'sport': ['Soccer;Golf', 'Golf'],
+                                 'is_officer': [True, False]})
+        assert_frame_equal(expected, left_join_lookups(students, lookups))
+
+    def test_warns_with_the_number_of_duplicate_keys_when_rows_are_dropped(self):
+        students = pd.DataFrame({'hopkins_id': ['a1', 'b2']})
+        side_table = pd.DataFrame({'hopkins_id': ['a1', 'a1', 'a1', 'b2', 'b2', 'c3'],
+                                   'sport': ['Soccer', 'Golf', 'Golf', 'Golf', 'Tennis', 'Golf']})
+        for duplicates in ['first', 'max', 'join']:
+            with self.subTest(duplicates=duplicates):
+                with self.assertWarnsRegex(UserWarning, f"2 values of hopkins_id .* 3 rows were dropped by the "
+                                                        f"'{duplicates}' duplicate key policy"):
+                    left_join_lookups(students, [Lookup('hopkins_id', side_table, duplicates=duplicates)])
+
+    def test_does_not_warn_without_duplicate_keys(self):
+        students = pd.DataFrame({'hopkins_id': ['a1']})
+        athletes = pd.DataFrame({'hopkins_id': ['a1', 'b2'], 'sport': ['Soccer', 'Golf']})
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            left_join_lookups(students, [Lookup('hopkins_id', athletes, duplicates='first')])